@@ -21,8 +21,64 @@ class Settings(BaseSettings):
     openai_api_key: Optional[str] = Field(default=None, env="OPENAI_API_KEY")
     
     # Embedding settings
-    embedding_model: str = Field(default="sentence-transformers", env="EMBEDDING_MODEL")  # "sentence-transformers" or "openai"
+    embedding_model: str = Field(default="sentence-transformers", env="EMBEDDING_MODEL")  # "sentence-transformers", "onnx" or "openai"
     embedding_dimensions: int = Field(default=384, env="EMBEDDING_DIMENSIONS")  # 384 for sentence-transformers, 1536 for OpenAI
+    embedding_onnx_quantize: bool = Field(default=False, env="EMBEDDING_ONNX_QUANTIZE")  # dynamic int8 weights for the onnx backend
+    embedding_onnx_cache_dir: Optional[str] = Field(default=None, env="EMBEDDING_ONNX_CACHE_DIR")
+    
+    # Micro-batching of concurrent embedding requests
+    embedding_batch_max_size: int = Field(default=32, env="EMBEDDING_BATCH_MAX_SIZE")
+    embedding_batch_max_wait_ms: float = Field(default=5.0, env="EMBEDDING_BATCH_MAX_WAIT_MS")
+    
+    # Embedding cache (in-memory LRU, plus .npy files when a directory is set)
+    embedding_cache_size: int = Field(default=10000, env="EMBEDDING_CACHE_SIZE")
+    embedding_cache_dir: Optional[str] = Field(default=None, env="EMBEDDING_CACHE_DIR")
+    
+    # Load the model and precompute fixed query embeddings at startup
+    embedding_warmup: bool = Field(default=True, env="EMBEDDING_WARMUP")
+    
+    # Background embedding worker
+    embedding_queue_max_size: int = Field(default=1000, env="EMBEDDING_QUEUE_MAX_SIZE")
+    embedding_worker_concurrency: int = Field(default=2, env="EMBEDDING_WORKER_CONCURRENCY")
+    embedding_max_retries: int = Field(default=3, env="EMBEDDING_MAX_RETRIES")
+    embedding_retry_base_delay: float = Field(default=1.0, env="EMBEDDING_RETRY_BASE_DELAY")  # seconds, doubled per attempt
+    
+    # In-memory per-user vector index for search (0 disables it)
+    vector_index_memory_mb: int = Field(default=256, env="VECTOR_INDEX_MEMORY_MB")
+    # Rebuild indexes this often to pick up writes from other processes
+    vector_index_ttl_seconds: float = Field(default=300.0, env="VECTOR_INDEX_TTL_SECONDS")
+    
+    # Search result cache (0 entries disables it)
+    search_cache_ttl_seconds: float = Field(default=60.0, env="SEARCH_CACHE_TTL_SECONDS")
+    search_cache_max_entries: int = Field(default=2000, env="SEARCH_CACHE_MAX_ENTRIES")
+    
+    # Ranked result sets kept for cursor pagination
+    search_cursor_ttl_seconds: float = Field(default=300.0, env="SEARCH_CURSOR_TTL_SECONDS")
+    search_cursor_max_sets: int = Field(default=1000, env="SEARCH_CURSOR_MAX_SETS")
+    search_ranked_depth: int = Field(default=200, env="SEARCH_RANKED_DEPTH")  # results ranked per paginated search
+    
+    # Maximum queries in one POST /search/batch request
+    search_batch_max_queries: int = Field(default=10, env="SEARCH_BATCH_MAX_QUERIES")
+    
+    # Clerk user id -> internal user row, shared across requests (0 disables it)
+    user_cache_ttl_seconds: float = Field(default=300.0, env="USER_CACHE_TTL_SECONDS")
+    user_cache_max_entries: int = Field(default=10000, env="USER_CACHE_MAX_ENTRIES")
+    
+    # Clerk signing keys per issuer, and verified token claims until their exp
+    clerk_issuers: list[str] = Field(default=[], env="CLERK_ISSUERS")  # trusted token issuers; empty derives Clerk's from the publishable key
+    clerk_jwks_ttl_seconds: float = Field(default=3600.0, env="CLERK_JWKS_TTL_SECONDS")
+    auth_token_cache_max_entries: int = Field(default=10000, env="AUTH_TOKEN_CACHE_MAX_ENTRIES")
+    
+    # Clerk user profiles, only fetched when a user row is created
+    clerk_profile_ttl_seconds: float = Field(default=3600.0, env="CLERK_PROFILE_TTL_SECONDS")
+    clerk_profile_negative_ttl_seconds: float = Field(default=60.0, env="CLERK_PROFILE_NEGATIVE_TTL_SECONDS")
+    
+    # Outbound HTTP (Clerk, AdviceSlip): pooled keep-alive clients per host
+    http_timeout_seconds: float = Field(default=10.0, env="HTTP_TIMEOUT_SECONDS")
+    http_max_connections_per_host: int = Field(default=20, env="HTTP_MAX_CONNECTIONS_PER_HOST")
+    http_max_keepalive_per_host: int = Field(default=10, env="HTTP_MAX_KEEPALIVE_PER_HOST")
+    http_keepalive_expiry_seconds: float = Field(default=30.0, env="HTTP_KEEPALIVE_EXPIRY_SECONDS")
+    http_max_hosts: int = Field(default=16, env="HTTP_MAX_HOSTS")
     
     # CORS
     allowed_origins: list[str] = Field(
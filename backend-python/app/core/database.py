@@ -1,12 +1,30 @@
-from supabase import create_client, Client
+from supabase import create_client, Client, AsyncClient
 from app.core.config import settings
 
 # Create Supabase client
 supabase: Client = create_client(settings.supabase_url, settings.supabase_anon_key)
 
+# Async client for request handlers; its pooled HTTP connections are
+# shared by every service instance and closed at shutdown
+async_supabase: AsyncClient = AsyncClient(settings.supabase_url, settings.supabase_anon_key)
+
 
 def get_supabase():
     """
     Dependency to get Supabase client
     """
     return supabase
+
+
+def get_async_supabase() -> AsyncClient:
+    """
+    Dependency to get the async Supabase client
+    """
+    return async_supabase
+
+
+async def close_async_supabase():
+    """
+    Close the async client's connection pool
+    """
+    await async_supabase.postgrest.aclose()
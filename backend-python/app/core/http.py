@@ -0,0 +1,119 @@
+"""
+Shared, pooled HTTP clients for outbound calls
+"""
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from app.core.config import settings
+
+
+class HTTPClientRegistry:
+    """
+    One keep-alive httpx.AsyncClient per origin, shared by all services
+
+    Each origin gets its own connection pool, so the connection limits are
+    per host. Clients are created on first use and closed by the
+    application lifespan. At most `max_hosts` origins get a client; further
+    origins are refused rather than growing the registry. Tests can route
+    every client through an httpx.MockTransport with `reset(transport=...)`.
+    """
+
+    def __init__(
+        self,
+        timeout: float = 10.0,
+        max_connections: int = 20,
+        max_keepalive_connections: int = 10,
+        keepalive_expiry: float = 30.0,
+        max_hosts: int = 16
+    ):
+        self.timeout = timeout
+        self.max_hosts = max_hosts
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self._transport: Optional[httpx.AsyncBaseTransport] = None
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        # origin -> {"requests": n, "connections": n}
+        self._counters: Dict[str, Dict[str, int]] = {}
+
+    @staticmethod
+    def origin(url: str) -> str:
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    def get(self, url: str) -> httpx.AsyncClient:
+        """
+        Return the pooled client for the origin of `url`
+
+        Raises:
+            ValueError: If `url` is a new origin and max_hosts are already in use
+        """
+        origin = self.origin(url)
+        client = self._clients.get(origin)
+        if client is None or client.is_closed:
+            if origin not in self._clients and len(self._clients) >= self.max_hosts:
+                raise ValueError(f"No HTTP client for {origin}: {self.max_hosts} hosts already in use")
+            client = self._create(origin)
+            self._clients[origin] = client
+        return client
+
+    def _create(self, origin: str) -> httpx.AsyncClient:
+        counters = self._counters.setdefault(origin, {"requests": 0, "connections": 0})
+
+        async def trace(event_name: str, info: Dict[str, Any]):
+            # httpcore reports every new TCP connection; reused ones skip this
+            if event_name == "connection.connect_tcp.complete":
+                counters["connections"] += 1
+
+        async def on_request(request: httpx.Request):
+            counters["requests"] += 1
+            request.extensions["trace"] = trace
+
+        return httpx.AsyncClient(
+            timeout=self.timeout,
+            limits=self.limits,
+            transport=self._transport,
+            event_hooks={"request": [on_request]}
+        )
+
+    async def aclose(self):
+        """Close every pooled client (application shutdown)"""
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            await client.aclose()
+
+    async def reset(self, transport: Optional[httpx.AsyncBaseTransport] = None):
+        """Close all clients and create new ones on `transport` (None for the network)"""
+        await self.aclose()
+        self._transport = transport
+        self._counters.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        hosts = {}
+        for origin, counters in self._counters.items():
+            requests, connections = counters["requests"], counters["connections"]
+            hosts[origin] = {
+                "requests": requests,
+                "connections_opened": connections,
+                "reuse_rate": round(1 - connections / requests, 4) if requests else 0.0,
+            }
+        return {
+            "open_clients": sum(1 for client in self._clients.values() if not client.is_closed),
+            "max_hosts": self.max_hosts,
+            "max_connections_per_host": self.limits.max_connections,
+            "hosts": hosts,
+        }
+
+
+# Global HTTP client registry
+http_clients = HTTPClientRegistry(
+    timeout=settings.http_timeout_seconds,
+    max_connections=settings.http_max_connections_per_host,
+    max_keepalive_connections=settings.http_max_keepalive_per_host,
+    keepalive_expiry=settings.http_keepalive_expiry_seconds,
+    max_hosts=settings.http_max_hosts
+)
@@ -1,3 +1,6 @@
+import time
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
@@ -5,16 +8,43 @@ from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 
 from app.core.config import settings
+from app.core.database import close_async_supabase
+from app.core.http import http_clients
+from app.middleware.auth import clerk_auth
 from app.middleware.rate_limit import limiter, rate_limit_handler
 from app.routers import analytics, collections, journal, public
 from app.routers import search
+from app.services.embedding_service import embedding_service
+from app.services.embedding_worker import embedding_worker
+from app.services.search_cache import search_result_cache
+from app.services.semantic_search_service import semantic_search_service
+from app.services.supabase_service import user_cache
+from app.services.vector_index import vector_index_cache
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start and stop background workers with the application"""
+    # A missing backend would otherwise only surface as failed embeddings
+    embedding_service.check_backend()
+    if settings.embedding_warmup:
+        started = time.perf_counter()
+        count = await semantic_search_service.warm_up()
+        print(f"Embedding warm-up: {count} fixed texts precomputed in {time.perf_counter() - started:.1f}s")
+    await embedding_worker.start()
+    yield
+    await embedding_worker.stop()
+    await close_async_supabase()
+    await http_clients.aclose()
+
 
 # Create FastAPI application
 app = FastAPI(
     title=settings.app_name,
     version="1.0.0",
     description="FastAPI backend for Atmanaut journaling application",
-    debug=settings.debug
+    debug=settings.debug,
+    lifespan=lifespan
 )
 
 # Add rate limiting
@@ -55,6 +85,21 @@ async def health_check():
     return {"status": "healthy", "service": "atmanaut-backend"}
 
 
+@app.get("/metrics")
+async def metrics():
+    """Cache and background worker counters"""
+    return {
+        "search_cache": search_result_cache.stats(),
+        "embedding_cache": embedding_service.cache.stats(),
+        "embedding_precomputed": embedding_service.precomputed_stats(),
+        "vector_index": vector_index_cache.stats(),
+        "embedding_worker": embedding_worker.stats(),
+        "user_cache": user_cache.stats(),
+        "auth": clerk_auth.cache_stats(),
+        "http_clients": http_clients.stats(),
+    }
+
+
 # Global exception handler
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
@@ -1,4 +1,4 @@
-from .auth import get_current_user, get_optional_user, get_or_create_user_from_token, clerk_auth
+from .auth import get_current_user, get_optional_user, get_or_create_user_from_token, get_db_user, clerk_auth
 from .rate_limit import limiter, rate_limit_handler
 
-__all__ = ["get_current_user", "get_optional_user", "get_or_create_user_from_token", "clerk_auth", "limiter", "rate_limit_handler"]
+__all__ = ["get_current_user", "get_optional_user", "get_or_create_user_from_token", "get_db_user", "clerk_auth", "limiter", "rate_limit_handler"]
@@ -1,32 +1,154 @@
+import asyncio
+import base64
+import hashlib
 import os
-import httpx
-from typing import Optional, Dict, Any
-from fastapi import HTTPException, status, Request
+import time
+from typing import Optional, Dict, Any, Iterable, Set
+from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import HTTPBearer
 import jwt
-from jwt import PyJWKClient, InvalidTokenError
+from jwt import PyJWK, PyJWKSet, InvalidTokenError
 from app.core.config import settings
+from app.core.http import http_clients
+from app.core.ttl_cache import TTLCache
 
 
 security = HTTPBearer()
 
+# An unknown kid triggers at most one JWKS refetch per issuer in this window,
+# so tokens with made-up key ids cannot turn into a fetch per request
+JWKS_REFETCH_INTERVAL_SECONDS = 30.0
+# Upper bound on how long verified claims are reused, whatever their exp
+TOKEN_CACHE_MAX_SECONDS = 3600.0
+
+
+def issuer_from_publishable_key(publishable_key: str) -> Optional[str]:
+    """
+    Clerk instance issuer encoded in a publishable key
+
+    Publishable keys look like pk_<env>_<base64 of "<frontend api host>$">;
+    tokens of that instance carry https://<frontend api host> as their iss.
+    """
+    try:
+        encoded = publishable_key.split("_", 2)[2]
+        host = base64.b64decode(encoded + "=" * (-len(encoded) % 4)).decode().rstrip("$")
+    except (IndexError, ValueError, UnicodeDecodeError):
+        return None
+    return f"https://{host}" if host else None
+
 
 class ClerkAuth:
     """Clerk authentication handler"""
     
-    def __init__(self):
+    def __init__(self, issuers: Optional[Iterable[str]] = None):
         self.jwks_url = "https://api.clerk.com/v1/jwks"
         self.issuer = "https://clerk.com"
-        self._jwks_cache = None
+        # Only these issuers' keys are ever fetched; the iss claim is read
+        # before the signature is verified, so it cannot be trusted as a URL
+        if issuers is None:
+            issuers = settings.clerk_issuers or [issuer_from_publishable_key(settings.clerk_publishable_key)]
+        self.issuers: Set[str] = {issuer.rstrip("/") for issuer in issuers if issuer}
+        # issuer -> {kid: signing key}
+        self._jwks_cache = TTLCache(
+            ttl_seconds=settings.clerk_jwks_ttl_seconds,
+            max_entries=max(len(self.issuers), 1)
+        )
+        self._jwks_fetched_at: Dict[str, float] = {}
+        # One lock per issuer, so a slow issuer never blocks another's fetch
+        self._jwks_locks: Dict[str, asyncio.Lock] = {issuer: asyncio.Lock() for issuer in self.issuers}
+        # sha256(token) -> verified claims, kept until the token expires
+        self._token_cache = TTLCache(
+            ttl_seconds=TOKEN_CACHE_MAX_SECONDS,
+            max_entries=settings.auth_token_cache_max_entries
+        )
+        # Clerk user id -> profile; failed fetches are cached briefly too
+        self._profile_cache = TTLCache(
+            ttl_seconds=settings.clerk_profile_ttl_seconds,
+            max_entries=settings.user_cache_max_entries
+        )
+        self.jwks_fetches = 0
+        self.profile_fetches = 0
     
-    async def get_jwks(self):
-        """Get JSON Web Key Set from Clerk"""
-        if self._jwks_cache is None:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(self.jwks_url)
-                response.raise_for_status()
-                self._jwks_cache = response.json()
-        return self._jwks_cache
+    async def get_jwks(self, issuer: Optional[str] = None) -> Dict[str, Any]:
+        """Fetch the JSON Web Key Set of an issuer (Clerk's API by default)"""
+        url = f"{issuer}/.well-known/jwks.json" if issuer else self.jwks_url
+        response = await http_clients.get(url).get(url)
+        response.raise_for_status()
+        self.jwks_fetches += 1
+        return response.json()
+    
+    async def get_signing_key(self, issuer: str, kid: Optional[str]) -> Any:
+        """
+        Return the public key for `kid`, refetching the issuer's JWKS when
+        the kid is not cached yet (e.g. after a key rotation)
+        
+        Raises:
+            InvalidTokenError: If the issuer is not trusted or the kid is unknown
+        """
+        lock = self._jwks_locks.get(issuer)
+        if lock is None:
+            raise InvalidTokenError(f"Untrusted issuer: {issuer}")
+        keys = self._jwks_cache.get(issuer)
+        if keys is None or kid not in keys:
+            async with lock:
+                # Another request may have refreshed the keys meanwhile
+                keys = self._jwks_cache.get(issuer)
+                last_fetch = self._jwks_fetched_at.get(issuer)
+                recently_fetched = (
+                    last_fetch is not None
+                    and time.monotonic() - last_fetch < JWKS_REFETCH_INTERVAL_SECONDS
+                )
+                if keys is None or (kid not in keys and not recently_fetched):
+                    jwks = await self.get_jwks(issuer)
+                    keys = {key.key_id: key for key in PyJWKSet.from_dict(jwks).keys}
+                    self._jwks_cache.put(issuer, keys)
+                    self._jwks_fetched_at[issuer] = time.monotonic()
+        
+        signing_key: Optional[PyJWK] = keys.get(kid)
+        if signing_key is None:
+            raise InvalidTokenError(f"Unknown signing key: {kid}")
+        return signing_key.key
+    
+    async def verify_claims(self, token: str) -> Dict[str, Any]:
+        """
+        Verify a token's signature and expiry and return its claims
+        
+        Verified claims are cached by token hash until the token's exp, so
+        repeat requests with the same token skip signature verification.
+        """
+        token_hash = hashlib.sha256(token.encode()).hexdigest()
+        cached = self._token_cache.get(token_hash)
+        if cached is not None:
+            return cached
+        
+        unverified_header = jwt.get_unverified_header(token)
+        unverified_payload = jwt.decode(token, options={"verify_signature": False})
+        issuer = unverified_payload.get('iss')
+        if not issuer:
+            raise InvalidTokenError("Invalid token: no issuer")
+        
+        signing_key = await self.get_signing_key(issuer, unverified_header.get("kid"))
+        
+        # Clerk tokens use 'azp' instead of 'aud', so skip audience validation
+        payload = jwt.decode(
+            token,
+            signing_key,
+            algorithms=["RS256"],
+            options={"verify_aud": False}  # Skip audience validation for Clerk tokens
+        )
+        
+        if payload.get("exp"):
+            self._token_cache.put(token_hash, payload, ttl_seconds=payload["exp"] - time.time())
+        return payload
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        return {
+            "jwks_issuers": len(self._jwks_cache),
+            "jwks_fetches": self.jwks_fetches,
+            "verified_tokens": self._token_cache.stats(),
+            "profile_fetches": self.profile_fetches,
+            "profiles": self._profile_cache.stats(),
+        }
     
     async def verify_token(self, token: str) -> Optional[dict]:
         """
@@ -50,27 +172,14 @@ class ClerkAuth:
             )
     
     async def get_user_from_token(self, token: str) -> Dict[str, Any]:
-        """Get user from token and return full user data with profile info"""
+        """
+        Verify a token and return the Clerk user it belongs to
+        
+        Only the user id is returned; the Clerk profile is fetched lazily
+        (fetch_user_profile) when a user row has to be created.
+        """
         try:
-            # Decode JWT without verification first to get issuer
-            unverified_payload = jwt.decode(token, options={"verify_signature": False})
-            print(f"JWT Payload: {unverified_payload}")
-            
-            issuer = unverified_payload.get('iss')
-            if not issuer:
-                raise HTTPException(status_code=401, detail="Invalid token: no issuer")
-            
-            # Get JWKS and verify token  
-            jwks_client = PyJWKClient(f"{issuer}/.well-known/jwks.json")
-            signing_key = jwks_client.get_signing_key_from_jwt(token).key
-            
-            # Clerk tokens use 'azp' instead of 'aud', so skip audience validation
-            payload = jwt.decode(
-                token,
-                signing_key,
-                algorithms=["RS256"],
-                options={"verify_aud": False}  # Skip audience validation for Clerk tokens
-            )
+            payload = await self.verify_claims(token)
             
             # Validate authorized party (azp) for additional security
             azp = payload.get('azp')
@@ -81,66 +190,77 @@ class ClerkAuth:
             if not user_id:
                 raise HTTPException(status_code=401, detail="Invalid token: no user ID")
             
-            # Fetch full user profile from Clerk API
-            print(f"Fetching profile for user: {user_id}")
-            user_profile = await self.fetch_user_profile(user_id)
-            print(f"User profile fetched: {user_profile}")
-            
-            return user_profile
+            return {"user_id": user_id}
             
         except Exception as e:
             print(f"Token validation error: {e}")
             raise HTTPException(status_code=401, detail="Invalid token")
     
     async def fetch_user_profile(self, user_id: str) -> Dict[str, Any]:
-        """Fetch user profile from Clerk API"""
+        """Get a user's Clerk profile, from the profile cache when possible"""
+        cached = self._profile_cache.get(user_id)
+        if cached is not None:
+            return dict(cached)
+        
+        profile = await self._request_user_profile(user_id)
+        if profile is None:
+            # Remember the failure for a short while so retries don't hammer Clerk
+            profile = {"user_id": user_id, "email": f"user_{user_id[-8:]}@placeholder.com"}
+            self._profile_cache.put(user_id, profile, ttl_seconds=settings.clerk_profile_negative_ttl_seconds)
+        else:
+            self._profile_cache.put(user_id, profile)
+        return dict(profile)
+    
+    async def _request_user_profile(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Fetch user profile from Clerk API (None if it could not be fetched)"""
         try:
             clerk_secret = settings.clerk_secret_key
             print(f"Fetching user profile for: {user_id}")
             print(f"Clerk secret key available: {bool(clerk_secret)}")
+            self.profile_fetches += 1
             
-            async with httpx.AsyncClient() as client:
-                headers = {
-                    "Authorization": f"Bearer {clerk_secret}",
-                    "Content-Type": "application/json"
-                }
-                
-                # Try the Clerk secret as Bearer token first, then as basic auth if needed
-                url = f"https://api.clerk.com/v1/users/{user_id}"
-                print(f"Making request to: {url}")
-                
+            headers = {
+                "Authorization": f"Bearer {clerk_secret}",
+                "Content-Type": "application/json"
+            }
+            
+            # Try the Clerk secret as Bearer token first, then as basic auth if needed
+            url = f"https://api.clerk.com/v1/users/{user_id}"
+            client = http_clients.get(url)
+            print(f"Making request to: {url}")
+            
+            response = await client.get(url, headers=headers)
+            print(f"Clerk API response status: {response.status_code}")
+            
+            # If Bearer fails, try with the secret key directly
+            if response.status_code == 401:
+                headers["Authorization"] = clerk_secret
                 response = await client.get(url, headers=headers)
-                print(f"Clerk API response status: {response.status_code}")
+                print(f"Clerk API response status (retry): {response.status_code}")
+            
+            if response.status_code == 200:
+                profile = response.json()
+                print(f"Clerk API response: {profile}")
                 
-                # If Bearer fails, try with the secret key directly
-                if response.status_code == 401:
-                    headers["Authorization"] = clerk_secret
-                    response = await client.get(url, headers=headers)
-                    print(f"Clerk API response status (retry): {response.status_code}")
+                email = None
+                if "email_addresses" in profile and profile["email_addresses"]:
+                    email = profile["email_addresses"][0].get("email_address")
+                
+                user_data = {
+                    "user_id": user_id,
+                    "email": email,
+                    "name": f"{profile.get('first_name', '')} {profile.get('last_name', '')}".strip(),
+                    "image_url": profile.get("image_url")
+                }
+                print(f"Extracted user data: {user_data}")
+                return user_data
+            else:
+                print(f"Clerk API error: {response.status_code} - {response.text}")
+                return None
                 
-                if response.status_code == 200:
-                    profile = response.json()
-                    print(f"Clerk API response: {profile}")
-                    
-                    email = None
-                    if "email_addresses" in profile and profile["email_addresses"]:
-                        email = profile["email_addresses"][0].get("email_address")
-                    
-                    user_data = {
-                        "user_id": user_id,
-                        "email": email,
-                        "name": f"{profile.get('first_name', '')} {profile.get('last_name', '')}".strip(),
-                        "image_url": profile.get("image_url")
-                    }
-                    print(f"Extracted user data: {user_data}")
-                    return user_data
-                else:
-                    print(f"Clerk API error: {response.status_code} - {response.text}")
-                    return {"user_id": user_id, "email": f"user_{user_id[-8:]}@placeholder.com"}
-                    
         except Exception as e:
             print(f"Error fetching user profile: {e}")
-            return {"user_id": user_id, "email": f"user_{user_id[-8:]}@placeholder.com"}
+            return None
 
 
 clerk_auth = ClerkAuth()
@@ -189,8 +309,33 @@ async def get_optional_user(request: Request) -> Optional[dict]:
 async def get_or_create_user_from_token(current_user: dict) -> dict:
     """
     Get or create user in Supabase from Clerk token data
+    
+    The Clerk profile (email, name, avatar) is only fetched when the user
+    has no row yet.
     """
     from app.services.supabase_service import UserService
     
     user_service = UserService()
-    return user_service.get_or_create_user(current_user["user_id"], current_user)
+    user = await user_service.get_user_by_clerk_id(current_user["user_id"])
+    if user:
+        return user
+    
+    profile = await clerk_auth.fetch_user_profile(current_user["user_id"])
+    return await user_service.get_or_create_user(current_user["user_id"], {**current_user, **profile})
+
+
+async def get_db_user(current_user: dict = Depends(get_current_user)) -> dict:
+    """
+    Dependency to get the internal user row of the authenticated user
+    
+    FastAPI resolves a dependency once per request, so every handler and
+    sub-dependency shares one lookup, and across requests the row comes
+    from the user cache instead of a `users` query.
+    """
+    user = await get_or_create_user_from_token(current_user)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+    return user
@@ -40,6 +40,13 @@ CREATE TABLE entries (
     collection_id TEXT REFERENCES collections(id) ON DELETE CASCADE,
     user_id TEXT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
     content_embedding VECTOR(384),  -- For semantic search using sentence-transformers
+    embedding_status TEXT NOT NULL DEFAULT 'pending'
+        CHECK (embedding_status IN ('pending', 'done', 'failed')),  -- Set by the background embedding worker
+    embedding_version TEXT,  -- Hash of the title and content the embedding is computed from
+    search_vector TSVECTOR GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(content, '')), 'B')
+    ) STORED,  -- For keyword search; titles weigh more than bodies
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
@@ -47,6 +54,110 @@ CREATE TABLE entries (
 -- Index for semantic search
 CREATE INDEX IF NOT EXISTS entries_content_embedding_idx 
 ON entries USING hnsw (content_embedding vector_cosine_ops);
+
+-- Per-user lookups; lets the planner scan a small user's rows exactly
+-- instead of walking the global HNSW graph
+CREATE INDEX IF NOT EXISTS entries_user_id_idx
+ON entries (user_id);
+
+-- Index for keyword search
+CREATE INDEX IF NOT EXISTS entries_search_vector_idx
+ON entries USING gin (search_vector);
+"""
+
+# For databases created before embedding_status existed
+ENTRIES_EMBEDDING_STATUS_MIGRATION = """
+ALTER TABLE entries ADD COLUMN IF NOT EXISTS embedding_status TEXT NOT NULL DEFAULT 'pending'
+    CHECK (embedding_status IN ('pending', 'done', 'failed'));
+UPDATE entries SET embedding_status = 'done' WHERE content_embedding IS NOT NULL;
+"""
+
+# For databases created before embedding_version existed; the worker only
+# writes an embedding if the row still holds the version it was queued for
+ENTRIES_EMBEDDING_VERSION_MIGRATION = """
+ALTER TABLE entries ADD COLUMN IF NOT EXISTS embedding_version TEXT;
+"""
+
+# For databases created before entries_user_id_idx existed
+ENTRIES_USER_ID_INDEX_MIGRATION = """
+CREATE INDEX IF NOT EXISTS entries_user_id_idx ON entries (user_id);
+"""
+
+# For databases created before search_vector existed (rewrites the table once)
+ENTRIES_SEARCH_VECTOR_MIGRATION = """
+ALTER TABLE entries ADD COLUMN IF NOT EXISTS search_vector TSVECTOR GENERATED ALWAYS AS (
+    setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce(content, '')), 'B')
+) STORED;
+CREATE INDEX IF NOT EXISTS entries_search_vector_idx ON entries USING gin (search_vector);
+"""
+
+# Server-side top-k semantic search, called through PostgREST as
+# supabase.rpc("match_entries", {...}). Ordering by the cosine distance
+# operator lets the planner walk entries_content_embedding_idx instead of
+# shipping every embedding to the API process. Requires pgvector >= 0.8 for
+# hnsw.iterative_scan; creating the function fails on older versions, and
+# the service then scores in Python.
+MATCH_ENTRIES_FUNCTION_SCHEMA = """
+CREATE OR REPLACE FUNCTION match_entries(
+    p_user_id TEXT,
+    query_embedding VECTOR(384),
+    match_count INT DEFAULT 10,
+    similarity_threshold FLOAT DEFAULT 0,
+    p_start_date TIMESTAMP WITH TIME ZONE DEFAULT NULL,
+    p_end_date TIMESTAMP WITH TIME ZONE DEFAULT NULL,
+    p_mood TEXT DEFAULT NULL,
+    p_collection_id TEXT DEFAULT NULL
+)
+RETURNS TABLE (id TEXT, distance FLOAT)
+LANGUAGE sql STABLE
+-- HNSW filters after the graph walk; widen the candidate list and keep
+-- walking the graph until the per-user filters leave match_count rows.
+SET hnsw.ef_search = 200
+SET hnsw.iterative_scan = strict_order
+AS $$
+    SELECT e.id, e.content_embedding <=> query_embedding AS distance
+    FROM entries e
+    WHERE e.user_id = p_user_id
+      AND e.content_embedding IS NOT NULL
+      AND (p_start_date IS NULL OR e.created_at >= p_start_date)
+      AND (p_end_date IS NULL OR e.created_at <= p_end_date)
+      AND (p_mood IS NULL OR e.mood = p_mood)
+      AND (p_collection_id IS NULL OR e.collection_id = p_collection_id)
+      AND 1 - (e.content_embedding <=> query_embedding) >= similarity_threshold
+    ORDER BY e.content_embedding <=> query_embedding
+    LIMIT match_count;
+$$;
+"""
+
+# Server-side keyword search, called as supabase.rpc("keyword_search_entries", {...}).
+# websearch_to_tsquery accepts free text ("beach -work", "\"first day\""), the
+# GIN index finds the matches and ts_rank_cd normalization 32 maps the rank
+# into [0, 1) so it can be blended with cosine similarity.
+KEYWORD_SEARCH_ENTRIES_FUNCTION_SCHEMA = """
+CREATE OR REPLACE FUNCTION keyword_search_entries(
+    p_user_id TEXT,
+    query_text TEXT,
+    match_count INT DEFAULT 10,
+    p_start_date TIMESTAMP WITH TIME ZONE DEFAULT NULL,
+    p_end_date TIMESTAMP WITH TIME ZONE DEFAULT NULL,
+    p_mood TEXT DEFAULT NULL,
+    p_collection_id TEXT DEFAULT NULL
+)
+RETURNS TABLE (id TEXT, rank FLOAT)
+LANGUAGE sql STABLE
+AS $$
+    SELECT e.id, ts_rank_cd(e.search_vector, q, 32)::float AS rank
+    FROM entries e, websearch_to_tsquery('english', query_text) AS q
+    WHERE e.user_id = p_user_id
+      AND e.search_vector @@ q
+      AND (p_start_date IS NULL OR e.created_at >= p_start_date)
+      AND (p_end_date IS NULL OR e.created_at <= p_end_date)
+      AND (p_mood IS NULL OR e.mood = p_mood)
+      AND (p_collection_id IS NULL OR e.collection_id = p_collection_id)
+    ORDER BY rank DESC
+    LIMIT match_count;
+$$;
 """
 
 DRAFTS_TABLE_SCHEMA = """
@@ -60,3 +171,25 @@ CREATE TABLE drafts (
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 """
+
+# Bulk write-back for the embedding backfill: one call updates a whole page.
+# payload is a JSON array of {"id": ..., "embedding": [...], "version": ...}
+# objects; rows whose embedding_version no longer matches (edited since the
+# page was read) are skipped. NULL matches NULL for rows never versioned.
+UPDATE_ENTRY_EMBEDDINGS_FUNCTION_SCHEMA = """
+CREATE OR REPLACE FUNCTION update_entry_embeddings(payload JSONB)
+RETURNS INT
+LANGUAGE sql
+AS $$
+    WITH updated AS (
+        UPDATE entries e
+        SET content_embedding = (item->>'embedding')::vector,
+            embedding_status = 'done'
+        FROM jsonb_array_elements(payload) AS item
+        WHERE e.id = item->>'id'
+          AND e.embedding_version IS NOT DISTINCT FROM item->>'version'
+        RETURNING e.id
+    )
+    SELECT count(*)::int FROM updated;
+$$;
+"""
@@ -4,9 +4,9 @@ Analytics API router
 from datetime import datetime, timedelta
 from typing import Dict, Any
 from fastapi import APIRouter, Depends, HTTPException, status, Request
-from app.middleware import get_current_user, limiter
+from app.middleware import get_db_user, limiter
 from app.schemas import AnalyticsResponse
-from app.services.supabase_service import UserService, EntryService
+from app.services.supabase_service import EntryService
 from app.services.mood_service import get_mood_by_id
 
 router = APIRouter(prefix="/analytics", tags=["analytics"])
@@ -17,21 +17,12 @@ router = APIRouter(prefix="/analytics", tags=["analytics"])
 async def get_analytics(
     request: Request,
     period: str = "30d",
-    current_user: dict = Depends(get_current_user)
+    user: dict = Depends(get_db_user)
 ):
     """
     Get analytics data for the authenticated user
     """
     try:
-        # Get user from Supabase
-        user_service = UserService()
-        user = user_service.get_user_by_clerk_id(current_user["user_id"])
-        if not user:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="User not found"
-            )
-
         # Calculate start date based on period
         start_date = datetime.now()
         if period == "7d":
@@ -47,7 +38,7 @@ async def get_analytics(
 
         # Get entries for the period using Supabase
         entry_service = EntryService()
-        all_entries = entry_service.get_entries(user["id"])
+        all_entries = await entry_service.get_entries(user["id"])
         
         # Filter entries by date (since Supabase query might not support date filtering directly)
         entries = []
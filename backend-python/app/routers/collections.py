@@ -1,8 +1,8 @@
 from typing import List
 from fastapi import APIRouter, Depends, HTTPException, status, Request
-from app.middleware import get_current_user, limiter
+from app.middleware import get_db_user, limiter
 from app.schemas import Collection as CollectionSchema, CollectionCreate, CollectionUpdate, StandardResponse
-from app.services.supabase_service import UserService, CollectionService
+from app.services.supabase_service import CollectionService
 
 router = APIRouter(prefix="/collections", tags=["collections"])
 
@@ -11,16 +11,13 @@ router = APIRouter(prefix="/collections", tags=["collections"])
 @limiter.limit("60/minute")
 async def get_collections(
     request: Request,
-    current_user: dict = Depends(get_current_user)
+    user: dict = Depends(get_db_user)
 ):
     """
     Get all collections for the authenticated user
     """
-    user_service = UserService()
-    user = user_service.get_or_create_user(current_user["user_id"], current_user)
-
     collection_service = CollectionService()
-    collections = collection_service.get_collections(user["id"])
+    collections = await collection_service.get_collections(user["id"])
 
     return collections
 
@@ -30,17 +27,14 @@ async def get_collections(
 async def create_collection(
     request: Request,
     collection_data: CollectionCreate,
-    current_user: dict = Depends(get_current_user)
+    user: dict = Depends(get_db_user)
 ):
     """
     Create a new collection for the authenticated user
     """
     try:
-        user_service = UserService()
-        user = user_service.get_or_create_user(current_user["user_id"], current_user)
-
         collection_service = CollectionService()
-        collection = collection_service.create_collection(
+        collection = await collection_service.create_collection(
             user["id"],
             collection_data.model_dump()
         )
@@ -66,19 +60,16 @@ async def update_collection(
     request: Request,
     collection_id: str,
     collection_data: CollectionUpdate,
-    current_user: dict = Depends(get_current_user)
+    user: dict = Depends(get_db_user)
 ):
     """
     Update a collection for the authenticated user
     """
     try:
-        user_service = UserService()
-        user = user_service.get_or_create_user(current_user["user_id"], current_user)
-
         collection_service = CollectionService()
         
         # Check if collection exists
-        existing_collection = collection_service.get_collection(collection_id, user["id"])
+        existing_collection = await collection_service.get_collection(collection_id, user["id"])
         if not existing_collection:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -86,7 +77,7 @@ async def update_collection(
             )
 
         update_data = collection_data.model_dump(exclude_unset=True)
-        collection = collection_service.update_collection(
+        collection = await collection_service.update_collection(
             collection_id,
             user["id"],
             update_data
@@ -114,26 +105,23 @@ async def update_collection(
 async def delete_collection(
     request: Request,
     collection_id: str,
-    current_user: dict = Depends(get_current_user)
+    user: dict = Depends(get_db_user)
 ):
     """
     Delete a collection for the authenticated user
     """
     try:
-        user_service = UserService()
-        user = user_service.get_or_create_user(current_user["user_id"], current_user)
-
         collection_service = CollectionService()
         
         # Check if collection exists
-        existing_collection = collection_service.get_collection(collection_id, user["id"])
+        existing_collection = await collection_service.get_collection(collection_id, user["id"])
         if not existing_collection:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Collection not found"
             )
 
-        success = collection_service.delete_collection(collection_id, user["id"])
+        success = await collection_service.delete_collection(collection_id, user["id"])
         if not success:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -1,12 +1,12 @@
 from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException, status, Request, Query
-from app.middleware import get_current_user, limiter
+from app.middleware import get_db_user, limiter
 from app.schemas import (
     Entry as EntrySchema, EntryCreate, EntryUpdate, 
     EntryListResponse, StandardResponse,
     Draft as DraftSchema, DraftCreate, DraftUpdate
 )
-from app.services.supabase_service import UserService, EntryService, DraftService, CollectionService
+from app.services.supabase_service import EntryService, DraftService, CollectionService
 from app.services.external_api_service import ExternalAPIService
 from app.services.mood_service import get_mood_by_key, get_mood_by_id
 
@@ -18,20 +18,12 @@ router = APIRouter(prefix="/journal", tags=["journal"])
 async def create_journal_entry(
     request: Request,
     entry_data: EntryCreate,
-    current_user: dict = Depends(get_current_user)
+    user: dict = Depends(get_db_user)
 ):
     """
     Create a new journal entry for the authenticated user
     """
     try:
-        user_service = UserService()
-        user = user_service.get_user_by_clerk_id(current_user["user_id"])
-        if not user:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="User not found"
-            )
-
         # Get mood data
         mood = get_mood_by_key(entry_data.mood)
         if not mood:
@@ -47,7 +39,7 @@ async def create_journal_entry(
         collection_id = None
         if entry_data.collectionId and entry_data.collectionId.strip():
             collection_service = CollectionService()
-            collection = collection_service.get_collection(entry_data.collectionId, user["id"])
+            collection = await collection_service.get_collection(entry_data.collectionId, user["id"])
             if not collection:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
@@ -66,16 +58,12 @@ async def create_journal_entry(
             "collection_id": collection_id
         }
 
-        # Use async method to create entry with embedding generation
-        try:
-            entry = await entry_service.create_entry(user["id"], entry_data_dict)
-        except Exception as e:
-            print(f"Failed to create entry with embedding, falling back to sync method: {e}")
-            entry = entry_service.create_entry_sync(user["id"], entry_data_dict)
+        # Embedding is generated in the background after the row is saved
+        entry = await entry_service.create_entry(user["id"], entry_data_dict)
         
         # Delete existing draft after successful publication
         draft_service = DraftService()
-        draft_service.delete_draft(user["id"])
+        await draft_service.delete_draft(user["id"])
 
         return entry
 
@@ -94,23 +82,15 @@ async def get_journal_entries(
     request: Request,
     collection_id: Optional[str] = Query(None),
     order_by: str = Query("desc", regex="^(asc|desc)$"),
-    current_user: dict = Depends(get_current_user)
+    user: dict = Depends(get_db_user)
 ):
     """
     Get journal entries for the authenticated user
     """
     try:
-        user_service = UserService()
-        user = user_service.get_user_by_clerk_id(current_user["user_id"])
-        if not user:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="User not found"
-            )
-
         # Get entries
         entry_service = EntryService()
-        entries = entry_service.get_entries(user["id"], collection_id, order_by)
+        entries = await entry_service.get_entries(user["id"], collection_id, order_by)
 
         # Add mood data to each entry and convert to camelCase for frontend
         entries_with_mood_data = []
@@ -151,40 +131,32 @@ async def get_collection_entries(
     request: Request,
     collection_id: str,
     order_by: str = Query("desc", regex="^(asc|desc)$"),
-    current_user: dict = Depends(get_current_user)
+    user: dict = Depends(get_db_user)
 ):
     """
     Get journal entries for a specific collection
     """
     try:
-        user_service = UserService()
-        user = user_service.get_user_by_clerk_id(current_user["user_id"])
-        if not user:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="User not found"
-            )
-
         # Handle special cases
         entry_service = EntryService()
         
         if collection_id == "all":
             # Return all entries for the user
-            entries = entry_service.get_entries(user["id"], None, order_by)
+            entries = await entry_service.get_entries(user["id"], None, order_by)
         elif collection_id == "unorganized":
             # Return entries without collection
-            entries = entry_service.get_entries(user["id"], "unorganized", order_by)
+            entries = await entry_service.get_entries(user["id"], "unorganized", order_by)
         else:
             # Verify collection exists and belongs to user for real collections
             collection_service = CollectionService()
-            collection = collection_service.get_collection(collection_id, user["id"])
+            collection = await collection_service.get_collection(collection_id, user["id"])
             if not collection:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail="Collection not found"
                 )
             # Get entries for this specific collection
-            entries = entry_service.get_entries(user["id"], collection_id, order_by)
+            entries = await entry_service.get_entries(user["id"], collection_id, order_by)
 
         # Add mood data to each entry and convert to camelCase for frontend
         entries_with_mood_data = []
@@ -226,21 +198,13 @@ async def get_collection_entries(
 async def get_journal_entry(
     request: Request,
     entry_id: str,
-    current_user: dict = Depends(get_current_user)
+    user: dict = Depends(get_db_user)
 ):
     """
     Get a specific journal entry for the authenticated user
     """
-    user_service = UserService()
-    user = user_service.get_user_by_clerk_id(current_user["user_id"])
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found"
-        )
-
     entry_service = EntryService()
-    entry = entry_service.get_entry(entry_id, user["id"])
+    entry = await entry_service.get_entry(entry_id, user["id"])
 
     if not entry:
         raise HTTPException(
@@ -260,34 +224,51 @@ async def get_journal_entry(
         "createdAt": entry["created_at"],
         "updatedAt": entry["updated_at"],
         "userId": entry["user_id"],
+        "embeddingStatus": entry.get("embedding_status"),
         "moodData": get_mood_by_id(entry["mood"])
     }
 
     return entry_with_mood_data
 
 
+@router.get("/entries/{entry_id}/embedding-status", response_model=StandardResponse)
+@limiter.limit("120/minute")
+async def get_entry_embedding_status(
+    request: Request,
+    entry_id: str,
+    user: dict = Depends(get_db_user)
+):
+    """
+    Get the background embedding state (pending, done or failed) of an entry
+    """
+    entry_service = EntryService()
+    embedding_status = await entry_service.get_embedding_status(entry_id, user["id"])
+    if embedding_status is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Entry not found"
+        )
+
+    return StandardResponse(
+        success=True,
+        data={"entryId": entry_id, "embeddingStatus": embedding_status}
+    )
+
+
 @router.put("/entries/{entry_id}", response_model=EntrySchema)
 @limiter.limit("30/minute")
 async def update_journal_entry(
     request: Request,
     entry_id: str,
     entry_data: EntryUpdate,
-    current_user: dict = Depends(get_current_user)
+    user: dict = Depends(get_db_user)
 ):
     """
     Update a journal entry for the authenticated user
     """
     try:
-        user_service = UserService()
-        user = user_service.get_user_by_clerk_id(current_user["user_id"])
-        if not user:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="User not found"
-            )
-
         entry_service = EntryService()
-        entry = entry_service.get_entry(entry_id, user["id"])
+        entry = await entry_service.get_entry(entry_id, user["id"])
 
         if not entry:
             raise HTTPException(
@@ -318,11 +299,7 @@ async def update_journal_entry(
             update_data["collection_id"] = update_data.pop("collectionId")
 
         # Update the entry
-        try:
-            updated_entry = await entry_service.update_entry(entry_id, user["id"], update_data)
-        except Exception as e:
-            print(f"Failed to update entry with embedding, falling back to sync method: {e}")
-            updated_entry = entry_service.update_entry_sync(entry_id, user["id"], update_data)
+        updated_entry = await entry_service.update_entry(entry_id, user["id"], update_data)
 
         return updated_entry
 
@@ -340,22 +317,14 @@ async def update_journal_entry(
 async def delete_journal_entry(
     request: Request,
     entry_id: str,
-    current_user: dict = Depends(get_current_user)
+    user: dict = Depends(get_db_user)
 ):
     """
     Delete a journal entry for the authenticated user
     """
     try:
-        user_service = UserService()
-        user = user_service.get_user_by_clerk_id(current_user["user_id"])
-        if not user:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="User not found"
-            )
-
         entry_service = EntryService()
-        entry = entry_service.get_entry(entry_id, user["id"])
+        entry = await entry_service.get_entry(entry_id, user["id"])
 
         if not entry:
             raise HTTPException(
@@ -363,7 +332,7 @@ async def delete_journal_entry(
                 detail="Entry not found"
             )
 
-        success = entry_service.delete_entry(entry_id, user["id"])
+        success = await entry_service.delete_entry(entry_id, user["id"])
         if not success:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -386,22 +355,14 @@ async def delete_journal_entry(
 @limiter.limit("60/minute")
 async def get_draft(
     request: Request,
-    current_user: dict = Depends(get_current_user)
+    user: dict = Depends(get_db_user)
 ):
     """
     Get current draft for the authenticated user
     """
     try:
-        user_service = UserService()
-        user = user_service.get_user_by_clerk_id(current_user["user_id"])
-        if not user:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="User not found"
-            )
-
         draft_service = DraftService()
-        draft = draft_service.get_draft(user["id"])
+        draft = await draft_service.get_draft(user["id"])
 
         return StandardResponse(
             success=True,
@@ -420,22 +381,14 @@ async def get_draft(
 async def save_draft(
     request: Request,
     draft_data: DraftCreate,
-    current_user: dict = Depends(get_current_user)
+    user: dict = Depends(get_db_user)
 ):
     """
     Save draft for the authenticated user
     """
     try:
-        user_service = UserService()
-        user = user_service.get_user_by_clerk_id(current_user["user_id"])
-        if not user:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="User not found"
-            )
-
         draft_service = DraftService()
-        draft = draft_service.save_draft(user["id"], draft_data.model_dump())
+        draft = await draft_service.save_draft(user["id"], draft_data.model_dump())
 
         return StandardResponse(
             success=True,
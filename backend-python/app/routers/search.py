@@ -1,55 +1,85 @@
-from typing import List
+import json
+from typing import List, Optional
 from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException, status, Request
-from app.middleware import get_current_user, limiter
+from fastapi import APIRouter, Depends, HTTPException, Query, status, Request
+from fastapi.responses import StreamingResponse
+from app.middleware import get_db_user, limiter
 from app.schemas import (
     SemanticSearchRequest, HybridSearchRequest, SearchResponse, 
-    SearchResultEntry, EmbeddingUpdateResponse, StandardResponse
+    SearchResultEntry, EmbeddingUpdateResponse, StandardResponse,
+    BatchSearchRequest, BatchSearchResponse
 )
-from app.services.supabase_service import UserService
-from app.services.semantic_search_service import semantic_search_service
+from app.services.semantic_search_service import SEARCH_SUGGESTIONS, semantic_search_service
 
 router = APIRouter(prefix="/search", tags=["search"])
 
 
+def parse_date_range(start_date: Optional[str], end_date: Optional[str]):
+    """Parse optional ISO dates into a (start, end) filter; malformed dates are a 400"""
+    if not start_date and not end_date:
+        return None
+    try:
+        return (
+            datetime.fromisoformat(start_date) if start_date else None,
+            datetime.fromisoformat(end_date) if end_date else None
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid date: {str(e)}"
+        )
+
+
 @router.post("/semantic", response_model=SearchResponse)
 @limiter.limit("30/minute")  # Rate limit for search
 async def semantic_search(
     request: Request,
     search_request: SemanticSearchRequest,
-    current_user: dict = Depends(get_current_user)
+    user: dict = Depends(get_db_user)
 ):
     """
     Perform semantic search on journal entries
     """
     try:
-        user_service = UserService()
-        user = user_service.get_user_by_clerk_id(current_user["user_id"])
-        if not user:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="User not found"
-            )
-
         # Parse date range if provided
-        date_range = None
-        if search_request.start_date or search_request.end_date:
-            start_date = datetime.fromisoformat(search_request.start_date) if search_request.start_date else None
-            end_date = datetime.fromisoformat(search_request.end_date) if search_request.end_date else None
-            if start_date or end_date:
-                date_range = (start_date, end_date)
+        date_range = parse_date_range(search_request.start_date, search_request.end_date)
 
-        # Perform semantic search
-        results = await semantic_search_service.search_entries(
+        # Turn dates, moods and collection names in the query into filters
+        plan = await semantic_search_service.plan_query(
             user_id=user["id"],
             query=search_request.query,
-            limit=search_request.limit,
-            similarity_threshold=search_request.similarity_threshold,
             date_range=date_range,
             mood_filter=search_request.mood_filter,
             collection_id=search_request.collection_id
         )
 
+        # Perform semantic search
+        next_cursor = None
+        if search_request.cursor or search_request.paginate:
+            # Rank once, keep the ordering server-side and page through it
+            try:
+                results, next_cursor = await semantic_search_service.search_page(
+                    user_id=user["id"],
+                    query=search_request.query,
+                    limit=search_request.limit,
+                    similarity_threshold=search_request.similarity_threshold,
+                    cursor=search_request.cursor,
+                    plan=plan
+                )
+            except ValueError as e:
+                raise HTTPException(status_code=status.HTTP_410_GONE, detail=str(e))
+        else:
+            results = await semantic_search_service.search_entries(
+                user_id=user["id"],
+                query=search_request.query,
+                limit=search_request.limit,
+                similarity_threshold=search_request.similarity_threshold,
+                date_range=date_range,
+                mood_filter=search_request.mood_filter,
+                collection_id=search_request.collection_id,
+                plan=plan
+            )
+
         # Convert results to response format
         search_results = []
         for result in results:
@@ -73,9 +103,13 @@ async def semantic_search(
             query=search_request.query,
             total_results=len(search_results),
             results=search_results,
-            search_type="semantic"
+            search_type="semantic",
+            next_cursor=next_cursor,
+            debug={"plan": plan.as_dict()} if search_request.debug else None
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error in semantic search: {e}")
         raise HTTPException(
@@ -84,32 +118,139 @@ async def semantic_search(
         )
 
 
+@router.post("/semantic/stream")
+@limiter.limit("30/minute")  # Rate limit for search
+async def semantic_search_stream(
+    request: Request,
+    search_request: SemanticSearchRequest,
+    user: dict = Depends(get_db_user)
+):
+    """
+    Stream semantic search results as NDJSON
+
+    Emits a "meta" line as soon as ranking finishes, one "result" line per
+    entry as rows are loaded, and an "end" line with the cursor for
+    POST /search/semantic to fetch deeper pages.
+    """
+    date_range = parse_date_range(search_request.start_date, search_request.end_date)
+
+    plan = await semantic_search_service.plan_query(
+        user_id=user["id"],
+        query=search_request.query,
+        date_range=date_range,
+        mood_filter=search_request.mood_filter,
+        collection_id=search_request.collection_id
+    )
+
+    async def events():
+        try:
+            async for event in semantic_search_service.stream_search(
+                user_id=user["id"],
+                query=search_request.query,
+                limit=search_request.limit,
+                similarity_threshold=search_request.similarity_threshold,
+                plan=plan
+            ):
+                if event["type"] == "meta" and search_request.debug:
+                    event["debug"] = {"plan": plan.as_dict()}
+                yield json.dumps(event, default=str) + "\n"
+        except Exception as e:
+            print(f"Error in streaming search: {e}")
+            yield json.dumps({"type": "error", "detail": "Search failed"}) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
+@router.post("/batch", response_model=BatchSearchResponse)
+@limiter.limit("30/minute")  # Rate limit for search
+async def batch_search(
+    request: Request,
+    search_request: BatchSearchRequest,
+    user: dict = Depends(get_db_user)
+):
+    """
+    Perform several semantic searches in one request
+    """
+    try:
+        queries = search_request.queries
+
+        # Parse date range if provided
+        date_range = parse_date_range(search_request.start_date, search_request.end_date)
+
+        batch_results = await semantic_search_service.batch_search_entries(
+            user_id=user["id"],
+            queries=queries,
+            limit=search_request.limit,
+            similarity_threshold=search_request.similarity_threshold,
+            date_range=date_range,
+            mood_filter=search_request.mood_filter,
+            collection_id=search_request.collection_id
+        )
+
+        responses = []
+        for query, results in zip(queries, batch_results):
+            search_results = [
+                SearchResultEntry(
+                    id=result["id"],
+                    title=result["title"],
+                    content=result["content"],
+                    mood=result["mood"],
+                    mood_score=result["mood_score"],
+                    mood_image_url=result.get("mood_image_url"),
+                    collection_id=result.get("collection_id"),
+                    user_id=result["user_id"],
+                    created_at=datetime.fromisoformat(result["created_at"]),
+                    updated_at=datetime.fromisoformat(result["updated_at"]),
+                    similarity_score=result.get("similarity_score")
+                )
+                for result in results
+            ]
+            responses.append(SearchResponse(
+                success=True,
+                query=query,
+                total_results=len(search_results),
+                results=search_results,
+                search_type="semantic"
+            ))
+
+        return BatchSearchResponse(
+            success=True,
+            total_queries=len(responses),
+            results=responses
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error in batch search: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Search failed: {str(e)}"
+        )
+
+
 @router.post("/hybrid", response_model=SearchResponse)
 @limiter.limit("30/minute")  # Rate limit for search
 async def hybrid_search(
     request: Request,
     search_request: HybridSearchRequest,
-    current_user: dict = Depends(get_current_user)
+    user: dict = Depends(get_db_user)
 ):
     """
     Perform hybrid search (semantic + keyword) on journal entries
     """
     try:
-        user_service = UserService()
-        user = user_service.get_user_by_clerk_id(current_user["user_id"])
-        if not user:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="User not found"
-            )
-
         # Parse date range if provided
-        date_range = None
-        if search_request.start_date or search_request.end_date:
-            start_date = datetime.fromisoformat(search_request.start_date) if search_request.start_date else None
-            end_date = datetime.fromisoformat(search_request.end_date) if search_request.end_date else None
-            if start_date or end_date:
-                date_range = (start_date, end_date)
+        date_range = parse_date_range(search_request.start_date, search_request.end_date)
+
+        # Turn dates, moods and collection names in the query into filters
+        plan = await semantic_search_service.plan_query(
+            user_id=user["id"],
+            query=search_request.query,
+            date_range=date_range,
+            mood_filter=search_request.mood_filter,
+            collection_id=search_request.collection_id
+        )
 
         # Perform hybrid search
         results = await semantic_search_service.hybrid_search_entries(
@@ -120,7 +261,8 @@ async def hybrid_search(
             keyword_weight=search_request.keyword_weight,
             date_range=date_range,
             mood_filter=search_request.mood_filter,
-            collection_id=search_request.collection_id
+            collection_id=search_request.collection_id,
+            plan=plan
         )
 
         # Convert results to response format
@@ -148,7 +290,8 @@ async def hybrid_search(
             query=search_request.query,
             total_results=len(search_results),
             results=search_results,
-            search_type="hybrid"
+            search_type="hybrid",
+            debug={"plan": plan.as_dict()} if search_request.debug else None
         )
 
     except Exception as e:
@@ -159,31 +302,97 @@ async def hybrid_search(
         )
 
 
-@router.post("/embeddings/update", response_model=EmbeddingUpdateResponse)
-@limiter.limit("2/hour")  # Rate limit for batch updates
-async def update_embeddings(
+@router.get("/similar/{entry_id}", response_model=SearchResponse)
+@limiter.limit("60/minute")  # Cheap: no model call
+async def similar_entries(
     request: Request,
-    current_user: dict = Depends(get_current_user)
+    entry_id: str,
+    limit: int = Query(10, ge=1, le=50),
+    similarity_threshold: float = Query(0.1, ge=0.0, le=1.0),
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    mood_filter: Optional[str] = None,
+    collection_id: Optional[str] = None,
+    user: dict = Depends(get_db_user)
 ):
     """
-    Update embeddings for all user entries that don't have them
+    Find entries similar to an existing entry, using its stored embedding
     """
     try:
-        user_service = UserService()
-        user = user_service.get_user_by_clerk_id(current_user["user_id"])
-        if not user:
+        # Parse date range if provided
+        date_range = parse_date_range(start_date, end_date)
+
+        results = await semantic_search_service.similar_entries(
+            user_id=user["id"],
+            entry_id=entry_id,
+            limit=limit,
+            similarity_threshold=similarity_threshold,
+            date_range=date_range,
+            mood_filter=mood_filter,
+            collection_id=collection_id
+        )
+        if results is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
-                detail="User not found"
+                detail="Entry not found or not yet embedded"
+            )
+
+        # Convert results to response format
+        search_results = []
+        for result in results:
+            search_result = SearchResultEntry(
+                id=result["id"],
+                title=result["title"],
+                content=result["content"],
+                mood=result["mood"],
+                mood_score=result["mood_score"],
+                mood_image_url=result.get("mood_image_url"),
+                collection_id=result.get("collection_id"),
+                user_id=result["user_id"],
+                created_at=datetime.fromisoformat(result["created_at"]),
+                updated_at=datetime.fromisoformat(result["updated_at"]),
+                similarity_score=result.get("similarity_score")
             )
+            search_results.append(search_result)
 
+        return SearchResponse(
+            success=True,
+            query=entry_id,
+            total_results=len(search_results),
+            results=search_results,
+            search_type="similar"
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error in similar entries search: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Search failed: {str(e)}"
+        )
+
+
+@router.post("/embeddings/update", response_model=EmbeddingUpdateResponse)
+@limiter.limit("2/hour")  # Rate limit for batch updates
+async def update_embeddings(
+    request: Request,
+    user: dict = Depends(get_db_user)
+):
+    """
+    Update embeddings for all user entries that don't have them
+    """
+    try:
         # Update embeddings for entries without them
-        updated_count = await semantic_search_service.batch_update_embeddings(user["id"])
+        stats = await semantic_search_service.batch_update_embeddings(user["id"])
 
         return EmbeddingUpdateResponse(
             success=True,
-            entries_updated=updated_count,
-            message=f"Successfully updated embeddings for {updated_count} entries"
+            entries_updated=stats.written,
+            message=f"Successfully updated embeddings for {stats.written} entries",
+            failed=stats.failed,
+            elapsed_seconds=round(stats.elapsed, 3),
+            entries_per_second=round(stats.rate, 2)
         )
 
     except Exception as e:
@@ -198,25 +407,12 @@ async def update_embeddings(
 @limiter.limit("20/minute")
 async def search_suggestions(
     request: Request,
-    current_user: dict = Depends(get_current_user)
+    user: dict = Depends(get_db_user)
 ):
     """
     Get search suggestions based on common queries
     """
-    suggestions = [
-        "What was my worst day this month?",
-        "Show me entries about happiness",
-        "Find sad entries from last week", 
-        "What made me anxious in September?",
-        "Show me my most positive moments",
-        "Find entries about work stress",
-        "What was I grateful for this week?",
-        "Show me entries when I felt lonely",
-        "Find my best day last month",
-        "What made me excited recently?"
-    ]
-    
     return {
         "success": True,
-        "suggestions": suggestions
+        "suggestions": SEARCH_SUGGESTIONS
     }
@@ -2,8 +2,10 @@
 Pydantic schemas for request/response models
 """
 from datetime import datetime
-from typing import Optional, List
-from pydantic import BaseModel, Field
+from typing import Any, Dict, Optional, List
+from pydantic import BaseModel, Field, constr
+
+from app.core.config import settings
 
 
 # Base schemas
@@ -91,6 +93,7 @@ class Entry(EntryBase):
     created_at: datetime
     updated_at: datetime
     collection: Optional[Collection] = None
+    embedding_status: Optional[str] = None  # "pending", "done" or "failed"
     
     class Config:
         from_attributes = True
@@ -162,7 +165,7 @@ class StandardResponse(BaseModel):
 
 
 # Search schemas
-class SemanticSearchRequest(BaseModel):
+class SearchRequestBase(BaseModel):
     query: str = Field(..., min_length=1, max_length=1000, description="Search query")
     limit: Optional[int] = Field(10, ge=1, le=50, description="Maximum number of results")
     similarity_threshold: Optional[float] = Field(0.1, ge=0.0, le=1.0, description="Minimum similarity score")
@@ -170,9 +173,15 @@ class SemanticSearchRequest(BaseModel):
     collection_id: Optional[str] = Field(None, description="Filter by collection")
     start_date: Optional[str] = Field(None, description="Start date filter (ISO format)")
     end_date: Optional[str] = Field(None, description="End date filter (ISO format)")
+    debug: bool = Field(False, description="Include the query plan in the response")
+
+
+class SemanticSearchRequest(SearchRequestBase):
+    paginate: bool = Field(False, description="Rank deeper and return a cursor for further pages")
+    cursor: Optional[str] = Field(None, description="Cursor from a previous page")
 
 
-class HybridSearchRequest(SemanticSearchRequest):
+class HybridSearchRequest(SearchRequestBase):
     semantic_weight: Optional[float] = Field(0.7, ge=0.0, le=1.0, description="Weight for semantic similarity")
     keyword_weight: Optional[float] = Field(0.3, ge=0.0, le=1.0, description="Weight for keyword matching")
 
@@ -188,13 +197,39 @@ class SearchResponse(BaseModel):
     query: str
     total_results: int
     results: List[SearchResultEntry]
-    search_type: str  # "semantic", "hybrid", or "keyword"
+    search_type: str  # "semantic", "hybrid", "keyword" or "similar"
+    next_cursor: Optional[str] = None  # set when more ranked results are available
+    debug: Optional[Dict[str, Any]] = None  # query plan, when requested
+
+
+class BatchSearchRequest(BaseModel):
+    queries: List[constr(strip_whitespace=True, min_length=1, max_length=1000)] = Field(
+        ...,
+        min_length=1,
+        max_length=settings.search_batch_max_queries,
+        description="Search queries, each run as a semantic search"
+    )
+    limit: Optional[int] = Field(10, ge=1, le=50, description="Maximum number of results per query")
+    similarity_threshold: Optional[float] = Field(0.1, ge=0.0, le=1.0, description="Minimum similarity score")
+    mood_filter: Optional[str] = Field(None, description="Filter by mood")
+    collection_id: Optional[str] = Field(None, description="Filter by collection")
+    start_date: Optional[str] = Field(None, description="Start date filter (ISO format)")
+    end_date: Optional[str] = Field(None, description="End date filter (ISO format)")
+
+
+class BatchSearchResponse(BaseModel):
+    success: bool
+    total_queries: int
+    results: List[SearchResponse]  # one response per query, in request order
 
 
 class EmbeddingUpdateResponse(BaseModel):
     success: bool
     entries_updated: int
     message: Optional[str] = None
+    failed: int = 0
+    elapsed_seconds: Optional[float] = None
+    entries_per_second: Optional[float] = None
 
 
 # Update forward references
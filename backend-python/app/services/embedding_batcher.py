@@ -0,0 +1,98 @@
+"""
+Dynamic micro-batching of embedding requests
+"""
+import asyncio
+from concurrent.futures import Executor
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+
+class EmbeddingBatcher:
+    """
+    Coalesce concurrent single-text embedding requests into batched encodes
+
+    Requests are collected until `max_batch_size` texts are waiting or
+    `max_wait_ms` has passed since the first one arrived, then encoded with a
+    single call to `encode_batch` on the executor. Each caller's future is
+    resolved with its own row of the result.
+    """
+
+    def __init__(
+        self,
+        encode_batch: Callable[[List[str]], np.ndarray],
+        executor: Executor,
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0
+    ):
+        self._encode_batch = encode_batch
+        self._executor = executor
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self.batches = 0
+        self.texts = 0
+
+    async def submit(self, text: str) -> np.ndarray:
+        """Queue one text and wait for its embedding"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Futures are bound to a loop; start fresh if it changed (e.g. tests)
+            self._loop = loop
+            self._pending = []
+            self._flush_handle = None
+
+        future = loop.create_future()
+        self._pending.append((text, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.max_wait, self._flush)
+
+        return await future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._pending:
+            return
+
+        batch, self._pending = self._pending, []
+        task = self._loop.create_task(self._run_batch(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, batch: List[Tuple[str, asyncio.Future]]):
+        # Identical texts in one window are encoded once
+        positions: Dict[str, int] = {}
+        texts: List[str] = []
+        for text, _ in batch:
+            if text not in positions:
+                positions[text] = len(texts)
+                texts.append(text)
+
+        try:
+            embeddings = await self._loop.run_in_executor(self._executor, self._encode_batch, texts)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.texts += len(batch)
+        for text, future in batch:
+            if not future.done():
+                future.set_result(embeddings[positions[text]])
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "batches": self.batches,
+            "texts": self.texts,
+            "average_batch_size": round(self.texts / self.batches, 2) if self.batches else 0.0,
+        }
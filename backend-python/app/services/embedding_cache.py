@@ -0,0 +1,118 @@
+"""
+Content-hash cache for text embeddings
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import numpy as np
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace so trivially different strings share a cache entry"""
+    return " ".join(text.split())
+
+
+class EmbeddingCache:
+    """
+    Two-tier embedding cache keyed by model name and sha256 of the normalized text
+
+    The first tier is a bounded in-memory LRU. When `cache_dir` is set,
+    embeddings are also written there as .npy files so they survive restarts
+    and can be shared by workers on the same host.
+    """
+
+    def __init__(self, model_name: str, max_entries: int = 10000, cache_dir: Optional[str] = None):
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def key(self, text: str) -> str:
+        payload = f"{self.model_name}\0{normalize_text(text)}".encode("utf-8")
+        return hashlib.sha256(payload).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.npy")
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        """Return the cached embedding for `text`, or None on a miss"""
+        key = self.key(text)
+        with self._lock:
+            embedding = self._memory.get(key)
+            if embedding is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return embedding
+
+        embedding = self._read_disk(key)
+        with self._lock:
+            if embedding is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(key, embedding)
+        return embedding
+
+    def put(self, text: str, embedding) -> None:
+        """Store an embedding in memory and, if configured, on disk"""
+        key = self.key(text)
+        embedding = np.asarray(embedding, dtype=np.float32)
+        with self._lock:
+            self._remember(key, embedding)
+        self._write_disk(key, embedding)
+
+    def _remember(self, key: str, embedding: np.ndarray):
+        if self.max_entries <= 0:
+            return
+        embedding.setflags(write=False)
+        self._memory[key] = embedding
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _read_disk(self, key: str) -> Optional[np.ndarray]:
+        if not self.cache_dir:
+            return None
+        try:
+            return np.load(self._path(key), allow_pickle=False)
+        except (OSError, ValueError):
+            return None
+
+    def _write_disk(self, key: str, embedding: np.ndarray):
+        if not self.cache_dir:
+            return
+        path = self._path(key)
+        if os.path.exists(path):
+            return
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temp file first so readers never see a partial array
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.save(f, embedding, allow_pickle=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Error writing embedding cache file: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._memory),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            }
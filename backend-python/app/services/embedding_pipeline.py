@@ -0,0 +1,362 @@
+"""
+Bulk embedding backfill pipeline
+"""
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.services.search_cache import search_result_cache
+from app.services.supabase_service import SupabaseService
+from app.services.vector_codec import encode_vectors
+from app.services.vector_index import vector_index_cache
+
+# Columns a store returns for each entry it hands to the pipeline;
+# embedding_version guards the write against edits made in between
+BACKFILL_COLUMNS = "id, user_id, title, content, mood, collection_id, created_at, embedding_version"
+
+
+@dataclass
+class BackfillStats:
+    """Progress and throughput of a backfill run"""
+    scanned: int = 0
+    embedded: int = 0
+    written: int = 0
+    failed: int = 0
+    pages: int = 0
+    last_id: Optional[str] = None
+    # True once the store returned an empty page, i.e. the range is complete
+    exhausted: bool = False
+    started_at: float = field(default_factory=time.monotonic)
+    finished_at: Optional[float] = None
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+    @property
+    def rate(self) -> float:
+        """Entries embedded per second"""
+        return self.embedded / self.elapsed if self.elapsed > 0 else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "scanned": self.scanned,
+            "embedded": self.embedded,
+            "written": self.written,
+            "failed": self.failed,
+            "pages": self.pages,
+            "last_id": self.last_id,
+            "exhausted": self.exhausted,
+            "elapsed_seconds": round(self.elapsed, 3),
+            "entries_per_second": round(self.rate, 2),
+        }
+
+    def __str__(self) -> str:
+        return (
+            f"{self.scanned} scanned, {self.embedded} embedded, {self.written} written, "
+            f"{self.failed} failed in {self.elapsed:.1f}s ({self.rate:.1f} entries/s)"
+        )
+
+
+class SupabaseEmbeddingStore(SupabaseService):
+    """
+    Reads entries by keyset pages and bulk-writes embeddings through Supabase
+
+    With `missing_only`, pages hold entries whose embedding_status is not
+    'done': never embedded, failed, or edited since their vector was
+    computed (the old vector stays searchable until it is replaced).
+    """
+
+    def __init__(
+        self,
+        user_id: Optional[str] = None,
+        missing_only: bool = True,
+        id_range: Optional[Tuple[Optional[str], Optional[str]]] = None
+    ):
+        super().__init__()
+        self.user_id = user_id
+        self.missing_only = missing_only
+        self.id_range = id_range
+
+    def fetch_page(self, after_id: Optional[str], limit: int) -> List[Dict[str, Any]]:
+        """Return up to `limit` entries with id > after_id, ordered by id"""
+        query = self.supabase.table("entries").select(BACKFILL_COLUMNS)
+        if self.user_id:
+            query = query.eq("user_id", self.user_id)
+        if self.missing_only:
+            query = query.neq("embedding_status", "done")
+        low, high = self.id_range or (None, None)
+        if after_id is not None:
+            query = query.gt("id", after_id)
+        elif low is not None:
+            query = query.gte("id", low)
+        if high is not None:
+            query = query.lt("id", high)
+        result = query.order("id").limit(limit).execute()
+        return result.data or []
+
+    def write_embeddings(self, rows: List[Dict[str, Any]], embeddings: List[List[float]]) -> int:
+        """
+        Write many embeddings in one round trip; returns the number of rows updated
+
+        Rows whose embedding_version changed since the page was read (the
+        text was edited meanwhile) are left alone, like the worker's writes.
+        """
+        payload = [
+            {"id": row["id"], "embedding": embedding, "version": row.get("embedding_version")}
+            for row, embedding in zip(rows, embeddings)
+        ]
+        try:
+            result = self.supabase.rpc("update_entry_embeddings", {"payload": payload}).execute()
+            written = int(result.data or 0)
+            written_ids = None if written < len(rows) else {row["id"] for row in rows}
+        except Exception as e:
+            print(f"update_entry_embeddings RPC failed, updating rows one by one: {e}")
+            written_ids = set()
+            for item in payload:
+                query = self.supabase.table("entries").update({
+                    "content_embedding": item["embedding"],
+                    "embedding_status": "done"
+                }).eq("id", item["id"])
+                if item["version"] is None:
+                    query = query.is_("embedding_version", "null")
+                else:
+                    query = query.eq("embedding_version", item["version"])
+                if query.execute().data:
+                    written_ids.add(item["id"])
+            written = len(written_ids)
+
+        for row, embedding in zip(rows, embeddings):
+            if written_ids is None:
+                # The RPC only reports a count; rebuild the indexes it may have skipped
+                vector_index_cache.invalidate(row["user_id"])
+            elif row["id"] in written_ids:
+                vector_index_cache.upsert_entry(row["user_id"], row, embedding)
+        for user_id in {row["user_id"] for row in rows}:
+            search_result_cache.bump(user_id)
+        return written
+
+
+class InMemoryEmbeddingStore:
+    """Store over a list of entry dicts; a stand-in for the entries table in tests and dry runs"""
+
+    def __init__(
+        self,
+        entries: List[Dict[str, Any]],
+        missing_only: bool = True,
+        id_range: Optional[Tuple[Optional[str], Optional[str]]] = None
+    ):
+        self.entries = {entry["id"]: entry for entry in entries}
+        self.missing_only = missing_only
+        self.id_range = id_range
+
+    def fetch_page(self, after_id: Optional[str], limit: int) -> List[Dict[str, Any]]:
+        low, high = self.id_range or (None, None)
+        rows = []
+        for entry_id in sorted(self.entries):
+            entry = self.entries[entry_id]
+            if after_id is not None and entry_id <= after_id:
+                continue
+            if low is not None and entry_id < low:
+                continue
+            if high is not None and entry_id >= high:
+                break
+            default_status = "done" if entry.get("content_embedding") is not None else "pending"
+            if self.missing_only and entry.get("embedding_status", default_status) == "done":
+                continue
+            rows.append(dict(entry))
+            if len(rows) == limit:
+                break
+        return rows
+
+    def write_embeddings(self, rows: List[Dict[str, Any]], embeddings: List[List[float]]) -> int:
+        written = 0
+        for row, embedding in zip(rows, embeddings):
+            entry = self.entries[row["id"]]
+            if entry.get("embedding_version") != row.get("embedding_version"):
+                continue
+            entry["content_embedding"] = embedding
+            entry["embedding_status"] = "done"
+            written += 1
+        return written
+
+
+class PostgresEmbeddingStore:
+    """Store that talks to Postgres directly (psycopg 3), for offline backfills"""
+
+    def __init__(
+        self,
+        dsn: str,
+        user_id: Optional[str] = None,
+        missing_only: bool = True,
+        id_range: Optional[Tuple[Optional[str], Optional[str]]] = None
+    ):
+        import psycopg
+        from psycopg.rows import dict_row
+
+        self._conn = psycopg.connect(dsn, autocommit=True, row_factory=dict_row)
+        self.user_id = user_id
+        self.missing_only = missing_only
+        self.id_range = id_range
+
+    def fetch_page(self, after_id: Optional[str], limit: int) -> List[Dict[str, Any]]:
+        conditions, params = [], []
+        if self.user_id:
+            conditions.append("user_id = %s")
+            params.append(self.user_id)
+        if self.missing_only:
+            conditions.append("embedding_status <> 'done'")
+        low, high = self.id_range or (None, None)
+        if after_id is not None:
+            conditions.append("id > %s")
+            params.append(after_id)
+        elif low is not None:
+            conditions.append("id >= %s")
+            params.append(low)
+        if high is not None:
+            conditions.append("id < %s")
+            params.append(high)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        params.append(limit)
+        return self._conn.execute(
+            f"SELECT {BACKFILL_COLUMNS} FROM entries {where} ORDER BY id LIMIT %s", params
+        ).fetchall()
+
+    def write_embeddings(self, rows: List[Dict[str, Any]], embeddings: List[List[float]]) -> int:
+        ids = [row["id"] for row in rows]
+        versions = [row.get("embedding_version") for row in rows]
+        vectors = encode_vectors(embeddings)
+        cursor = self._conn.execute(
+            """
+            UPDATE entries e
+            SET content_embedding = u.embedding::vector, embedding_status = 'done'
+            FROM unnest(%s::text[], %s::text[], %s::text[]) AS u(id, version, embedding)
+            WHERE e.id = u.id
+              AND e.embedding_version IS NOT DISTINCT FROM u.version
+            """,
+            [ids, versions, vectors]
+        )
+        return cursor.rowcount
+
+
+class Throttle:
+    """Caps throughput at `rate` items per second (None disables it)"""
+
+    def __init__(self, rate: Optional[float] = None):
+        self.rate = rate
+        self._next = time.monotonic()
+
+    async def acquire(self, count: int):
+        if not self.rate:
+            return
+        now = time.monotonic()
+        self._next = max(self._next, now) + count / self.rate
+        delay = self._next - now - count / self.rate
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class EmbeddingBackfillPipeline:
+    """
+    Page through entries, embed them in length-sorted batches and write back in bulk
+
+    Each page is fetched with a keyset cursor (id > last id), so the scan is
+    stable while rows are being updated. Texts are sorted by length before
+    batching to keep padding, and therefore wasted compute, low. Every text
+    is encoded exactly once and each page is written with a single bulk call.
+    """
+
+    def __init__(
+        self,
+        store,
+        embed_batch: Optional[Callable[[List[str]], Awaitable[List[List[float]]]]] = None,
+        page_size: int = 500,
+        batch_size: int = 64,
+        dry_run: bool = False,
+        on_page: Optional[Callable[[BackfillStats], Any]] = None,
+        rate_limit: Optional[float] = None
+    ):
+        if embed_batch is None:
+            from app.services.embedding_service import embedding_service
+            embed_batch = embedding_service.generate_embeddings_batch
+        self.store = store
+        self.embed_batch = embed_batch
+        self.page_size = page_size
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.on_page = on_page
+        self.throttle = Throttle(rate_limit)
+
+    @staticmethod
+    def entry_text(entry: Dict[str, Any]) -> str:
+        return f"{entry.get('title') or ''} {entry.get('content') or ''}"
+
+    async def run(self, after_id: Optional[str] = None, max_entries: Optional[int] = None) -> BackfillStats:
+        """
+        Process entries after `after_id` until the store is exhausted
+
+        Args:
+            after_id (Optional[str]): Resume cursor from a previous run
+            max_entries (Optional[int]): Stop after scanning this many entries
+
+        Returns:
+            BackfillStats: Counters, last processed id and throughput
+        """
+        stats = BackfillStats(last_id=after_id)
+        cursor = after_id
+
+        while max_entries is None or stats.scanned < max_entries:
+            limit = self.page_size
+            if max_entries is not None:
+                limit = min(limit, max_entries - stats.scanned)
+            # Stores are synchronous; keep their round trips off the event loop
+            rows = await asyncio.to_thread(self.store.fetch_page, cursor, limit)
+            if not rows:
+                stats.exhausted = True
+                break
+            cursor = rows[-1]["id"]
+            stats.scanned += len(rows)
+            stats.pages += 1
+
+            if self.dry_run:
+                stats.last_id = cursor
+                self._report(stats)
+                continue
+
+            embedded_rows, embeddings = await self._embed_page(rows, stats)
+            if embedded_rows:
+                stats.written += await asyncio.to_thread(self.store.write_embeddings, embedded_rows, embeddings)
+            stats.last_id = cursor
+            self._report(stats)
+
+        stats.finished_at = time.monotonic()
+        return stats
+
+    async def _embed_page(self, rows: List[Dict[str, Any]], stats: BackfillStats):
+        order = sorted(range(len(rows)), key=lambda i: len(self.entry_text(rows[i])))
+        embedded_rows: List[Dict[str, Any]] = []
+        embeddings: List[List[float]] = []
+
+        for start in range(0, len(order), self.batch_size):
+            batch = [rows[i] for i in order[start:start + self.batch_size]]
+            await self.throttle.acquire(len(batch))
+            vectors = await self.embed_batch([self.entry_text(row) for row in batch])
+            if len(vectors) != len(batch):
+                stats.failed += len(batch)
+                continue
+            for row, vector in zip(batch, vectors):
+                if vector:
+                    embedded_rows.append(row)
+                    embeddings.append(vector)
+                else:
+                    stats.failed += 1
+
+        stats.embedded += len(embedded_rows)
+        return embedded_rows, embeddings
+
+    def _report(self, stats: BackfillStats):
+        if self.on_page:
+            self.on_page(stats)
+        else:
+            print(f"Embedding backfill: {stats}")
@@ -1,9 +1,22 @@
+import importlib.util
 import numpy as np
-from typing import List
-from sentence_transformers import SentenceTransformer
+from typing import List, Mapping, Optional, Sequence, Tuple, Union
 import asyncio
+import threading
+from types import MappingProxyType
 from concurrent.futures import ThreadPoolExecutor
-import torch
+from app.core.config import settings
+from app.services.embedding_batcher import EmbeddingBatcher
+from app.services.embedding_cache import EmbeddingCache, normalize_text
+
+# all-MiniLM-L6-v2 outputs 384-dim embeddings, matching VECTOR(384)
+SENTENCE_TRANSFORMER_MODEL = 'all-MiniLM-L6-v2'
+
+# Packages each backend imports when its model is first loaded
+BACKEND_MODULES = {
+    "sentence-transformers": ("torch", "sentence_transformers"),
+    "onnx": ("onnxruntime", "tokenizers", "huggingface_hub"),
+}
 
 
 class EmbeddingService:
@@ -11,17 +24,129 @@ class EmbeddingService:
     
     def __init__(self):
         self._model = None
+        self._model_lock = threading.Lock()
         self._executor = ThreadPoolExecutor(max_workers=2)
+        # Coalesces concurrent single-text requests into one forward pass
+        self._batcher = EmbeddingBatcher(
+            self._encode_batch,
+            self._executor,
+            max_batch_size=settings.embedding_batch_max_size,
+            max_wait_ms=settings.embedding_batch_max_wait_ms
+        )
+        # "sentence-transformers" (PyTorch) or "onnx" (ONNX Runtime, no torch)
+        self.backend = settings.embedding_model
+        self.cache = EmbeddingCache(
+            model_name=self.model_name,
+            max_entries=settings.embedding_cache_size,
+            cache_dir=settings.embedding_cache_dir
+        )
+        # Read-only vectors for fixed texts (suggestions, mood prompts), filled by warm_up
+        self._precomputed: Mapping[str, np.ndarray] = MappingProxyType({})
+        self.precomputed_hits = 0
         
     def _get_sentence_transformer_model(self):
         """Lazy load sentence transformer model (384-dims to match DB)."""
         if self._model is None:
-            device = 'cuda' if torch.cuda.is_available() else 'cpu'
-            print(f"Using device: {device} for embedding generation.")
-            # all-MiniLM-L6-v2 outputs 384-dim embeddings, matching VECTOR(384)
-            self._model = SentenceTransformer('all-MiniLM-L6-v2', device=device)
+            with self._model_lock:
+                if self._model is None:
+                    # Deferred: importing torch costs seconds, and the API,
+                    # tests and health checks should not pay it at startup
+                    import torch
+                    from sentence_transformers import SentenceTransformer
+                    
+                    device = 'cuda' if torch.cuda.is_available() else 'cpu'
+                    print(f"Using device: {device} for embedding generation.")
+                    self._model = SentenceTransformer(SENTENCE_TRANSFORMER_MODEL, device=device)
         return self._model
     
+    def _get_onnx_model(self):
+        """Lazy load the ONNX Runtime export of the same model."""
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    from app.services.onnx_embedding_model import OnnxEmbeddingModel
+                    quantize = settings.embedding_onnx_quantize
+                    print(f"Using ONNX Runtime ({'int8' if quantize else 'fp32'}) for embedding generation.")
+                    self._model = OnnxEmbeddingModel(
+                        quantize=quantize,
+                        cache_dir=settings.embedding_onnx_cache_dir
+                    )
+        return self._model
+    
+    def check_backend(self):
+        """
+        Fail fast if the configured backend's packages are not installed
+        
+        Only looks the modules up, so torch is still imported lazily.
+        
+        Raises:
+            RuntimeError: If a required package is missing
+        """
+        modules = BACKEND_MODULES["onnx" if self.backend == "onnx" else "sentence-transformers"]
+        missing = [module for module in modules if importlib.util.find_spec(module) is None]
+        if missing:
+            hint = "poetry install --extras onnx" if self.backend == "onnx" else "poetry install"
+            raise RuntimeError(
+                f"EMBEDDING_MODEL={self.backend} needs {', '.join(missing)}; install it with `{hint}`"
+            )
+    
+    def _get_model(self):
+        """Return the encoder for the configured backend"""
+        if self.backend == "onnx":
+            return self._get_onnx_model()
+        return self._get_sentence_transformer_model()
+    
+    @property
+    def model_name(self) -> str:
+        """Identifies the vectors this service produces (used for cache keys)"""
+        if self.backend == "onnx" and settings.embedding_onnx_quantize:
+            return f"{SENTENCE_TRANSFORMER_MODEL}-onnx-int8"
+        return SENTENCE_TRANSFORMER_MODEL
+    
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        """Encode texts in one forward pass (runs on the executor)"""
+        model = self._get_model()
+        return model.encode(texts, batch_size=len(texts))
+    
+    async def warm_up(self, texts: Sequence[str] = ()) -> int:
+        """
+        Load the model and precompute embeddings for fixed texts
+        
+        A throwaway encode runs first so model loading, kernel selection and
+        buffer allocation happen here rather than on the first request.
+        
+        Args:
+            texts (Sequence[str]): Texts that are often embedded verbatim
+            
+        Returns:
+            int: Number of precomputed embeddings
+        """
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(self._executor, self._encode_batch, ["warm up"])
+        
+        unique = list(dict.fromkeys(normalize_text(text) for text in texts if text and text.strip()))
+        if not unique:
+            return 0
+        encoded = await loop.run_in_executor(self._executor, self._encode_batch, unique)
+        table = {}
+        for text, embedding in zip(unique, encoded):
+            vector = np.array(embedding, dtype=np.float32)
+            vector.setflags(write=False)
+            table[text] = vector
+        self._precomputed = MappingProxyType(table)
+        return len(table)
+    
+    def _lookup(self, text: str) -> Optional[np.ndarray]:
+        """Precomputed or cached embedding for `text`, if any"""
+        embedding = self._precomputed.get(normalize_text(text))
+        if embedding is not None:
+            self.precomputed_hits += 1
+            return embedding
+        return self.cache.get(text)
+    
+    def precomputed_stats(self) -> dict:
+        return {"entries": len(self._precomputed), "hits": self.precomputed_hits}
+    
     async def generate_embedding(self, text: str) -> List[float]:
         """
         Generate embedding for a given text
@@ -40,15 +165,11 @@ class EmbeddingService:
     async def _generate_sentence_transformer_embedding(self, text: str) -> List[float]:
         """Generate embedding using sentence transformers"""
         try:
-            loop = asyncio.get_event_loop()
-            model = self._get_sentence_transformer_model()
-            
-            # Run in thread pool to avoid blocking
-            embedding = await loop.run_in_executor(
-                self._executor, 
-                model.encode, 
-                text
-            )
+            embedding = self._lookup(text)
+            if embedding is None:
+                # Queued with other concurrent requests and encoded in a batch
+                embedding = await self._batcher.submit(text)
+                self.cache.put(text, embedding)
             
             return embedding.tolist()
             
@@ -74,15 +195,21 @@ class EmbeddingService:
     async def _generate_sentence_transformer_embeddings_batch(self, texts: List[str]) -> List[List[float]]:
         """Generate embeddings for batch using sentence transformers"""
         try:
-            loop = asyncio.get_event_loop()
-            model = self._get_sentence_transformer_model()
-            embeddings = await loop.run_in_executor(
-                self._executor,
-                model.encode,
-                texts
-            )
-            # sentence-transformers returns numpy array when batching
-            return embeddings.tolist()
+            embeddings = [self._lookup(text) for text in texts]
+            missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+            
+            if missing:
+                loop = asyncio.get_event_loop()
+                encoded = await loop.run_in_executor(
+                    self._executor,
+                    self._encode_batch,
+                    [texts[i] for i in missing]
+                )
+                for i, embedding in zip(missing, encoded):
+                    embeddings[i] = embedding
+                    self.cache.put(texts[i], embedding)
+            
+            return [embedding.tolist() for embedding in embeddings]
         except Exception as e:
             print(f"Error generating sentence transformer embeddings batch: {e}")
             return []
@@ -120,6 +247,96 @@ class EmbeddingService:
             print(f"Error computing similarity: {e}")
             return 0.0
 
+    
+    def normalize_embeddings(
+        self, 
+        embeddings: Union[np.ndarray, Sequence[Sequence[float]]]
+    ) -> np.ndarray:
+        """
+        Convert embeddings to a contiguous float32 matrix of unit-length rows
+        
+        Args:
+            embeddings: (N, D) array or list of vectors
+            
+        Returns:
+            np.ndarray: (N, D) float32 matrix; zero vectors stay zero
+        """
+        matrix = np.ascontiguousarray(embeddings, dtype=np.float32)
+        if matrix.ndim == 1:
+            matrix = matrix.reshape(1, -1)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+    
+    def compute_similarities(
+        self,
+        query_embedding: Union[np.ndarray, Sequence[float]],
+        embeddings: Union[np.ndarray, Sequence[Sequence[float]]],
+        normalized: bool = False
+    ) -> np.ndarray:
+        """
+        Compute cosine similarity between one query and many embeddings
+        
+        Args:
+            query_embedding: Query vector of length D
+            embeddings: (N, D) matrix of candidate vectors
+            normalized (bool): True if `embeddings` rows are already unit length
+            
+        Returns:
+            np.ndarray: (N,) float32 similarity scores
+        """
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        if matrix.size == 0:
+            return np.zeros(0, dtype=np.float32)
+        if not normalized:
+            matrix = self.normalize_embeddings(matrix)
+        query = self.normalize_embeddings(query_embedding)[0]
+        return matrix @ query
+    
+    def top_k_similar(
+        self,
+        query_embedding: Union[np.ndarray, Sequence[float]],
+        embeddings: Union[np.ndarray, Sequence[Sequence[float]]],
+        k: int,
+        similarity_threshold: Optional[float] = None,
+        normalized: bool = False
+    ) -> List[Tuple[int, float]]:
+        """
+        Select the k most similar rows without sorting the whole matrix
+        
+        Args:
+            query_embedding: Query vector of length D
+            embeddings: (N, D) matrix of candidate vectors
+            k (int): Number of results to return
+            similarity_threshold (Optional[float]): Minimum similarity score
+            normalized (bool): True if `embeddings` rows are already unit length
+            
+        Returns:
+            List[Tuple[int, float]]: (row index, similarity) pairs, best first
+        """
+        scores = self.compute_similarities(query_embedding, embeddings, normalized=normalized)
+        return self.select_top_k(scores, k, similarity_threshold)
+    
+    def select_top_k(
+        self,
+        scores: np.ndarray,
+        k: int,
+        similarity_threshold: Optional[float] = None
+    ) -> List[Tuple[int, float]]:
+        """Pick the top-k indices of a score vector using argpartition"""
+        if k <= 0 or scores.size == 0:
+            return []
+        
+        if k < scores.size:
+            candidates = np.argpartition(-scores, k - 1)[:k]
+        else:
+            candidates = np.arange(scores.size)
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        
+        if similarity_threshold is not None:
+            candidates = candidates[scores[candidates] >= similarity_threshold]
+        return [(int(i), float(scores[i])) for i in candidates]
+
 
 # Global embedding service instance
 embedding_service = EmbeddingService()
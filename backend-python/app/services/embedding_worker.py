@@ -0,0 +1,178 @@
+"""
+Background worker that embeds journal entries off the request path
+"""
+import asyncio
+import hashlib
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.services.search_cache import search_result_cache
+from app.services.supabase_service import SupabaseService
+from app.services.vector_index import vector_index_cache
+
+EMBEDDING_PENDING = "pending"
+EMBEDDING_DONE = "done"
+EMBEDDING_FAILED = "failed"
+
+
+def embedding_version(text: str) -> str:
+    """Version tag for the text an entry's embedding is computed from"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class EmbeddingJob:
+    """One entry whose embedding should be (re)computed"""
+    entry_id: str
+    user_id: str
+    text: str
+    # embedding_version of the entry when the job was queued (a hash of
+    # `text`); a later text edit queues its own job and turns this one into
+    # a no-op, while mood or collection edits leave it valid
+    version: str
+    attempts: int = 0
+
+
+class EmbeddingWorker(SupabaseService):
+    """
+    Bounded queue of embedding jobs drained by a few asyncio tasks
+
+    Writes are idempotent: the UPDATE is guarded on the entry's id, owner and
+    embedding_version, so retries or duplicate jobs rewrite the same vector and jobs
+    for superseded text never overwrite a newer embedding. Jobs that cannot
+    be queued (queue full, worker stopped) or that run out of retries leave
+    the entry 'pending' or 'failed'; the backfill re-embeds every entry
+    whose status is not 'done'.
+    """
+
+    def __init__(
+        self,
+        max_queue_size: int = 1000,
+        concurrency: int = 2,
+        max_retries: int = 3,
+        retry_base_delay: float = 1.0
+    ):
+        super().__init__()
+        self.max_queue_size = max_queue_size
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self.processed = 0
+        self.failed = 0
+        self.retried = 0
+        self.dropped = 0
+        self.superseded = 0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self):
+        """Start the worker tasks on the running event loop"""
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._tasks = [
+            asyncio.create_task(self._run(), name=f"embedding-worker-{i}")
+            for i in range(self.concurrency)
+        ]
+
+    async def stop(self):
+        """Cancel the worker tasks; unfinished entries stay 'pending'"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+    def enqueue(self, job: EmbeddingJob) -> bool:
+        """Queue a job without blocking; returns False if it was not accepted"""
+        if not self.running:
+            self.dropped += 1
+            return False
+        try:
+            self._queue.put_nowait(job)
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            print(f"Embedding queue full, leaving entry {job.entry_id} pending")
+            return False
+
+    async def _run(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._process(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Unexpected embedding worker error: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _process(self, job: EmbeddingJob):
+        from app.services.embedding_service import embedding_service
+
+        while True:
+            job.attempts += 1
+            try:
+                embedding = await embedding_service.generate_embedding(job.text)
+                if not embedding:
+                    raise ValueError("empty embedding")
+                await asyncio.to_thread(self._write_embedding, job, embedding)
+                self.processed += 1
+                return
+            except Exception as e:
+                if job.attempts > self.max_retries:
+                    print(f"Giving up on embedding for entry {job.entry_id}: {e}")
+                    self.failed += 1
+                    await asyncio.to_thread(self._mark_failed, job)
+                    return
+                self.retried += 1
+                await asyncio.sleep(self.retry_base_delay * 2 ** (job.attempts - 1))
+
+    def _write_embedding(self, job: EmbeddingJob, embedding: List[float]):
+        result = self.supabase.table("entries").update({
+            "content_embedding": embedding,
+            "embedding_status": EMBEDDING_DONE
+        }).eq("id", job.entry_id).eq("user_id", job.user_id).eq("embedding_version", job.version).execute()
+        if not result.data:
+            # The text changed again (its own job will write) or the entry was deleted
+            self.superseded += 1
+            print(f"Embedding for entry {job.entry_id} is superseded, nothing written")
+            return
+        vector_index_cache.upsert_entry(job.user_id, result.data[0], embedding)
+        # The entry becomes searchable now
+        search_result_cache.bump(job.user_id)
+
+    def _mark_failed(self, job: EmbeddingJob):
+        try:
+            self.supabase.table("entries").update({
+                "embedding_status": EMBEDDING_FAILED
+            }).eq("id", job.entry_id).eq("user_id", job.user_id).eq("embedding_version", job.version).execute()
+        except Exception as e:
+            print(f"Error marking embedding as failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "max_queue_size": self.max_queue_size,
+            "processed": self.processed,
+            "failed": self.failed,
+            "retried": self.retried,
+            "dropped": self.dropped,
+            "superseded": self.superseded,
+        }
+
+
+# Global embedding worker instance (started by the app lifespan)
+embedding_worker = EmbeddingWorker(
+    max_queue_size=settings.embedding_queue_max_size,
+    concurrency=settings.embedding_worker_concurrency,
+    max_retries=settings.embedding_max_retries,
+    retry_base_delay=settings.embedding_retry_base_delay
+)
@@ -1,9 +1,7 @@
 """
 External API service for integrating with third-party services
 """
-import httpx
-from typing import Optional
-from app.core.config import settings
+from app.core.http import http_clients
 
 
 class ExternalAPIService:
@@ -17,16 +15,13 @@ class ExternalAPIService:
         Get daily advice/prompt from AdviceSlip API
         """
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    "https://api.adviceslip.com/advice",
-                    timeout=10.0
-                )
-                response.raise_for_status()
-                data = response.json()
-                
-                return data.get("slip", {}).get("advice", "What's on your mind today?")
-                
+            url = "https://api.adviceslip.com/advice"
+            response = await http_clients.get(url).get(url)
+            response.raise_for_status()
+            data = response.json()
+            
+            return data.get("slip", {}).get("advice", "What's on your mind today?")
+            
         except Exception as e:
             print(f"AdviceSlip API Error: {e}")
             return "What's on your mind today?"
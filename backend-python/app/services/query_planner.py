@@ -0,0 +1,238 @@
+"""
+Turns natural-language hints in a search query into structured filters
+"""
+import re
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+from dateutil.relativedelta import relativedelta
+
+from app.services.mood_service import MOODS
+
+MONTHS = {
+    "january": 1, "february": 2, "march": 3, "april": 4, "may": 5, "june": 6,
+    "july": 7, "august": 8, "september": 9, "october": 10, "november": 11, "december": 12,
+}
+# Abbreviations collide with ordinary words ("mar", "may"), so they are only
+# recognised next to a day or a year
+MONTH_ABBREVIATIONS = {
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "jun": 6, "jul": 7, "aug": 8,
+    "sep": 9, "sept": 9, "oct": 10, "nov": 11, "dec": 12,
+}
+NUMBER_WORDS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+    "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10, "twelve": 12,
+}
+
+_MONTH = "|".join(MONTHS)
+_ANY_MONTH = "|".join(list(MONTHS) + list(MONTH_ABBREVIATIONS))
+_ISO_DATE = re.compile(r"\b(\d{4})-(\d{1,2})-(\d{1,2})\b")
+_MONTH_DAY = re.compile(rf"\b({_ANY_MONTH})\.?\s+(\d{{1,2}})(?:st|nd|rd|th)?\b(?:,?\s+(\d{{4}})\b)?")
+_DAY_MONTH = re.compile(rf"\b(\d{{1,2}})(?:st|nd|rd|th)?\s+(?:of\s+)?({_ANY_MONTH})\b\.?(?:,?\s+(\d{{4}})\b)?")
+_LAST_N = re.compile(
+    rf"\b(?:last|past|previous)\s+(\d+|{'|'.join(NUMBER_WORDS)})\s+(day|week|month|year)s?\b"
+)
+_MONTH_YEAR = re.compile(rf"\b({_ANY_MONTH})\.?\s+(?:of\s+)?(\d{{4}})\b")
+# "may" is only a month after a preposition ("in may"), not in "I may have"
+_MONTH_ALONE = re.compile(rf"\b(?:(in|during|from|since|of|last|this)\s+)?({_MONTH})\b")
+_YEAR = re.compile(r"\b(?:in|during|from|of)\s+(\d{4})\b")
+_RELATIVE = re.compile(r"\b(today|yesterday|(?:this|last) (?:week|month|year))\b")
+
+# Mood ids that are also everyday words need a feeling verb in front
+_AMBIGUOUS_MOODS = {"content", "neutral"}
+_FEELING = re.compile(r"\b(?:felt|feel|feeling|feels|was|were|am)\s+$")
+_NEGATION = re.compile(r"\b(?:not|never|without|wasn't|weren't|didn't|don't|isn't)\s+(?:\w+\s+)?$")
+# Common noun forms of moods
+MOOD_SYNONYMS = {
+    "happiness": "happy", "sadness": "sad", "anxiety": "anxious", "stress": "stressed",
+    "anger": "angry", "loneliness": "lonely", "gratitude": "grateful", "excitement": "excited",
+    "worry": "worried", "frustration": "frustrated", "boredom": "bored", "jealousy": "jealous",
+    "guilt": "guilty", "nostalgia": "nostalgic", "confusion": "confused", "pride": "proud",
+    "disappointment": "disappointed", "inspiration": "inspired", "motivation": "motivated",
+}
+
+
+@dataclass
+class QueryPlan:
+    """Filters for one search, inferred from the query or given explicitly"""
+    query: str
+    date_range: Optional[Tuple[datetime, datetime]] = None
+    mood: Optional[str] = None
+    collection_id: Optional[str] = None
+    collection_name: Optional[str] = None
+    # The query text each inferred filter came from, e.g. {"date_range": "last 7 days"}
+    hints: Dict[str, str] = field(default_factory=dict)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "query": self.query,
+            "date_range": [value.isoformat() if value else None for value in self.date_range]
+            if self.date_range else None,
+            "mood": self.mood,
+            "collection_id": self.collection_id,
+            "collection_name": self.collection_name,
+            "hints": dict(self.hints),
+        }
+
+
+class QueryPlanner:
+    """Extracts date ranges, moods and collection names from search queries"""
+
+    def plan(
+        self,
+        query: str,
+        collections: Sequence[Dict[str, Any]] = (),
+        now: Optional[datetime] = None
+    ) -> QueryPlan:
+        """
+        Build a plan for `query`
+
+        Args:
+            query (str): Search query
+            collections (Sequence[Dict[str, Any]]): The user's collections (id, name)
+            now (Optional[datetime]): Reference time for relative dates
+
+        Returns:
+            QueryPlan: Inferred filters; fields stay None when nothing matched
+        """
+        now = now or datetime.now()
+        text = query.lower()
+        plan = QueryPlan(query=query)
+
+        date_match = self.parse_date_range(text, now)
+        if date_match:
+            plan.date_range, plan.hints["date_range"] = date_match
+
+        mood_match = self.parse_mood(text)
+        if mood_match:
+            plan.mood, plan.hints["mood"] = mood_match
+
+        collection = self.match_collection(text, collections)
+        if collection:
+            plan.collection_id = collection["id"]
+            plan.collection_name = collection["name"]
+            plan.hints["collection_id"] = collection["name"]
+
+        return plan
+
+    def parse_date_range(self, text: str, now: datetime) -> Optional[Tuple[Tuple[datetime, datetime], str]]:
+        """Return ((start, end), matched text) for the most specific date reference"""
+        today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+        match = _ISO_DATE.search(text)
+        if match:
+            day = self._date(int(match.group(1)), int(match.group(2)), int(match.group(3)))
+            if day:
+                return (day, day + timedelta(days=1)), match.group(0)
+
+        for pattern, month_group, day_group in ((_MONTH_DAY, 1, 2), (_DAY_MONTH, 2, 1)):
+            match = pattern.search(text)
+            if match:
+                month = self._month(match.group(month_group))
+                day_number = int(match.group(day_group))
+                year = int(match.group(3)) if match.group(3) else None
+                if year is None:
+                    # Without a year, the most recent such day
+                    year = now.year
+                    candidate = self._date(year, month, day_number)
+                    if candidate and candidate > today:
+                        year -= 1
+                day = self._date(year, month, day_number)
+                if day:
+                    return (day, day + timedelta(days=1)), match.group(0)
+
+        match = _LAST_N.search(text)
+        if match:
+            amount = match.group(1)
+            count = int(amount) if amount.isdigit() else NUMBER_WORDS[amount]
+            start = today - relativedelta(**{f"{match.group(2)}s": count})
+            return (start, today + timedelta(days=1)), match.group(0)
+
+        match = _RELATIVE.search(text)
+        if match:
+            return self._relative_range(match.group(1), today), match.group(0)
+
+        match = _MONTH_YEAR.search(text)
+        if match:
+            start = datetime(int(match.group(2)), self._month(match.group(1)), 1)
+            return (start, start + relativedelta(months=1)), match.group(0)
+
+        for match in _MONTH_ALONE.finditer(text):
+            preposition, name = match.group(1), match.group(2)
+            if name == "may" and not preposition:
+                continue
+            month = MONTHS[name]
+            # Default to the most recent such month
+            year = now.year if month <= now.month else now.year - 1
+            start = datetime(year, month, 1)
+            return (start, start + relativedelta(months=1)), match.group(0).strip()
+
+        match = _YEAR.search(text)
+        if match:
+            start = datetime(int(match.group(1)), 1, 1)
+            return (start, start + relativedelta(years=1)), match.group(0)
+
+        return None
+
+    def parse_mood(self, text: str) -> Optional[Tuple[str, str]]:
+        """Return (mood id, matched word) for the first non-negated mood word"""
+        mood_ids = {mood["id"] for mood in MOODS.values()}
+        for match in re.finditer(r"[a-z]+", text):
+            word = match.group(0)
+            mood = word if word in mood_ids else MOOD_SYNONYMS.get(word)
+            if not mood:
+                continue
+            before = text[:match.start()]
+            if _NEGATION.search(before):
+                continue
+            if mood in _AMBIGUOUS_MOODS and not _FEELING.search(before):
+                continue
+            return mood, word
+        return None
+
+    def match_collection(self, text: str, collections: Sequence[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Return the collection whose name appears in the query (longest name wins)"""
+        named = [
+            collection for collection in collections
+            if collection.get("name") and len(collection["name"].strip()) >= 3
+        ]
+        for collection in sorted(named, key=lambda c: len(c["name"]), reverse=True):
+            name = re.escape(collection["name"].strip().lower())
+            if re.search(rf"(?<!\w){name}(?!\w)", text):
+                return collection
+        return None
+
+    @staticmethod
+    def _relative_range(phrase: str, today: datetime) -> Tuple[datetime, datetime]:
+        if phrase == "today":
+            return today, today + timedelta(days=1)
+        if phrase == "yesterday":
+            return today - timedelta(days=1), today
+        week_start = today - timedelta(days=today.weekday())
+        month_start = today.replace(day=1)
+        year_start = today.replace(month=1, day=1)
+        ranges = {
+            "this week": (week_start, week_start + timedelta(days=7)),
+            "last week": (week_start - timedelta(days=7), week_start),
+            "this month": (month_start, month_start + relativedelta(months=1)),
+            "last month": (month_start - relativedelta(months=1), month_start),
+            "this year": (year_start, year_start + relativedelta(years=1)),
+            "last year": (year_start - relativedelta(years=1), year_start),
+        }
+        return ranges[phrase]
+
+    @staticmethod
+    def _month(name: str) -> int:
+        return MONTHS.get(name) or MONTH_ABBREVIATIONS[name]
+
+    @staticmethod
+    def _date(year: int, month: int, day: int) -> Optional[datetime]:
+        try:
+            return datetime(year, month, day)
+        except ValueError:
+            return None
+
+
+# Global query planner instance
+query_planner = QueryPlanner()
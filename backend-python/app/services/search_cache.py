@@ -0,0 +1,164 @@
+"""
+Per-user cache of search results
+"""
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.embedding_cache import normalize_text
+
+
+class SearchResultCache:
+    """
+    TTL + LRU cache of search results, invalidated by per-user generations
+
+    Every cache key includes the user's current generation. Writes to a
+    user's entries bump the generation, so results computed before the
+    write can no longer be looked up; they simply age out of the LRU.
+    """
+
+    def __init__(self, ttl_seconds: float = 60.0, max_entries: int = 2000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._results: "OrderedDict[Tuple, Tuple[float, List[Dict[str, Any]]]]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl_seconds > 0
+
+    def generation(self, user_id: str) -> int:
+        with self._lock:
+            return self._generations.get(user_id, 0)
+
+    def bump(self, user_id: str):
+        """Invalidate every cached result of a user"""
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            self.invalidations += 1
+
+    def key(self, user_id: str, kind: str, query: str, **params: Hashable) -> Tuple:
+        """
+        Build a cache key for one search
+
+        The query is whitespace-normalized and lowercased (the embedding
+        model is uncased); `params` are the filters, limit and weights.
+        """
+        normalized_query = normalize_text(query).lower()
+        return (user_id, self.generation(user_id), kind, normalized_query, tuple(sorted(params.items())))
+
+    def get(self, key: Tuple) -> Optional[List[Dict[str, Any]]]:
+        """Return a copy of the cached results, or None on a miss or expiry"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            cached = self._results.get(key)
+            if cached is None or cached[0] < time.monotonic():
+                if cached is not None:
+                    del self._results[key]
+                self.misses += 1
+                return None
+            self._results.move_to_end(key)
+            self.hits += 1
+            return [dict(result) for result in cached[1]]
+
+    def put(self, key: Tuple, results: List[Dict[str, Any]]):
+        if not self.enabled:
+            return
+        with self._lock:
+            if key[1] != self._generations.get(key[0], 0):
+                # The user's entries changed while this search was running
+                return
+            self._results[key] = (time.monotonic() + self.ttl_seconds, [dict(result) for result in results])
+            self._results.move_to_end(key)
+            while len(self._results) > self.max_entries:
+                self._results.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._results),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "invalidations": self.invalidations,
+            }
+
+
+class RankedResultStore:
+    """
+    Briefly retained ranked (entry_id, score) lists for cursor pagination
+
+    A paginated search ranks once and stores the ordering under a random
+    token; later pages slice it and only hydrate their own rows. Sets are
+    bound to the user that created them and expire after `ttl_seconds`.
+    """
+
+    def __init__(self, ttl_seconds: float = 300.0, max_sets: int = 1000):
+        self.ttl_seconds = ttl_seconds
+        self.max_sets = max_sets
+        self._sets: "OrderedDict[str, Tuple[float, str, List[Tuple[str, float]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def save(self, user_id: str, matches: List[Tuple[str, float]]) -> str:
+        """Store a ranking and return its token"""
+        token = secrets.token_urlsafe(12)
+        with self._lock:
+            self._sets[token] = (time.monotonic() + self.ttl_seconds, user_id, list(matches))
+            while len(self._sets) > self.max_sets:
+                self._sets.popitem(last=False)
+        return token
+
+    def load(self, user_id: str, token: str) -> Optional[List[Tuple[str, float]]]:
+        """Return a stored ranking, or None if it expired or belongs to another user"""
+        with self._lock:
+            stored = self._sets.get(token)
+            if stored is None:
+                return None
+            expires_at, owner, matches = stored
+            if expires_at < time.monotonic():
+                del self._sets[token]
+                return None
+            return matches if owner == user_id else None
+
+    @staticmethod
+    def encode_cursor(token: str, offset: int) -> str:
+        return f"{token}.{offset}"
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> Optional[Tuple[str, int]]:
+        token, _, offset = cursor.rpartition(".")
+        if not token or not offset.isdigit():
+            return None
+        return token, int(offset)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"sets": len(self._sets), "max_sets": self.max_sets, "ttl_seconds": self.ttl_seconds}
+
+
+# Global search result cache instance
+search_result_cache = SearchResultCache(
+    ttl_seconds=settings.search_cache_ttl_seconds,
+    max_entries=settings.search_cache_max_entries
+)
+
+# Global ranked result store instance
+ranked_result_store = RankedResultStore(
+    ttl_seconds=settings.search_cursor_ttl_seconds,
+    max_sets=settings.search_cursor_max_sets
+)
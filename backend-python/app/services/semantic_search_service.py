@@ -1,12 +1,38 @@
 """
 Semantic search service for journal entries
 """
-import re
-from typing import List, Dict, Any, Optional, Tuple
-from datetime import datetime, timedelta
-from dateutil import parser
+import asyncio
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple
+from datetime import datetime
+import numpy as np
+from app.core.config import settings
 from app.services.supabase_service import SupabaseService
 from app.services.embedding_service import embedding_service
+from app.services.embedding_pipeline import BackfillStats, EmbeddingBackfillPipeline, SupabaseEmbeddingStore
+from app.services.search_cache import ranked_result_store, search_result_cache
+from app.services.vector_codec import decode_vector, decode_vectors
+from app.services.vector_index import UserVectorIndex, vector_index_cache
+from app.services.mood_service import MOODS
+from app.services.query_planner import QueryPlan, query_planner
+
+# Users whose collection names are kept for query planning
+COLLECTION_CACHE_SIZE = 1000
+
+# Returned by /search/suggestions and precomputed at startup
+SEARCH_SUGGESTIONS = [
+    "What was my worst day this month?",
+    "Show me entries about happiness",
+    "Find sad entries from last week",
+    "What made me anxious in September?",
+    "Show me my most positive moments",
+    "Find entries about work stress",
+    "What was I grateful for this week?",
+    "Show me entries when I felt lonely",
+    "Find my best day last month",
+    "What made me excited recently?"
+]
 
 
 class SemanticSearchService(SupabaseService):
@@ -15,6 +41,26 @@ class SemanticSearchService(SupabaseService):
     def __init__(self):
         super().__init__()
         self.embedding_service = embedding_service
+        self.vector_index_cache = vector_index_cache
+        self.result_cache = search_result_cache
+        self.ranked_results = ranked_result_store
+        self._collections: "OrderedDict[str, Tuple[int, List[Dict[str, Any]]]]" = OrderedDict()
+    
+    async def warm_up(self) -> int:
+        """
+        Precompute embeddings for the search suggestions and mood prompts/labels
+        
+        Returns:
+            int: Number of precomputed embeddings (0 if warm-up failed)
+        """
+        texts = list(SEARCH_SUGGESTIONS)
+        for mood in MOODS.values():
+            texts.extend([mood["prompt"], mood["label"]])
+        try:
+            return await self.embedding_service.warm_up(texts)
+        except Exception as e:
+            print(f"Error warming up embeddings: {e}")
+            return 0
     
     async def search_entries(
         self, 
@@ -24,7 +70,8 @@ class SemanticSearchService(SupabaseService):
         similarity_threshold: float = 0.1,
         date_range: Optional[Tuple[datetime, datetime]] = None,
         mood_filter: Optional[str] = None,
-        collection_id: Optional[str] = None
+        collection_id: Optional[str] = None,
+        plan: Optional[QueryPlan] = None
     ) -> List[Dict[str, Any]]:
         """
         Perform semantic search on journal entries
@@ -37,66 +84,567 @@ class SemanticSearchService(SupabaseService):
             date_range (Optional[Tuple[datetime, datetime]]): Date range filter
             mood_filter (Optional[str]): Mood filter
             collection_id (Optional[str]): Collection filter
+            plan (Optional[QueryPlan]): Precomputed plan from plan_query
             
         Returns:
             List[Dict[str, Any]]: Search results with similarity scores
         """
         try:
-            # Parse date references from query if any
-            parsed_date_range = self._parse_date_from_query(query)
-            if parsed_date_range:
-                date_range = parsed_date_range
+            # Dates, moods and collections mentioned in the query become filters
+            plan = plan or await self.plan_query(user_id, query, date_range, mood_filter, collection_id)
+            date_range, mood_filter, collection_id = plan.date_range, plan.mood, plan.collection_id
+            
+            cache_key = self.result_cache.key(
+                user_id, "semantic", query,
+                limit=limit,
+                similarity_threshold=similarity_threshold,
+                date_range=date_range,
+                mood_filter=mood_filter,
+                collection_id=collection_id
+            )
+            cached = self.result_cache.get(cache_key)
+            if cached is not None:
+                return cached
             
             # Generate embedding for the search query
             query_embedding = await self.embedding_service.generate_embedding(query)
             if not query_embedding:
                 return []
             
-            # Build the search query
-            search_query = self.supabase.table("entries").select(
-                """
-                id, title, content, mood, mood_score, mood_image_url, 
-                collection_id, created_at, updated_at,
-                content_embedding
-                """
-            ).eq("user_id", user_id)
-            
-            # Apply filters
-            if date_range:
-                search_query = search_query.gte("created_at", date_range[0].isoformat())
-                search_query = search_query.lte("created_at", date_range[1].isoformat())
+            matches = await asyncio.to_thread(
+                self._semantic_matches,
+                user_id=user_id,
+                query_embedding=query_embedding,
+                limit=limit,
+                similarity_threshold=similarity_threshold,
+                date_range=date_range,
+                mood_filter=mood_filter,
+                collection_id=collection_id
+            )
+            results = await asyncio.to_thread(self._hydrate_entries, user_id, matches)
+            self.result_cache.put(cache_key, results)
+            return results
             
-            if mood_filter:
-                search_query = search_query.eq("mood", mood_filter)
+        except Exception as e:
+            print(f"Error in semantic search: {e}")
+            return []
+    
+    async def similar_entries(
+        self,
+        user_id: str,
+        entry_id: str,
+        limit: int = 10,
+        similarity_threshold: float = 0.1,
+        date_range: Optional[Tuple[datetime, datetime]] = None,
+        mood_filter: Optional[str] = None,
+        collection_id: Optional[str] = None
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Find entries similar to an existing entry using its stored embedding
+        
+        No text is encoded: the entry's vector comes from the in-memory index
+        or the database and is ranked like a query vector. Results are kept
+        in the search result cache until the user's entries change.
+        
+        Args:
+            user_id (str): Owner of the entry
+            entry_id (str): Entry to find neighbors for
+            limit (int): Maximum number of results
+            similarity_threshold (float): Minimum similarity score
+            date_range (Optional[Tuple[datetime, datetime]]): Date range filter
+            mood_filter (Optional[str]): Mood filter
+            collection_id (Optional[str]): Collection filter
             
-            if collection_id:
-                search_query = search_query.eq("collection_id", collection_id)
+        Returns:
+            Optional[List[Dict[str, Any]]]: Neighbors with similarity scores, or
+            None if the entry does not exist or has no embedding yet
+        """
+        filters = {
+            "date_range": date_range,
+            "mood_filter": mood_filter,
+            "collection_id": collection_id
+        }
+        cache_key = self.result_cache.key(
+            user_id, "similar", entry_id,
+            limit=limit,
+            similarity_threshold=similarity_threshold,
+            **filters
+        )
+        cached = self.result_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        vector = await asyncio.to_thread(self._entry_vector, user_id, entry_id)
+        if vector is None:
+            return None
+        
+        # One extra match, since the entry itself is its own nearest neighbor
+        matches = await asyncio.to_thread(
+            self._semantic_matches, user_id, vector.tolist(), limit + 1, similarity_threshold, **filters
+        )
+        matches = [match for match in matches if match[0] != entry_id][:limit]
+        results = await asyncio.to_thread(self._hydrate_entries, user_id, matches)
+        self.result_cache.put(cache_key, results)
+        return results
+    
+    def _entry_vector(self, user_id: str, entry_id: str) -> Optional[np.ndarray]:
+        """Stored embedding of an entry, from the user's index or the database"""
+        index = self._get_user_index(user_id)
+        if index is not None:
+            vector = index.vector(entry_id)
+            if vector is not None:
+                return vector
+        
+        result = self.supabase.table("entries").select(
+            "content_embedding"
+        ).eq("id", entry_id).eq("user_id", user_id).execute()
+        if not result.data:
+            return None
+        return decode_vector(result.data[0].get("content_embedding"), settings.embedding_dimensions)
+    
+    async def batch_search_entries(
+        self,
+        user_id: str,
+        queries: List[str],
+        limit: int = 10,
+        similarity_threshold: float = 0.1,
+        date_range: Optional[Tuple[datetime, datetime]] = None,
+        mood_filter: Optional[str] = None,
+        collection_id: Optional[str] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Run several semantic searches for one user in a single pass
+        
+        Uncached queries are encoded in one batch, the user's vectors are
+        loaded once and all queries are scored with one matrix-matrix
+        product. Rows are hydrated once for the union of the results.
+        
+        Args:
+            user_id (str): User ID to search entries for
+            queries (List[str]): Search queries
+            limit (int): Maximum number of results per query
+            similarity_threshold (float): Minimum similarity score
+            date_range (Optional[Tuple[datetime, datetime]]): Date range filter
+            mood_filter (Optional[str]): Mood filter
+            collection_id (Optional[str]): Collection filter
             
-            # Execute search
-            result = search_query.execute()
-            entries = result.data if result.data else []
+        Returns:
+            List[List[Dict[str, Any]]]: Results for each query, in query order
+        """
+        plans = [
+            await self.plan_query(user_id, query, date_range, mood_filter, collection_id)
+            for query in queries
+        ]
+        filters = [
+            {"date_range": plan.date_range, "mood_filter": plan.mood, "collection_id": plan.collection_id}
+            for plan in plans
+        ]
+        cache_keys = [
+            self.result_cache.key(
+                user_id, "semantic", query,
+                limit=limit,
+                similarity_threshold=similarity_threshold,
+                **query_filters
+            )
+            for query, query_filters in zip(queries, filters)
+        ]
+        results = [self.result_cache.get(key) for key in cache_keys]
+        pending = [i for i, cached in enumerate(results) if cached is None]
+        if not pending:
+            return results
+        
+        try:
+            embeddings = await self.embedding_service.generate_embeddings_batch([queries[i] for i in pending])
+            encoded = [(i, embedding) for i, embedding in zip(pending, embeddings) if embedding]
+            ranked = await asyncio.to_thread(
+                self._batch_matches, user_id, encoded, limit, similarity_threshold, filters
+            )
             
-            # Calculate similarities and filter
-            scored_entries = []
-            for entry in entries:
-                emb = entry.get('content_embedding')
-                if emb and isinstance(emb, list) and len(emb) > 0:
-                    similarity = self.embedding_service.compute_similarity(
-                        query_embedding, emb
-                    )
-                    if similarity >= similarity_threshold:
-                        entry['similarity_score'] = float(similarity)
-                        scored_entries.append(entry)
+            matched_ids = list(dict.fromkeys(entry_id for matches in ranked.values() for entry_id, _ in matches))
+            rows = await asyncio.to_thread(
+                self._hydrate_entries, user_id, [(entry_id, 0.0) for entry_id in matched_ids]
+            )
+            rows_by_id = {row["id"]: row for row in rows}
+        except Exception as e:
+            print(f"Error in batch semantic search: {e}")
+            ranked, rows_by_id = {}, {}
+        
+        for i in pending:
+            results[i] = [
+                {**rows_by_id[entry_id], "similarity_score": float(similarity)}
+                for entry_id, similarity in ranked.get(i, [])
+                if entry_id in rows_by_id
+            ]
+            if i in ranked:
+                self.result_cache.put(cache_keys[i], results[i])
+        return results
+    
+    def _batch_matches(
+        self,
+        user_id: str,
+        encoded: List[Tuple[int, List[float]]],
+        limit: int,
+        similarity_threshold: float,
+        filters: List[Dict[str, Any]]
+    ) -> Dict[int, List[Tuple[str, float]]]:
+        """Rank (query position, embedding) pairs against the user's cached index, or pgvector"""
+        if not encoded:
+            return {}
+        
+        # All queries share one matrix product over the cached index; users
+        # the cache does not hold are ranked per query by match_entries
+        index = self._get_user_index(user_id)
+        if index is not None:
+            ranked = index.search_many(
+                [embedding for _, embedding in encoded],
+                limit=limit,
+                similarity_threshold=similarity_threshold,
+                filters=[filters[i] for i, _ in encoded]
+            )
+            return {i: matches for (i, _), matches in zip(encoded, ranked)}
+        
+        return {
+            i: self._semantic_matches(user_id, embedding, limit, similarity_threshold, **filters[i])
+            for i, embedding in encoded
+        }
+    
+    async def search_page(
+        self,
+        user_id: str,
+        query: str,
+        limit: int = 10,
+        similarity_threshold: float = 0.1,
+        cursor: Optional[str] = None,
+        plan: Optional[QueryPlan] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Return one page of a ranked semantic search
+        
+        The first call ranks up to `search_ranked_depth` entries and keeps
+        the ordering server-side; the returned cursor points at the next
+        page, which is served by slicing that ordering and hydrating only
+        its rows, without embedding or scoring again.
+        
+        Args:
+            user_id (str): User ID to search entries for
+            query (str): Search query (ignored when continuing from a cursor)
+            limit (int): Page size
+            similarity_threshold (float): Minimum similarity score
+            cursor (Optional[str]): Cursor returned by the previous page
+            plan (Optional[QueryPlan]): Filters from plan_query
             
-            # Sort by similarity score (descending)
-            scored_entries.sort(key=lambda x: x['similarity_score'], reverse=True)
+        Returns:
+            Tuple[List[Dict[str, Any]], Optional[str]]: Page of results and the
+            cursor of the next page (None on the last page)
             
-            # Return top results
-            return scored_entries[:limit]
+        Raises:
+            ValueError: If the cursor is malformed, expired or not the user's
+        """
+        if cursor:
+            decoded = self.ranked_results.decode_cursor(cursor)
+            matches = self.ranked_results.load(user_id, decoded[0]) if decoded else None
+            if matches is None:
+                raise ValueError("Search cursor is invalid or has expired")
+            token, offset = decoded
+        else:
+            matches = await self.rank_entries(user_id, query, similarity_threshold, plan)
+            token, offset = self.ranked_results.save(user_id, matches), 0
+        
+        page = matches[offset:offset + limit]
+        entries = await asyncio.to_thread(self._hydrate_entries, user_id, page)
+        next_offset = offset + limit
+        next_cursor = self.ranked_results.encode_cursor(token, next_offset) if next_offset < len(matches) else None
+        return entries, next_cursor
+    
+    async def stream_search(
+        self,
+        user_id: str,
+        query: str,
+        limit: int = 10,
+        similarity_threshold: float = 0.1,
+        plan: Optional[QueryPlan] = None,
+        chunk_size: int = 5
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Rank once, then yield results in small hydrated chunks
+        
+        Yields a {"type": "meta"} event as soon as scoring finishes, one
+        {"type": "result"} event per entry, and a final {"type": "end"}
+        event whose cursor continues with search_page.
+        """
+        matches = await self.rank_entries(user_id, query, similarity_threshold, plan)
+        token = self.ranked_results.save(user_id, matches)
+        first_page = matches[:limit]
+        yield {"type": "meta", "query": query, "total_ranked": len(matches)}
+        
+        for start in range(0, len(first_page), chunk_size):
+            chunk = first_page[start:start + chunk_size]
+            for entry in await asyncio.to_thread(self._hydrate_entries, user_id, chunk):
+                yield {"type": "result", "entry": entry}
+        
+        next_cursor = self.ranked_results.encode_cursor(token, limit) if limit < len(matches) else None
+        yield {"type": "end", "next_cursor": next_cursor}
+    
+    async def rank_entries(
+        self,
+        user_id: str,
+        query: str,
+        similarity_threshold: float = 0.1,
+        plan: Optional[QueryPlan] = None,
+        depth: Optional[int] = None
+    ) -> List[Tuple[str, float]]:
+        """Rank up to `depth` entries for a query, returning (entry_id, similarity) pairs"""
+        plan = plan or await self.plan_query(user_id, query)
+        query_embedding = await self.embedding_service.generate_embedding(query)
+        if not query_embedding:
+            return []
+        return await asyncio.to_thread(
+            self._semantic_matches,
+            user_id,
+            query_embedding,
+            depth or settings.search_ranked_depth,
+            similarity_threshold,
+            plan.date_range,
+            plan.mood,
+            plan.collection_id
+        )
+    
+    async def plan_query(
+        self,
+        user_id: str,
+        query: str,
+        date_range: Optional[Tuple[datetime, datetime]] = None,
+        mood_filter: Optional[str] = None,
+        collection_id: Optional[str] = None
+    ) -> QueryPlan:
+        """
+        Infer date, mood and collection filters from the query text
+        
+        Filters passed explicitly take precedence over inferred ones. The
+        resulting filters are applied before vector scoring, in the
+        match_entries RPC or the in-memory index mask.
+        
+        Args:
+            user_id (str): User ID (for collection names)
+            query (str): Search query
+            date_range (Optional[Tuple[datetime, datetime]]): Explicit date range
+            mood_filter (Optional[str]): Explicit mood
+            collection_id (Optional[str]): Explicit collection
             
+        Returns:
+            QueryPlan: Effective filters and the query text they came from
+        """
+        collections = [] if collection_id else await self._get_collections(user_id)
+        plan = query_planner.plan(query, collections=collections)
+        if date_range:
+            plan.date_range = date_range
+            plan.hints.pop("date_range", None)
+        if mood_filter:
+            plan.mood = mood_filter
+            plan.hints.pop("mood", None)
+        if collection_id:
+            plan.collection_id = collection_id
+        return plan
+    
+    async def _get_collections(self, user_id: str) -> List[Dict[str, Any]]:
+        """The user's collections, cached until their entries or collections change"""
+        generation = self.result_cache.generation(user_id)
+        cached = self._collections.get(user_id)
+        if cached and cached[0] == generation:
+            return cached[1]
+        try:
+            result = await asyncio.to_thread(
+                self.supabase.table("collections").select("id, name").eq("user_id", user_id).execute
+            )
+            collections = result.data or []
         except Exception as e:
-            print(f"Error in semantic search: {e}")
+            print(f"Error getting collections for query planning: {e}")
             return []
+        self._collections[user_id] = (generation, collections)
+        self._collections.move_to_end(user_id)
+        while len(self._collections) > COLLECTION_CACHE_SIZE:
+            self._collections.popitem(last=False)
+        return collections
+    
+    def _semantic_matches(
+        self,
+        user_id: str,
+        query_embedding: List[float],
+        limit: int,
+        similarity_threshold: float,
+        date_range: Optional[Tuple[datetime, datetime]] = None,
+        mood_filter: Optional[str] = None,
+        collection_id: Optional[str] = None
+    ) -> List[Tuple[str, float]]:
+        """Rank entries by similarity, returning (entry_id, similarity) pairs"""
+        filters = {
+            "date_range": date_range,
+            "mood_filter": mood_filter,
+            "collection_id": collection_id
+        }
+        
+        # Score against the user's in-memory index when it fits the
+        # memory budget; repeat searches then skip the database entirely.
+        index = self._get_user_index(user_id)
+        if index is not None:
+            return index.search(
+                query_embedding, limit=limit, similarity_threshold=similarity_threshold, **filters
+            )
+        
+        # Otherwise let pgvector rank candidates; fall back to scoring in
+        # Python if the match_entries function is not deployed.
+        # match_entries keeps walking the graph (hnsw.iterative_scan) until
+        # the filters are satisfied, so a short result is complete.
+        try:
+            return self._match_entries(
+                user_id, query_embedding, limit, similarity_threshold, **filters
+            )
+        except Exception as e:
+            print(f"match_entries RPC failed, scoring in Python: {e}")
+            return self._scan_matches(
+                user_id, query_embedding, limit, similarity_threshold, **filters
+            )
+    
+    def _get_user_index(self, user_id: str) -> Optional[UserVectorIndex]:
+        """Return the user's cached vector index, building it on first use"""
+        if not self.vector_index_cache.enabled:
+            return None
+        
+        index = self.vector_index_cache.get(user_id)
+        if index is not None or self.vector_index_cache.is_oversize(user_id):
+            return index
+        
+        generation = self.vector_index_cache.generation(user_id)
+        index = self._load_user_index(user_id)
+        if index is None or not self.vector_index_cache.put(index, generation):
+            # Too large for the memory budget, or a write raced the load;
+            # leave ranking to pgvector
+            return None
+        return index
+    
+    def _load_user_index(self, user_id: str) -> Optional[UserVectorIndex]:
+        """Fetch a user's embeddings and filter columns into an index"""
+        try:
+            result = self.supabase.table("entries").select(
+                "id, content_embedding, mood, collection_id, created_at"
+            ).eq("user_id", user_id).not_.is_("content_embedding", "null").execute()
+            return UserVectorIndex.from_rows(user_id, result.data or [], settings.embedding_dimensions)
+        except Exception as e:
+            print(f"Error building vector index: {e}")
+            return None
+    
+    def _match_entries(
+        self,
+        user_id: str,
+        query_embedding: List[float],
+        limit: int,
+        similarity_threshold: float,
+        date_range: Optional[Tuple[datetime, datetime]] = None,
+        mood_filter: Optional[str] = None,
+        collection_id: Optional[str] = None
+    ) -> List[Tuple[str, float]]:
+        """
+        Run the match_entries RPC and return (entry_id, similarity) pairs
+        ordered by descending similarity
+        """
+        start_date, end_date = date_range if date_range else (None, None)
+        params = {
+            "p_user_id": user_id,
+            "query_embedding": query_embedding,
+            "match_count": limit,
+            "similarity_threshold": similarity_threshold,
+            "p_start_date": start_date.isoformat() if start_date else None,
+            "p_end_date": end_date.isoformat() if end_date else None,
+            "p_mood": mood_filter,
+            "p_collection_id": collection_id
+        }
+        result = self.supabase.rpc("match_entries", params).execute()
+        rows = result.data if result.data else []
+        return [(row["id"], 1.0 - float(row["distance"])) for row in rows]
+    
+    def _hydrate_entries(
+        self,
+        user_id: str,
+        matches: List[Tuple[str, float]],
+        score_field: str = "similarity_score",
+        with_embedding: bool = False
+    ) -> List[Dict[str, Any]]:
+        """Load full rows for ranked matches, preserving match order"""
+        if not matches:
+            return []
+        
+        ids = [entry_id for entry_id, _ in matches]
+        columns = """
+            id, title, content, mood, mood_score, mood_image_url, 
+            collection_id, user_id, created_at, updated_at
+            """
+        if with_embedding:
+            columns += ", content_embedding"
+        result = self.supabase.table("entries").select(columns).eq("user_id", user_id).in_("id", ids).execute()
+        rows_by_id = {row["id"]: row for row in (result.data or [])}
+        
+        entries = []
+        for entry_id, similarity in matches:
+            row = rows_by_id.get(entry_id)
+            if row:
+                row[score_field] = float(similarity)
+                entries.append(row)
+        return entries
+    
+    def _scan_matches(
+        self,
+        user_id: str,
+        query_embedding: List[float],
+        limit: int,
+        similarity_threshold: float,
+        date_range: Optional[Tuple[datetime, datetime]] = None,
+        mood_filter: Optional[str] = None,
+        collection_id: Optional[str] = None
+    ) -> List[Tuple[str, float]]:
+        """
+        Score every matching entry in Python (used when the RPC is unavailable)
+        
+        Candidates are scored from ids and vectors alone, with the filters
+        applied by the database, so full rows only have to be loaded for the
+        top `limit` matches.
+        """
+        search_query = self.supabase.table("entries").select(
+            "id, content_embedding"
+        ).eq("user_id", user_id).not_.is_("content_embedding", "null")
+        
+        # Apply filters
+        if date_range:
+            if date_range[0]:
+                search_query = search_query.gte("created_at", date_range[0].isoformat())
+            if date_range[1]:
+                search_query = search_query.lte("created_at", date_range[1].isoformat())
+        
+        if mood_filter:
+            search_query = search_query.eq("mood", mood_filter)
+        
+        if collection_id:
+            search_query = search_query.eq("collection_id", collection_id)
+        
+        result = search_query.execute()
+        rows = result.data if result.data else []
+        
+        # PostgREST returns vectors as text; decode them all into one matrix
+        # and score every candidate with a single matrix product
+        embeddings, valid = decode_vectors(
+            [row.get("content_embedding") for row in rows],
+            settings.embedding_dimensions
+        )
+        candidate_ids = [row["id"] for row, ok in zip(rows, valid) if ok]
+        if not candidate_ids:
+            return []
+        
+        top_matches = self.embedding_service.top_k_similar(
+            query_embedding,
+            embeddings,
+            k=limit,
+            similarity_threshold=similarity_threshold
+        )
+        return [(candidate_ids[index], similarity) for index, similarity in top_matches]
     
     async def hybrid_search_entries(
         self,
@@ -107,11 +655,16 @@ class SemanticSearchService(SupabaseService):
         keyword_weight: float = 0.3,
         date_range: Optional[Tuple[datetime, datetime]] = None,
         mood_filter: Optional[str] = None,
-        collection_id: Optional[str] = None
+        collection_id: Optional[str] = None,
+        plan: Optional[QueryPlan] = None
     ) -> List[Dict[str, Any]]:
         """
         Perform hybrid search combining semantic and keyword search
         
+        The keyword query runs while the query is being embedded and ranked,
+        both signals are then scored over the union of their candidates and
+        full rows are loaded once for that shared set.
+        
         Args:
             user_id (str): User ID to search entries for
             query (str): Search query
@@ -121,48 +674,127 @@ class SemanticSearchService(SupabaseService):
             date_range (Optional[Tuple[datetime, datetime]]): Date range filter
             mood_filter (Optional[str]): Mood filter
             collection_id (Optional[str]): Collection filter
+            plan (Optional[QueryPlan]): Precomputed plan from plan_query
             
         Returns:
             List[Dict[str, Any]]: Hybrid search results with combined scores
         """
         try:
-            # Get semantic search results
-            semantic_results = await self.search_entries(
-                user_id=user_id,
-                query=query,
-                limit=limit * 2,  # Get more for hybrid ranking
-                similarity_threshold=0.05,
-                date_range=date_range,
-                mood_filter=mood_filter,
-                collection_id=collection_id
-            )
+            plan = plan or await self.plan_query(user_id, query, date_range, mood_filter, collection_id)
+            filters = {
+                "date_range": plan.date_range,
+                "mood_filter": plan.mood,
+                "collection_id": plan.collection_id
+            }
             
-            # Get keyword search results
-            keyword_results = await self._keyword_search_entries(
-                user_id=user_id,
-                query=query,
-                limit=limit * 2,
-                date_range=date_range,
-                mood_filter=mood_filter,
-                collection_id=collection_id
+            cache_key = self.result_cache.key(
+                user_id, "hybrid", query,
+                limit=limit,
+                semantic_weight=semantic_weight,
+                keyword_weight=keyword_weight,
+                **filters
             )
-            
-            # Combine and score results
-            combined_results = self._combine_search_results(
-                semantic_results, 
-                keyword_results, 
-                semantic_weight, 
-                keyword_weight
+            cached = self.result_cache.get(cache_key)
+            if cached is not None:
+                return cached
+            
+            # Get more candidates than needed from each side for hybrid ranking
+            (query_embedding, semantic_matches), keyword_matches = await asyncio.gather(
+                self._embed_and_match(user_id, query, limit * 2, **filters),
+                asyncio.to_thread(self._keyword_matches, user_id, query, limit * 2, **filters)
             )
             
-            # Sort by combined score and return top results
-            combined_results.sort(key=lambda x: x.get('combined_score', 0), reverse=True)
-            return combined_results[:limit]
+            results = await asyncio.to_thread(
+                self._score_candidates,
+                user_id,
+                query_embedding,
+                semantic_matches,
+                keyword_matches,
+                semantic_weight,
+                keyword_weight,
+                limit
+            )
+            self.result_cache.put(cache_key, results)
+            return results
             
         except Exception as e:
             print(f"Error in hybrid search: {e}")
             return []
     
+    async def _embed_and_match(
+        self,
+        user_id: str,
+        query: str,
+        limit: int,
+        **filters
+    ) -> Tuple[List[float], List[Tuple[str, float]]]:
+        """Embed the query and rank entries by similarity to it"""
+        query_embedding = await self.embedding_service.generate_embedding(query)
+        if not query_embedding:
+            return [], []
+        matches = await asyncio.to_thread(
+            self._semantic_matches, user_id, query_embedding, limit, 0.05, **filters
+        )
+        return query_embedding, matches
+    
+    def _score_candidates(
+        self,
+        user_id: str,
+        query_embedding: List[float],
+        semantic_matches: List[Tuple[str, float]],
+        keyword_matches: List[Tuple[str, float]],
+        semantic_weight: float,
+        keyword_weight: float,
+        limit: int
+    ) -> List[Dict[str, Any]]:
+        """
+        Blend both signals over the shared candidate set
+        
+        Keyword-only candidates get their real similarity instead of zero:
+        from the in-memory index when it is loaded, otherwise from the
+        embeddings fetched along with the rows.
+        """
+        keyword_scores = dict(keyword_matches)
+        candidate_ids = list(dict.fromkeys(
+            [entry_id for entry_id, _ in semantic_matches] + list(keyword_scores)
+        ))
+        if not candidate_ids:
+            return []
+        
+        semantic_scores = dict(semantic_matches)
+        missing = [entry_id for entry_id in candidate_ids if entry_id not in semantic_scores]
+        index = self.vector_index_cache.get(user_id) if missing and query_embedding else None
+        if index is not None:
+            semantic_scores.update(index.similarities(query_embedding, missing))
+        fetch_embeddings = bool(missing and query_embedding and index is None)
+        
+        entries = self._hydrate_entries(
+            user_id,
+            [(entry_id, semantic_scores.get(entry_id, 0.0)) for entry_id in candidate_ids],
+            with_embedding=fetch_embeddings
+        )
+        if fetch_embeddings:
+            embeddings, valid = decode_vectors(
+                [entry.pop("content_embedding", None) for entry in entries],
+                settings.embedding_dimensions
+            )
+            similarities = self.embedding_service.compute_similarities(query_embedding, embeddings)
+            scored = [entry for entry, ok in zip(entries, valid) if ok]
+            for entry, similarity in zip(scored, similarities):
+                if entry["id"] not in semantic_scores:
+                    entry["similarity_score"] = float(similarity)
+        
+        for entry in entries:
+            entry["semantic_score"] = entry["similarity_score"]
+            entry["keyword_score"] = keyword_scores.get(entry["id"], 0.0)
+            entry["combined_score"] = (
+                entry["semantic_score"] * semantic_weight +
+                entry["keyword_score"] * keyword_weight
+            )
+        
+        entries.sort(key=lambda entry: entry["combined_score"], reverse=True)
+        return entries[:limit]
+    
     async def _keyword_search_entries(
         self,
         user_id: str,
@@ -172,45 +804,105 @@ class SemanticSearchService(SupabaseService):
         mood_filter: Optional[str] = None,
         collection_id: Optional[str] = None
     ) -> List[Dict[str, Any]]:
-        """Perform keyword-based search on entries"""
+        """Perform full-text keyword search on entries, ranked by the database"""
         try:
-            # Build keyword search query using PostgreSQL full-text search
-            search_query = self.supabase.table("entries").select(
-                """
-                id, title, content, mood, mood_score, mood_image_url, 
-                collection_id, created_at, updated_at
-                """
-            ).eq("user_id", user_id)
-            
-            # Apply text search on content and title
-            search_query = search_query.or_(
-                f"content.ilike.%{query}%,title.ilike.%{query}%"
+            matches = await asyncio.to_thread(
+                self._keyword_matches,
+                user_id=user_id,
+                query=query,
+                limit=limit,
+                date_range=date_range,
+                mood_filter=mood_filter,
+                collection_id=collection_id
             )
-            
-            # Apply filters
-            if date_range:
-                search_query = search_query.gte("created_at", date_range[0].isoformat())
-                search_query = search_query.lte("created_at", date_range[1].isoformat())
-            
-            if mood_filter:
-                search_query = search_query.eq("mood", mood_filter)
-            
-            if collection_id:
-                search_query = search_query.eq("collection_id", collection_id)
-            
-            result = search_query.limit(limit).execute()
-            entries = result.data if result.data else []
-            
-            # Calculate keyword matching scores
-            for entry in entries:
-                entry['keyword_score'] = self._calculate_keyword_score(query, entry)
-            
-            return entries
+            return await asyncio.to_thread(self._hydrate_entries, user_id, matches, score_field="keyword_score")
             
         except Exception as e:
             print(f"Error in keyword search: {e}")
             return []
     
+    def _keyword_matches(
+        self,
+        user_id: str,
+        query: str,
+        limit: int,
+        date_range: Optional[Tuple[datetime, datetime]] = None,
+        mood_filter: Optional[str] = None,
+        collection_id: Optional[str] = None
+    ) -> List[Tuple[str, float]]:
+        """Rank entries by keyword match, returning (entry_id, score) pairs"""
+        filters = {
+            "date_range": date_range,
+            "mood_filter": mood_filter,
+            "collection_id": collection_id
+        }
+        try:
+            return self._match_keywords(user_id, query, limit, **filters)
+        except Exception as e:
+            print(f"keyword_search_entries RPC failed, ranking in Python: {e}")
+            return self._filter_keywords(user_id, query, limit, **filters)
+    
+    def _match_keywords(
+        self,
+        user_id: str,
+        query: str,
+        limit: int,
+        date_range: Optional[Tuple[datetime, datetime]] = None,
+        mood_filter: Optional[str] = None,
+        collection_id: Optional[str] = None
+    ) -> List[Tuple[str, float]]:
+        """
+        Run the keyword_search_entries RPC and return (entry_id, rank) pairs
+        ordered by descending ts_rank_cd
+        """
+        start_date, end_date = date_range if date_range else (None, None)
+        params = {
+            "p_user_id": user_id,
+            "query_text": query,
+            "match_count": limit,
+            "p_start_date": start_date.isoformat() if start_date else None,
+            "p_end_date": end_date.isoformat() if end_date else None,
+            "p_mood": mood_filter,
+            "p_collection_id": collection_id
+        }
+        result = self.supabase.rpc("keyword_search_entries", params).execute()
+        rows = result.data if result.data else []
+        return [(row["id"], float(row["rank"])) for row in rows]
+    
+    def _filter_keywords(
+        self,
+        user_id: str,
+        query: str,
+        limit: int,
+        date_range: Optional[Tuple[datetime, datetime]] = None,
+        mood_filter: Optional[str] = None,
+        collection_id: Optional[str] = None
+    ) -> List[Tuple[str, float]]:
+        """Match through the search_vector GIN index and rank the rows in Python"""
+        search_query = self.supabase.table("entries").select(
+            "id, title, content"
+        ).eq("user_id", user_id).filter("search_vector", "wfts(english)", query)
+        
+        # Apply filters
+        if date_range:
+            if date_range[0]:
+                search_query = search_query.gte("created_at", date_range[0].isoformat())
+            if date_range[1]:
+                search_query = search_query.lte("created_at", date_range[1].isoformat())
+        
+        if mood_filter:
+            search_query = search_query.eq("mood", mood_filter)
+        
+        if collection_id:
+            search_query = search_query.eq("collection_id", collection_id)
+        
+        result = search_query.limit(limit).execute()
+        entries = result.data if result.data else []
+        
+        matches = [(entry['id'], self._calculate_keyword_score(query, entry)) for entry in entries]
+        matches.sort(key=lambda match: match[1], reverse=True)
+        return matches
+    
     def _calculate_keyword_score(self, query: str, entry: Dict[str, Any]) -> float:
         """Calculate keyword matching score for an entry"""
         try:
@@ -225,98 +917,6 @@ class SemanticSearchService(SupabaseService):
         except Exception:
             return 0.0
     
-    def _combine_search_results(
-        self, 
-        semantic_results: List[Dict[str, Any]], 
-        keyword_results: List[Dict[str, Any]],
-        semantic_weight: float,
-        keyword_weight: float
-    ) -> List[Dict[str, Any]]:
-        """Combine semantic and keyword search results"""
-        # Create a dict to track entries by ID
-        combined_entries = {}
-        
-        # Add semantic results
-        for entry in semantic_results:
-            entry_id = entry['id']
-            combined_entries[entry_id] = entry.copy()
-            combined_entries[entry_id]['semantic_score'] = entry.get('similarity_score', 0)
-            combined_entries[entry_id]['keyword_score'] = 0
-        
-        # Add keyword results
-        for entry in keyword_results:
-            entry_id = entry['id']
-            if entry_id in combined_entries:
-                combined_entries[entry_id]['keyword_score'] = entry.get('keyword_score', 0)
-            else:
-                combined_entries[entry_id] = entry.copy()
-                combined_entries[entry_id]['semantic_score'] = 0
-                combined_entries[entry_id]['keyword_score'] = entry.get('keyword_score', 0)
-        
-        # Calculate combined scores
-        for entry in combined_entries.values():
-            semantic_score = entry.get('semantic_score', 0)
-            keyword_score = entry.get('keyword_score', 0)
-            entry['combined_score'] = (
-                semantic_score * semantic_weight + 
-                keyword_score * keyword_weight
-            )
-        
-        return list(combined_entries.values())
-    
-    def _parse_date_from_query(self, query: str) -> Optional[Tuple[datetime, datetime]]:
-        """Parse date references from natural language query"""
-        try:
-            query_lower = query.lower()
-            now = datetime.now()
-            
-            # Handle relative dates
-            if 'today' in query_lower:
-                start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-                end = start + timedelta(days=1)
-                return (start, end)
-            
-            if 'yesterday' in query_lower:
-                start = (now - timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
-                end = start + timedelta(days=1)
-                return (start, end)
-            
-            if 'this week' in query_lower:
-                days_since_monday = now.weekday()
-                start = (now - timedelta(days=days_since_monday)).replace(hour=0, minute=0, second=0, microsecond=0)
-                end = start + timedelta(days=7)
-                return (start, end)
-            
-            if 'last week' in query_lower:
-                days_since_monday = now.weekday()
-                start = (now - timedelta(days=days_since_monday + 7)).replace(hour=0, minute=0, second=0, microsecond=0)
-                end = start + timedelta(days=7)
-                return (start, end)
-            
-            # Handle month names
-            month_patterns = {
-                'january': 1, 'february': 2, 'march': 3, 'april': 4,
-                'may': 5, 'june': 6, 'july': 7, 'august': 8,
-                'september': 9, 'october': 10, 'november': 11, 'december': 12
-            }
-            
-            for month_name, month_num in month_patterns.items():
-                if month_name in query_lower:
-                    # Default to current year
-                    year = now.year
-                    start = datetime(year, month_num, 1)
-                    if month_num == 12:
-                        end = datetime(year + 1, 1, 1)
-                    else:
-                        end = datetime(year, month_num + 1, 1)
-                    return (start, end)
-            
-            return None
-            
-        except Exception as e:
-            print(f"Error parsing date from query: {e}")
-            return None
-    
     async def update_entry_embedding(self, entry_id: str, content: str) -> bool:
         """
         Update the embedding for a specific entry
@@ -335,60 +935,41 @@ class SemanticSearchService(SupabaseService):
                 return False
             
             # Update entry with embedding
-            result = self.supabase.table("entries").update({
+            result = await asyncio.to_thread(self.supabase.table("entries").update({
                 "content_embedding": embedding,
+                "embedding_status": "done",
                 "updated_at": datetime.now().isoformat()
-            }).eq("id", entry_id).execute()
+            }).eq("id", entry_id).execute)
             
+            if result.data:
+                entry = result.data[0]
+                self.vector_index_cache.upsert_entry(entry["user_id"], entry, embedding)
+                self.result_cache.bump(entry["user_id"])
             return bool(result.data)
             
         except Exception as e:
             print(f"Error updating entry embedding: {e}")
             return False
     
-    async def batch_update_embeddings(self, user_id: str) -> int:
+    async def batch_update_embeddings(self, user_id: str) -> BackfillStats:
         """
-        Update embeddings for all entries that don't have them
+        Embed all of a user's entries that don't have an embedding yet
         
         Args:
             user_id (str): User ID to update entries for
             
         Returns:
-            int: Number of entries updated
+            BackfillStats: Counts and throughput of the run
         """
+        pipeline = EmbeddingBackfillPipeline(
+            SupabaseEmbeddingStore(user_id=user_id),
+            embed_batch=self.embedding_service.generate_embeddings_batch
+        )
         try:
-            # Get entries without embeddings
-            result = self.supabase.table("entries").select(
-                "id, title, content"
-            ).eq("user_id", user_id).is_("content_embedding", "null").execute()
-            
-            entries = result.data if result.data else []
-            if not entries:
-                return 0
-            
-            # Generate embeddings in batches
-            batch_size = 10
-            updated_count = 0
-            
-            for i in range(0, len(entries), batch_size):
-                batch = entries[i:i + batch_size]
-                
-                # Generate embeddings for batch
-                contents = [f"{entry['title']} {entry['content']}" for entry in batch]
-                embeddings = await self.embedding_service.generate_embeddings_batch(contents)
-                
-                # Update entries
-                for j, entry in enumerate(batch):
-                    if j < len(embeddings) and embeddings[j]:
-                        success = await self.update_entry_embedding(entry['id'], contents[j])
-                        if success:
-                            updated_count += 1
-            
-            return updated_count
-            
+            return await pipeline.run()
         except Exception as e:
             print(f"Error batch updating embeddings: {e}")
-            return 0
+            return BackfillStats(finished_at=time.monotonic())
 
 
 # Global semantic search service instance
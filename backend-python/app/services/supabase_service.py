@@ -4,8 +4,18 @@ Supabase database service for interacting with tables
 import uuid
 from typing import List, Dict, Any, Optional
 from datetime import datetime
-from supabase import Client
-from app.core.database import get_supabase
+from supabase import AsyncClient, Client
+from app.core.config import settings
+from app.core.database import get_async_supabase, get_supabase
+from app.core.ttl_cache import TTLCache
+from app.services.search_cache import search_result_cache
+from app.services.vector_index import vector_index_cache
+
+# Clerk user id -> internal user row; every authenticated request resolves one
+user_cache = TTLCache(
+    ttl_seconds=settings.user_cache_ttl_seconds,
+    max_entries=settings.user_cache_max_entries
+)
 
 
 class SupabaseService:
@@ -19,28 +29,46 @@ class SupabaseService:
         return str(uuid.uuid4())
 
 
-class UserService(SupabaseService):
+class AsyncSupabaseService(SupabaseService):
+    """
+    Base class for services called from request handlers
+    
+    Queries go through the async client, so awaiting a round trip yields
+    the event loop to other requests instead of blocking the worker.
+    """
+    
+    def __init__(self):
+        self.supabase: AsyncClient = get_async_supabase()
+
+
+class UserService(AsyncSupabaseService):
     """Service for user operations"""
     
-    def get_user_by_clerk_id(self, clerk_user_id: str) -> Optional[Dict[str, Any]]:
-        """Get user by Clerk user ID"""
+    async def get_user_by_clerk_id(self, clerk_user_id: str) -> Optional[Dict[str, Any]]:
+        """Get user by Clerk user ID (served from the user cache when possible)"""
+        user = user_cache.get(clerk_user_id)
+        if user is not None:
+            return dict(user)
         try:
-            result = self.supabase.table("users").select("*").eq("clerk_user_id", clerk_user_id).execute()
-            return result.data[0] if result.data else None
+            result = await self.supabase.table("users").select("*").eq("clerk_user_id", clerk_user_id).execute()
+            user = result.data[0] if result.data else None
+            if user:
+                user_cache.put(clerk_user_id, user)
+            return user
         except Exception as e:
             print(f"Error getting user by clerk ID: {e}")
             return None
     
-    def get_user_by_id(self, user_id: str) -> Optional[Dict[str, Any]]:
+    async def get_user_by_id(self, user_id: str) -> Optional[Dict[str, Any]]:
         """Get user by internal ID"""
         try:
-            result = self.supabase.table("users").select("*").eq("id", user_id).execute()
+            result = await self.supabase.table("users").select("*").eq("id", user_id).execute()
             return result.data[0] if result.data else None
         except Exception as e:
             print(f"Error getting user by ID: {e}")
             return None
     
-    def create_user(self, user_data: Dict[str, Any]) -> Dict[str, Any]:
+    async def create_user(self, user_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create a new user"""
         try:
             user_data["id"] = self.generate_id()
@@ -57,8 +85,11 @@ class UserService(SupabaseService):
             
             print(f"Debug - Final user_data before insert: {user_data}")
             
-            result = self.supabase.table("users").insert(user_data).execute()
-            return result.data[0] if result.data else None
+            result = await self.supabase.table("users").insert(user_data).execute()
+            user = result.data[0] if result.data else None
+            if user:
+                user_cache.put(user_data["clerk_user_id"], user)
+            return user
         except Exception as e:
             # Graceful fallback for local dev when Supabase is unreachable.
             # Return an ephemeral, in-memory user object so the app can continue.
@@ -74,9 +105,23 @@ class UserService(SupabaseService):
                 "__ephemeral": True,
             }
     
-    def get_or_create_user(self, clerk_user_id: str, user_data: Dict[str, Any]) -> Dict[str, Any]:
+    async def update_user(self, user_id: str, update_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Update a user and drop their cached row"""
+        try:
+            update_data["updated_at"] = datetime.now().isoformat()
+            
+            result = await self.supabase.table("users").update(update_data).eq("id", user_id).execute()
+            user = result.data[0] if result.data else None
+            if user and user.get("clerk_user_id"):
+                user_cache.pop(user["clerk_user_id"])
+            return user
+        except Exception as e:
+            print(f"Error updating user: {e}")
+            return None
+    
+    async def get_or_create_user(self, clerk_user_id: str, user_data: Dict[str, Any]) -> Dict[str, Any]:
         """Get existing user or create new one"""
-        user = self.get_user_by_clerk_id(clerk_user_id)
+        user = await self.get_user_by_clerk_id(clerk_user_id)
         if user:
             return user
         
@@ -87,23 +132,23 @@ class UserService(SupabaseService):
             "name": user_data.get("name") or "User",
             "image_url": user_data.get("image_url")
         }
-        return self.create_user(create_data)
+        return await self.create_user(create_data)
 
 
-class CollectionService(SupabaseService):
+class CollectionService(AsyncSupabaseService):
     """Service for collection operations"""
     
-    def get_collections(self, user_id: str) -> List[Dict[str, Any]]:
+    async def get_collections(self, user_id: str) -> List[Dict[str, Any]]:
         """Get all collections for a user"""
         try:
-            result = self.supabase.table("collections").select("*").eq("user_id", user_id).order("created_at", desc=True).execute()
+            result = await self.supabase.table("collections").select("*").eq("user_id", user_id).order("created_at", desc=True).execute()
             return result.data or []
         except Exception as e:
             print(f"Error getting collections (fallback to empty list): {e}")
             # Return a deterministic empty list rather than 500 for unreachable DB in dev
             return []
     
-    def create_collection(self, user_id: str, collection_data: Dict[str, Any]) -> Dict[str, Any]:
+    async def create_collection(self, user_id: str, collection_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create a new collection"""
         try:
             data = {
@@ -115,49 +160,58 @@ class CollectionService(SupabaseService):
                 "updated_at": datetime.now().isoformat()
             }
             
-            result = self.supabase.table("collections").insert(data).execute()
+            result = await self.supabase.table("collections").insert(data).execute()
+            # Collection names feed search query planning
+            search_result_cache.bump(user_id)
             return result.data[0] if result.data else None
         except Exception as e:
             print(f"Error creating collection (dev fallback): {e}")
             # Dev fallback: echo back the object so UI doesn't crash; mark ephemeral
             return {**data, "__ephemeral": True}
     
-    def update_collection(self, collection_id: str, user_id: str, update_data: Dict[str, Any]) -> Dict[str, Any]:
+    async def update_collection(self, collection_id: str, user_id: str, update_data: Dict[str, Any]) -> Dict[str, Any]:
         """Update a collection"""
         try:
             update_data["updated_at"] = datetime.now().isoformat()
             
-            result = self.supabase.table("collections").update(update_data).eq("id", collection_id).eq("user_id", user_id).execute()
+            result = await self.supabase.table("collections").update(update_data).eq("id", collection_id).eq("user_id", user_id).execute()
+            search_result_cache.bump(user_id)
             return result.data[0] if result.data else None
         except Exception as e:
             print(f"Error updating collection (dev fallback): {e}")
             return {"id": collection_id, **update_data, "user_id": user_id, "__ephemeral": True}
     
-    def delete_collection(self, collection_id: str, user_id: str) -> bool:
+    async def delete_collection(self, collection_id: str, user_id: str) -> bool:
         """Delete a collection"""
         try:
-            result = self.supabase.table("collections").delete().eq("id", collection_id).eq("user_id", user_id).execute()
+            result = await self.supabase.table("collections").delete().eq("id", collection_id).eq("user_id", user_id).execute()
+            # Entries cascade with the collection; rebuild the index on next search
+            vector_index_cache.invalidate(user_id)
+            search_result_cache.bump(user_id)
             return True
         except Exception as e:
             print(f"Error deleting collection (dev fallback): {e}")
             return True
     
-    def get_collection(self, collection_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+    async def get_collection(self, collection_id: str, user_id: str) -> Optional[Dict[str, Any]]:
         """Get a specific collection"""
         try:
-            result = self.supabase.table("collections").select("*").eq("id", collection_id).eq("user_id", user_id).execute()
+            result = await self.supabase.table("collections").select("*").eq("id", collection_id).eq("user_id", user_id).execute()
             return result.data[0] if result.data else None
         except Exception as e:
             print(f"Error getting collection (dev fallback): {e}")
             return None
 
 
-class EntryService(SupabaseService):
+class EntryService(AsyncSupabaseService):
     """Service for journal entry operations"""
     
     async def create_entry(self, user_id: str, entry_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Create a new journal entry with embedding generation"""
+        """Create a new journal entry and queue its embedding"""
+        from app.services.embedding_worker import embedding_version
+        
         try:
+            now = datetime.now().isoformat()
             data = {
                 "id": self.generate_id(),
                 "user_id": user_id,
@@ -167,50 +221,36 @@ class EntryService(SupabaseService):
                 "mood_score": entry_data["mood_score"],
                 "mood_image_url": entry_data.get("mood_image_url"),
                 "collection_id": entry_data.get("collection_id"),
-                "created_at": datetime.now().isoformat(),
-                "updated_at": datetime.now().isoformat()
+                "embedding_status": "pending",
+                "embedding_version": embedding_version(f"{entry_data['title']} {entry_data['content']}"),
+                "created_at": now,
+                "updated_at": now
             }
             
-            # Generate embedding for the entry content
-            try:
-                from app.services.embedding_service import embedding_service
-                full_content = f"{entry_data['title']} {entry_data['content']}"
-                embedding = await embedding_service.generate_embedding(full_content)
-                if embedding:
-                    data["content_embedding"] = embedding
-            except Exception as e:
-                print(f"Warning: Failed to generate embedding: {e}")
-                # Continue without embedding - can be generated later
-            
-            result = self.supabase.table("entries").insert(data).execute()
-            return result.data[0] if result.data else None
+            result = await self.supabase.table("entries").insert(data).execute()
+            entry = result.data[0] if result.data else None
+            search_result_cache.bump(user_id)
+            if entry:
+                # Embedding happens in the background; the row is already saved
+                self._enqueue_embedding(entry)
+            return entry
         except Exception as e:
             print(f"Error creating entry: {e}")
             raise Exception(f"Failed to create entry: {str(e)}")
     
-    def create_entry_sync(self, user_id: str, entry_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Synchronous version of create_entry for backward compatibility"""
-        try:
-            data = {
-                "id": self.generate_id(),
-                "user_id": user_id,
-                "title": entry_data["title"],
-                "content": entry_data["content"],
-                "mood": entry_data["mood"],
-                "mood_score": entry_data["mood_score"],
-                "mood_image_url": entry_data.get("mood_image_url"),
-                "collection_id": entry_data.get("collection_id"),
-                "created_at": datetime.now().isoformat(),
-                "updated_at": datetime.now().isoformat()
-            }
-            
-            result = self.supabase.table("entries").insert(data).execute()
-            return result.data[0] if result.data else None
-        except Exception as e:
-            print(f"Error creating entry: {e}")
-            raise Exception(f"Failed to create entry: {str(e)}")
+    def _enqueue_embedding(self, entry: Dict[str, Any]) -> bool:
+        """Hand an entry to the background embedding worker"""
+        from app.services.embedding_worker import EmbeddingJob, embedding_worker, embedding_version
+        
+        text = f"{entry.get('title', '')} {entry.get('content', '')}"
+        return embedding_worker.enqueue(EmbeddingJob(
+            entry_id=entry["id"],
+            user_id=entry["user_id"],
+            text=text,
+            version=embedding_version(text)
+        ))
     
-    def get_entries(self, user_id: str, collection_id: Optional[str] = None, order_by: str = "desc") -> List[Dict[str, Any]]:
+    async def get_entries(self, user_id: str, collection_id: Optional[str] = None, order_by: str = "desc") -> List[Dict[str, Any]]:
         """Get journal entries for a user"""
         try:
             query = self.supabase.table("entries").select("*, collections(id, name)").eq("user_id", user_id)
@@ -225,87 +265,94 @@ class EntryService(SupabaseService):
             else:
                 query = query.order("created_at", desc=True)
             
-            result = query.execute()
+            result = await query.execute()
             return result.data or []
         except Exception as e:
             print(f"Error getting entries: {e}")
             return []
     
-    def get_entry(self, entry_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+    async def get_entry(self, entry_id: str, user_id: str) -> Optional[Dict[str, Any]]:
         """Get a specific entry"""
         try:
-            result = self.supabase.table("entries").select("*, collections(id, name)").eq("id", entry_id).eq("user_id", user_id).execute()
+            result = await self.supabase.table("entries").select("*, collections(id, name)").eq("id", entry_id).eq("user_id", user_id).execute()
             return result.data[0] if result.data else None
         except Exception as e:
             print(f"Error getting entry: {e}")
             return None
     
-    async def update_entry(self, entry_id: str, user_id: str, update_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Update a journal entry and regenerate embedding if content changed"""
+    async def get_embedding_status(self, entry_id: str, user_id: str) -> Optional[str]:
+        """Get the embedding state of an entry (None if the entry does not exist)"""
         try:
-            update_data["updated_at"] = datetime.now().isoformat()
-            
-            # If content or title changed, regenerate embedding
-            if "content" in update_data or "title" in update_data:
-                try:
-                    # Get current entry to build full content
-                    current_entry = self.get_entry(entry_id, user_id)
-                    if current_entry:
-                        new_title = update_data.get("title", current_entry.get("title", ""))
-                        new_content = update_data.get("content", current_entry.get("content", ""))
-                        full_content = f"{new_title} {new_content}"
-                        
-                        from app.services.embedding_service import embedding_service
-                        embedding = await embedding_service.generate_embedding(full_content)
-                        if embedding:
-                            update_data["content_embedding"] = embedding
-                except Exception as e:
-                    print(f"Warning: Failed to update embedding: {e}")
-            
-            result = self.supabase.table("entries").update(update_data).eq("id", entry_id).eq("user_id", user_id).execute()
-            return result.data[0] if result.data else None
+            result = await self.supabase.table("entries").select("embedding_status").eq("id", entry_id).eq("user_id", user_id).execute()
+            return result.data[0]["embedding_status"] if result.data else None
         except Exception as e:
-            print(f"Error updating entry: {e}")
-            raise Exception(f"Failed to update entry: {str(e)}")
+            print(f"Error getting embedding status: {e}")
+            return None
     
-    def update_entry_sync(self, entry_id: str, user_id: str, update_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Synchronous version of update_entry for backward compatibility"""
+    async def update_entry(self, entry_id: str, user_id: str, update_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Update a journal entry and queue a new embedding if its text changed"""
+        from app.services.embedding_worker import embedding_version
+        
         try:
             update_data["updated_at"] = datetime.now().isoformat()
             
-            result = self.supabase.table("entries").update(update_data).eq("id", entry_id).eq("user_id", user_id).execute()
-            return result.data[0] if result.data else None
+            # If content or title changed, the embedding has to be recomputed
+            needs_embedding = False
+            if "content" in update_data or "title" in update_data:
+                current_entry = await self.get_entry(entry_id, user_id)
+                if current_entry:
+                    new_title = update_data.get("title", current_entry.get("title", ""))
+                    new_content = update_data.get("content", current_entry.get("content", ""))
+                    full_content = f"{new_title} {new_content}"
+                    old_content = f"{current_entry.get('title', '')} {current_entry.get('content', '')}"
+                    
+                    # Unchanged text keeps its stored embedding
+                    needs_embedding = full_content != old_content or not current_entry.get("content_embedding")
+                    if needs_embedding:
+                        update_data["embedding_status"] = "pending"
+                        update_data["embedding_version"] = embedding_version(full_content)
+            
+            result = await self.supabase.table("entries").update(update_data).eq("id", entry_id).eq("user_id", user_id).execute()
+            entry = result.data[0] if result.data else None
+            search_result_cache.bump(user_id)
+            if entry:
+                vector_index_cache.upsert_entry(user_id, entry)
+                if needs_embedding:
+                    self._enqueue_embedding(entry)
+            return entry
         except Exception as e:
             print(f"Error updating entry: {e}")
             raise Exception(f"Failed to update entry: {str(e)}")
     
-    def delete_entry(self, entry_id: str, user_id: str) -> bool:
+    async def delete_entry(self, entry_id: str, user_id: str) -> bool:
         """Delete a journal entry"""
         try:
-            result = self.supabase.table("entries").delete().eq("id", entry_id).eq("user_id", user_id).execute()
+            result = await self.supabase.table("entries").delete().eq("id", entry_id).eq("user_id", user_id).execute()
+            vector_index_cache.remove_entry(user_id, entry_id)
+            search_result_cache.bump(user_id)
             return True
         except Exception as e:
             print(f"Error deleting entry: {e}")
             raise Exception(f"Failed to delete entry: {str(e)}")
 
 
-class DraftService(SupabaseService):
+class DraftService(AsyncSupabaseService):
     """Service for draft operations"""
     
-    def get_draft(self, user_id: str) -> Optional[Dict[str, Any]]:
+    async def get_draft(self, user_id: str) -> Optional[Dict[str, Any]]:
         """Get current draft for a user"""
         try:
-            result = self.supabase.table("drafts").select("*").eq("user_id", user_id).execute()
+            result = await self.supabase.table("drafts").select("*").eq("user_id", user_id).execute()
             return result.data[0] if result.data else None
         except Exception as e:
             print(f"Error getting draft: {e}")
             return None
     
-    def save_draft(self, user_id: str, draft_data: Dict[str, Any]) -> Dict[str, Any]:
+    async def save_draft(self, user_id: str, draft_data: Dict[str, Any]) -> Dict[str, Any]:
         """Save or update draft for a user"""
         try:
             # Check if draft exists
-            existing_draft = self.get_draft(user_id)
+            existing_draft = await self.get_draft(user_id)
             
             if existing_draft:
                 # Update existing draft
@@ -313,7 +360,7 @@ class DraftService(SupabaseService):
                     **draft_data,
                     "updated_at": datetime.now().isoformat()
                 }
-                result = self.supabase.table("drafts").update(update_data).eq("user_id", user_id).execute()
+                result = await self.supabase.table("drafts").update(update_data).eq("user_id", user_id).execute()
                 return result.data[0] if result.data else None
             else:
                 # Create new draft
@@ -324,16 +371,16 @@ class DraftService(SupabaseService):
                     "created_at": datetime.now().isoformat(),
                     "updated_at": datetime.now().isoformat()
                 }
-                result = self.supabase.table("drafts").insert(data).execute()
+                result = await self.supabase.table("drafts").insert(data).execute()
                 return result.data[0] if result.data else None
         except Exception as e:
             print(f"Error saving draft: {e}")
             raise Exception(f"Failed to save draft: {str(e)}")
     
-    def delete_draft(self, user_id: str) -> bool:
+    async def delete_draft(self, user_id: str) -> bool:
         """Delete draft for a user"""
         try:
-            result = self.supabase.table("drafts").delete().eq("user_id", user_id).execute()
+            result = await self.supabase.table("drafts").delete().eq("user_id", user_id).execute()
             return True
         except Exception as e:
             print(f"Error deleting draft: {e}")
@@ -0,0 +1,113 @@
+"""
+Decoding and encoding of pgvector values
+"""
+import struct
+from typing import Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# pgvector's binary send format: int16 dimensions, int16 unused, then
+# big-endian float4 values
+_BINARY_HEADER = struct.Struct(">hh")
+_BINARY_DTYPE = np.dtype(">f4")
+
+
+def _parse_text(text: str) -> Optional[np.ndarray]:
+    """Parse a comma separated float list in C, returning None on malformed input"""
+    try:
+        # Older numpy stops at bad data with a warning instead of raising; the
+        # callers' length check then rejects the truncated vector
+        return np.fromstring(text, dtype=np.float32, sep=",")
+    except ValueError:
+        return None
+
+
+def _decode_binary(value: bytes) -> Optional[np.ndarray]:
+    if len(value) < _BINARY_HEADER.size:
+        return None
+    dimensions, _ = _BINARY_HEADER.unpack_from(value)
+    if len(value) != _BINARY_HEADER.size + dimensions * _BINARY_DTYPE.itemsize:
+        return None
+    return np.frombuffer(value, dtype=_BINARY_DTYPE, offset=_BINARY_HEADER.size).astype(np.float32)
+
+
+def decode_vector(value: Any, dimensions: Optional[int] = None) -> Optional[np.ndarray]:
+    """
+    Decode one pgvector value into a float32 array
+
+    Args:
+        value: Text such as "[0.1,-0.2]" (what PostgREST returns), the binary
+            send format, or a list/array of floats
+        dimensions (Optional[int]): Expected length; other lengths are rejected
+
+    Returns:
+        Optional[np.ndarray]: (D,) float32 vector, or None if missing or malformed
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        text = value.strip()
+        if len(text) < 2 or text[0] != "[" or text[-1] != "]":
+            return None
+        vector = _parse_text(text[1:-1])
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        vector = _decode_binary(bytes(value))
+    else:
+        try:
+            vector = np.asarray(value, dtype=np.float32)
+        except (TypeError, ValueError):
+            return None
+        if vector.ndim != 1:
+            return None
+
+    if vector is None or vector.size == 0:
+        return None
+    if dimensions is not None and vector.size != dimensions:
+        return None
+    return vector
+
+
+def decode_vectors(values: Sequence[Any], dimensions: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Decode many pgvector values into one float32 matrix
+
+    Each value is parsed straight into a preallocated row by numpy, so there
+    is no Python float per element. Missing, malformed or wrongly sized
+    vectors are dropped.
+
+    Args:
+        values: pgvector values in any form accepted by decode_vector
+        dimensions (int): Expected vector length
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: (M, D) matrix of the valid vectors and a
+        boolean mask of length N marking which input values they came from
+    """
+    count = len(values)
+    if count and all(isinstance(value, list) and len(value) == dimensions for value in values):
+        # Already JSON arrays: one conversion for the whole batch
+        try:
+            return np.asarray(values, dtype=np.float32), np.ones(count, dtype=bool)
+        except (TypeError, ValueError):
+            pass
+
+    valid = np.zeros(count, dtype=bool)
+    matrix = np.empty((count, dimensions), dtype=np.float32)
+    for i, value in enumerate(values):
+        vector = decode_vector(value, dimensions)
+        if vector is not None:
+            matrix[i] = vector
+            valid[i] = True
+
+    return (matrix if valid.all() else matrix[valid]), valid
+
+
+def encode_vector(embedding: Sequence[float]) -> str:
+    """Format a vector as pgvector text input ("[x,y,...]")"""
+    values = np.asarray(embedding, dtype=np.float32).tolist()
+    return "[" + ",".join(map(repr, values)) + "]"
+
+
+def encode_vectors(embeddings: Sequence[Sequence[float]]) -> List[str]:
+    """Format many vectors as pgvector text input"""
+    return [encode_vector(embedding) for embedding in embeddings]
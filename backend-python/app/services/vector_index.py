@@ -0,0 +1,447 @@
+"""
+Process-local per-user vector index for semantic search
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.ttl_cache import TTLCache
+from app.services.vector_codec import decode_vector, decode_vectors
+
+# Rough per-row overhead of the id list, lookup dict and filter columns
+_ROW_OVERHEAD_BYTES = 200
+_INITIAL_CAPACITY = 64
+_MAX_OVERSIZE_USERS = 10000
+
+
+def _to_timestamp(value: Any) -> float:
+    """Convert an ISO string or datetime to a UTC epoch timestamp (NaN if unknown)"""
+    if value is None:
+        return float("nan")
+    try:
+        if isinstance(value, str):
+            value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+    except (ValueError, TypeError, AttributeError):
+        return float("nan")
+
+
+class _Rows(NamedTuple):
+    """The first `size` rows of an index, as of one point in time"""
+    size: int
+    vectors: np.ndarray
+    ids: List[str]
+    moods: np.ndarray
+    collection_ids: np.ndarray
+    created_at: np.ndarray
+
+
+class UserVectorIndex:
+    """
+    Normalized embeddings of one user's entries plus the columns search filters on
+
+    Searches score a snapshot of the rows taken under the lock. Writers never
+    modify rows a snapshot can see in place: appends go past the current
+    size, and updates or removals of existing rows copy the arrays first, so
+    a search that overlaps an upsert or remove still sees consistent ids and
+    vectors.
+    """
+
+    def __init__(self, user_id: str, dimensions: int, capacity: int = _INITIAL_CAPACITY):
+        capacity = max(capacity, 1)
+        self.user_id = user_id
+        self.dimensions = dimensions
+        self._size = 0
+        self._vectors = np.zeros((capacity, dimensions), dtype=np.float32)
+        self._ids: List[str] = []
+        self._moods = np.empty(capacity, dtype=object)
+        self._collection_ids = np.empty(capacity, dtype=object)
+        self._created_at = np.full(capacity, np.nan, dtype=np.float64)
+        self._positions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_rows(cls, user_id: str, rows: Sequence[Dict[str, Any]], dimensions: int) -> "UserVectorIndex":
+        """
+        Build an index from entry rows carrying id, content_embedding and filter columns
+
+        Embeddings may be pgvector text or lists; they are decoded and
+        normalized as one matrix. Rows without a usable embedding are skipped.
+        """
+        matrix, valid = decode_vectors([row.get("content_embedding") for row in rows], dimensions)
+        rows = [row for row, ok in zip(rows, valid) if ok]
+        index = cls(user_id, dimensions, capacity=max(len(rows), _INITIAL_CAPACITY))
+
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        index._vectors[:len(rows)] = matrix / norms
+        for position, row in enumerate(rows):
+            index._ids.append(row["id"])
+            index._positions[row["id"]] = position
+            index._moods[position] = row.get("mood")
+            index._collection_ids[position] = row.get("collection_id")
+            index._created_at[position] = _to_timestamp(row.get("created_at"))
+        index._size = len(rows)
+        return index
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, entry_id: str) -> bool:
+        return entry_id in self._positions
+
+    @property
+    def memory_bytes(self) -> int:
+        """Approximate memory held by this index"""
+        return int(self._vectors.nbytes + self._created_at.nbytes + len(self._moods) * _ROW_OVERHEAD_BYTES)
+
+    def _rows(self) -> _Rows:
+        with self._lock:
+            size = self._size
+            return _Rows(
+                size,
+                self._vectors[:size],
+                self._ids[:size],
+                self._moods[:size],
+                self._collection_ids[:size],
+                self._created_at[:size],
+            )
+
+    def _grow(self):
+        capacity = len(self._moods) * 2
+        vectors = np.zeros((capacity, self.dimensions), dtype=np.float32)
+        vectors[:self._size] = self._vectors[:self._size]
+        self._vectors = vectors
+        self._moods = np.concatenate([self._moods, np.empty(capacity - len(self._moods), dtype=object)])
+        self._collection_ids = np.concatenate(
+            [self._collection_ids, np.empty(capacity - len(self._collection_ids), dtype=object)]
+        )
+        self._created_at = np.concatenate(
+            [self._created_at, np.full(capacity - len(self._created_at), np.nan, dtype=np.float64)]
+        )
+
+    def upsert(self, entry: Dict[str, Any], embedding: Optional[Any] = None):
+        """
+        Insert or update one entry
+
+        Without an embedding only the filter columns of an already indexed
+        entry are refreshed; unknown entries are ignored. The embedding may be
+        any form vector_codec.decode_vector accepts.
+        """
+        if embedding is not None:
+            embedding = decode_vector(embedding, self.dimensions)
+            norm = np.linalg.norm(embedding)
+            embedding = embedding / norm if norm else embedding
+        entry_id = entry["id"]
+        with self._lock:
+            position = self._positions.get(entry_id)
+            if position is None:
+                if embedding is None:
+                    return
+                if self._size == len(self._moods):
+                    self._grow()
+                # The new row lies past every existing snapshot
+                position = self._size
+                self._ids.append(entry_id)
+                self._positions[entry_id] = position
+                self._write_row(position, entry, embedding)
+                self._size += 1
+                return
+
+            # Copy on write: snapshots may still be reading this row
+            if embedding is not None:
+                self._vectors = self._vectors.copy()
+            if "mood" in entry:
+                self._moods = self._moods.copy()
+            if "collection_id" in entry:
+                self._collection_ids = self._collection_ids.copy()
+            if "created_at" in entry:
+                self._created_at = self._created_at.copy()
+            self._write_row(position, entry, embedding)
+
+    def _write_row(self, position: int, entry: Dict[str, Any], embedding: Optional[np.ndarray]):
+        if embedding is not None:
+            self._vectors[position] = embedding
+        if "mood" in entry:
+            self._moods[position] = entry["mood"]
+        if "collection_id" in entry:
+            self._collection_ids[position] = entry["collection_id"]
+        if "created_at" in entry:
+            self._created_at[position] = _to_timestamp(entry["created_at"])
+
+    def remove(self, entry_id: str):
+        """Remove an entry by swapping the last row into its slot"""
+        with self._lock:
+            position = self._positions.pop(entry_id, None)
+            if position is None:
+                return
+            # Copy on write: snapshots may still be reading both rows
+            self._vectors = self._vectors.copy()
+            self._moods = self._moods.copy()
+            self._collection_ids = self._collection_ids.copy()
+            self._created_at = self._created_at.copy()
+            last = self._size - 1
+            if position != last:
+                moved_id = self._ids[last]
+                self._vectors[position] = self._vectors[last]
+                self._moods[position] = self._moods[last]
+                self._collection_ids[position] = self._collection_ids[last]
+                self._created_at[position] = self._created_at[last]
+                self._ids[position] = moved_id
+                self._positions[moved_id] = position
+            self._ids.pop()
+            self._moods[last] = None
+            self._collection_ids[last] = None
+            self._created_at[last] = np.nan
+            self._size = last
+
+    def search(
+        self,
+        query_embedding: Sequence[float],
+        limit: int,
+        similarity_threshold: float = 0.0,
+        date_range: Optional[Tuple[Optional[datetime], Optional[datetime]]] = None,
+        mood_filter: Optional[str] = None,
+        collection_id: Optional[str] = None
+    ) -> List[Tuple[str, float]]:
+        """
+        Return (entry_id, similarity) pairs for the best matching entries
+
+        Filters are applied as a boolean mask over the filter columns, so the
+        scoring stays a single matrix-vector product.
+        """
+        from app.services.embedding_service import embedding_service
+
+        rows = self._rows()
+        if rows.size == 0:
+            return []
+
+        scores = embedding_service.compute_similarities(query_embedding, rows.vectors, normalized=True)
+        return self._top_matches(rows, scores, limit, similarity_threshold, date_range, mood_filter, collection_id)
+
+    def search_many(
+        self,
+        query_embeddings: Sequence[Sequence[float]],
+        limit: int,
+        similarity_threshold: float = 0.0,
+        filters: Optional[Sequence[Dict[str, Any]]] = None
+    ) -> List[List[Tuple[str, float]]]:
+        """
+        Rank entries for several queries at once
+
+        All queries are scored with one (N, D) x (D, Q) product; each query's
+        filters (date_range, mood_filter, collection_id) are then applied to
+        its own column.
+        """
+        from app.services.embedding_service import embedding_service
+
+        if not query_embeddings:
+            return []
+        rows = self._rows()
+        if rows.size == 0:
+            return [[] for _ in query_embeddings]
+
+        queries = embedding_service.normalize_embeddings(query_embeddings)
+        scores = rows.vectors @ queries.T
+        filters = filters or [{} for _ in query_embeddings]
+        return [
+            self._top_matches(
+                rows, np.ascontiguousarray(scores[:, column]), limit, similarity_threshold, **filters[column]
+            )
+            for column in range(scores.shape[1])
+        ]
+
+    @staticmethod
+    def _top_matches(
+        rows: _Rows,
+        scores: np.ndarray,
+        limit: int,
+        similarity_threshold: float,
+        date_range: Optional[Tuple[Optional[datetime], Optional[datetime]]] = None,
+        mood_filter: Optional[str] = None,
+        collection_id: Optional[str] = None
+    ) -> List[Tuple[str, float]]:
+        from app.services.embedding_service import embedding_service
+
+        mask = np.ones(rows.size, dtype=bool)
+        if mood_filter:
+            mask &= rows.moods == mood_filter
+        if collection_id:
+            mask &= rows.collection_ids == collection_id
+        if date_range:
+            if date_range[0]:
+                mask &= rows.created_at >= _to_timestamp(date_range[0])
+            if date_range[1]:
+                mask &= rows.created_at <= _to_timestamp(date_range[1])
+        if not mask.all():
+            scores = np.where(mask, scores, -np.inf)
+
+        matches = embedding_service.select_top_k(scores, limit, similarity_threshold)
+        return [(rows.ids[i], score) for i, score in matches]
+
+    def vector(self, entry_id: str) -> Optional[np.ndarray]:
+        """The stored (unit length) vector of an entry, or None if it is not indexed"""
+        with self._lock:
+            position = self._positions.get(entry_id)
+            return None if position is None else self._vectors[position].copy()
+
+    def similarities(self, query_embedding: Sequence[float], entry_ids: Sequence[str]) -> Dict[str, float]:
+        """Cosine similarity of the query to specific indexed entries (unknown ids are left out)"""
+        from app.services.embedding_service import embedding_service
+
+        with self._lock:
+            known = [entry_id for entry_id in entry_ids if entry_id in self._positions]
+            if not known:
+                return {}
+            vectors = self._vectors[[self._positions[entry_id] for entry_id in known]]
+        scores = embedding_service.compute_similarities(query_embedding, vectors, normalized=True)
+        return {entry_id: float(score) for entry_id, score in zip(known, scores)}
+
+
+class VectorIndexCache:
+    """
+    LRU cache of per-user indexes bounded by a memory budget
+
+    Writes made by this process are applied to loaded indexes directly.
+    Indexes expire `ttl_seconds` after they were built so writes from other
+    workers or the backfill CLI are picked up. Every write also bumps the
+    user's generation: an index built from rows read before a write (whose
+    write-through found nothing to update) is refused by `put`.
+
+    Users whose index does not fit the budget are remembered (with their
+    row count) for the same TTL, so their searches skip the download and go
+    straight to pgvector.
+    """
+
+    def __init__(self, max_bytes: int, ttl_seconds: float = 300.0):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        # user_id -> (expires_at, index)
+        self._indexes: "OrderedDict[str, Tuple[float, UserVectorIndex]]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self._oversize = TTLCache(ttl_seconds=ttl_seconds, max_entries=_MAX_OVERSIZE_USERS)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.stale_loads = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0 and self.ttl_seconds > 0
+
+    @property
+    def memory_bytes(self) -> int:
+        return sum(index.memory_bytes for _, index in self._indexes.values())
+
+    def generation(self, user_id: str) -> int:
+        """Read before loading a user's rows; pass it to `put`"""
+        with self._lock:
+            return self._generations.get(user_id, 0)
+
+    def is_oversize(self, user_id: str) -> bool:
+        """Whether the user's last built index was too large to cache"""
+        return self._oversize.get(user_id) is not None
+
+    def _bump(self, user_id: str):
+        self._generations[user_id] = self._generations.get(user_id, 0) + 1
+
+    def get(self, user_id: str) -> Optional[UserVectorIndex]:
+        """Return a user's index and mark it most recently used"""
+        with self._lock:
+            cached = self._indexes.get(user_id)
+            if cached is not None and cached[0] < time.monotonic():
+                del self._indexes[user_id]
+                self.expirations += 1
+                cached = None
+            if cached is None:
+                self.misses += 1
+                return None
+            self._indexes.move_to_end(user_id)
+            self.hits += 1
+            return cached[1]
+
+    def put(self, index: UserVectorIndex, generation: Optional[int] = None) -> bool:
+        """
+        Cache an index, evicting least recently used ones to stay in budget
+
+        With `generation`, the index is refused if the user's entries were
+        written since that generation was read.
+        """
+        if not self.enabled:
+            return False
+        if index.memory_bytes > self.max_bytes:
+            self._oversize.put(index.user_id, len(index))
+            return False
+        with self._lock:
+            if generation is not None and generation != self._generations.get(index.user_id, 0):
+                self.stale_loads += 1
+                return False
+            self._indexes[index.user_id] = (time.monotonic() + self.ttl_seconds, index)
+            self._indexes.move_to_end(index.user_id)
+            self._evict()
+        return True
+
+    def _evict(self):
+        while self._indexes and self.memory_bytes > self.max_bytes:
+            self._indexes.popitem(last=False)
+            self.evictions += 1
+
+    def upsert_entry(self, user_id: str, entry: Dict[str, Any], embedding: Optional[Any] = None):
+        """Write an entry change through to the user's index if it is loaded"""
+        with self._lock:
+            self._bump(user_id)
+            cached = self._indexes.get(user_id)
+            if cached is None:
+                return
+            cached[1].upsert(entry, embedding)
+            self._evict()
+
+    def remove_entry(self, user_id: str, entry_id: str):
+        """Drop a deleted entry from the user's index if it is loaded"""
+        with self._lock:
+            self._bump(user_id)
+            cached = self._indexes.get(user_id)
+            if cached is not None:
+                cached[1].remove(entry_id)
+
+    def invalidate(self, user_id: str):
+        """Forget a user's index so the next search rebuilds it"""
+        with self._lock:
+            self._bump(user_id)
+            self._indexes.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._indexes.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "users": len(self._indexes),
+                "entries": sum(len(index) for _, index in self._indexes.values()),
+                "memory_bytes": self.memory_bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "stale_loads": self.stale_loads,
+                "oversize_users": len(self._oversize),
+            }
+
+
+# Global vector index cache instance
+vector_index_cache = VectorIndexCache(
+    max_bytes=settings.vector_index_memory_mb * 1024 * 1024,
+    ttl_seconds=settings.vector_index_ttl_seconds
+)
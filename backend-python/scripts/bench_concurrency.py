@@ -0,0 +1,123 @@
+"""
+Concurrency benchmark for the Supabase data layer
+
+    python -m scripts.bench_concurrency --requests 400 --concurrency 50 --latency-ms 20
+
+Serves canned `users` rows from a local PostgREST stand-in that sleeps for
+`--latency-ms` per request, then issues the user lookup every handler
+starts with, `--concurrency` at a time, from one event loop:
+
+  before: the sync client's .execute() inside async handlers, which blocks
+          the loop for every round trip
+  after:  UserService on the async client, awaited by the handlers
+
+The user cache is disabled for the run so every "after" lookup is a real
+round trip rather than a cache hit.
+"""
+import argparse
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Awaitable, Callable, List
+
+from supabase import AsyncClient, create_client
+
+from app.core.ttl_cache import TTLCache
+from app.services import supabase_service
+from app.services.supabase_service import UserService
+
+USER_ROW = {
+    "id": "user-1",
+    "clerk_user_id": "clerk-1",
+    "email": "bench@example.com",
+    "name": "Bench",
+    "image_url": None,
+}
+
+
+def start_postgrest(latency: float) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, like PostgREST
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            time.sleep(latency)
+            body = json.dumps([USER_ROW]).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    class Server(ThreadingHTTPServer):
+        daemon_threads = True
+        request_queue_size = 256
+
+    server = Server(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def run(handler: Callable[[], Awaitable[object]], requests: int, concurrency: int) -> float:
+    """Issue `requests` calls with at most `concurrency` in flight; return requests per second"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            await handler()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return requests / (time.perf_counter() - started)
+
+
+async def main_async(args: argparse.Namespace):
+    server = start_postgrest(args.latency_ms / 1000)
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    sync_client = create_client(url, args.key)
+
+    async def blocking_handler():
+        return sync_client.table("users").select("*").eq("clerk_user_id", "clerk-1").execute()
+
+    # Measure the client, not the user cache
+    supabase_service.user_cache = TTLCache(ttl_seconds=0, max_entries=0)
+    user_service = UserService()
+    user_service.supabase = AsyncClient(url, args.key)
+
+    async def async_handler():
+        return await user_service.get_user_by_clerk_id("clerk-1")
+
+    print(
+        f"{args.requests} lookups, concurrency {args.concurrency}, "
+        f"{args.latency_ms:.0f} ms simulated database latency"
+    )
+    results: List[float] = []
+    for name, handler in (("before: sync client", blocking_handler), ("after: async client", async_handler)):
+        await handler()  # open the connection pool
+        rate = await run(handler, args.requests, args.concurrency)
+        results.append(rate)
+        print(f"  {name:<22} {rate:10.1f} req/s")
+    print(f"  speedup                {results[1] / results[0]:10.1f}x")
+
+    await user_service.supabase.postgrest.aclose()
+    server.shutdown()
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Benchmark blocking vs async Supabase calls from async handlers")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--key", default="bench-anon-key")
+    args = parser.parse_args(argv)
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
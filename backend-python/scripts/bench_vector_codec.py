@@ -0,0 +1,70 @@
+"""
+Microbenchmark for decoding pgvector payloads
+
+    python -m scripts.bench_vector_codec --rows 10000 --dims 384
+
+Compares the bulk decoder with the per-row approaches it replaces: parsing
+each PostgREST text value with json.loads, and converting lists of Python
+floats with np.asarray.
+"""
+import argparse
+import json
+import struct
+import time
+from typing import Callable, List
+
+import numpy as np
+
+from app.services.vector_codec import decode_vectors
+
+
+def pgvector_text(vector: np.ndarray) -> str:
+    # pgvector prints the shortest float4 representation, e.g. "[0.0123,-0.5]"
+    return "[" + ",".join(str(value) for value in vector) + "]"
+
+
+def pgvector_binary(vector: np.ndarray) -> bytes:
+    return struct.pack(">hh", len(vector), 0) + vector.astype(">f4").tobytes()
+
+
+def best_of(repeat: int, fn: Callable[[], object]) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Benchmark pgvector payload decoding")
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--dims", type=int, default=384)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    vectors = np.random.default_rng(0).standard_normal((args.rows, args.dims)).astype(np.float32)
+    texts = [pgvector_text(vector) for vector in vectors]
+    binaries = [pgvector_binary(vector) for vector in vectors]
+    lists = vectors.tolist()
+    payload_mb = sum(len(text) for text in texts) / 1e6
+
+    cases = [
+        ("text: json.loads per row", lambda: np.asarray([json.loads(text) for text in texts], dtype=np.float32)),
+        ("text: decode_vectors", lambda: decode_vectors(texts, args.dims)),
+        ("binary: decode_vectors", lambda: decode_vectors(binaries, args.dims)),
+        ("lists: np.asarray", lambda: np.asarray(lists, dtype=np.float32)),
+        ("lists: decode_vectors", lambda: decode_vectors(lists, args.dims)),
+    ]
+
+    matrix, valid = decode_vectors(texts, args.dims)
+    assert valid.all() and np.array_equal(matrix, vectors), "bulk text decode does not round-trip"
+
+    print(f"{args.rows} x {args.dims} vectors, {payload_mb:.1f} MB of text, best of {args.repeat}")
+    for name, fn in cases:
+        elapsed = best_of(args.repeat, fn)
+        print(f"  {name:<30} {elapsed * 1000:9.1f} ms  {args.rows / elapsed:12,.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,33 +1,228 @@
+"""
+Backfill or re-embed journal entries across all users.
+
+Examples:
+    # Embed every entry without an up-to-date embedding, using Supabase
+    python -m scripts.generate_embeddings
+
+    # Re-embed everything straight through Postgres on 4 cores, resumable
+    python -m scripts.generate_embeddings --store postgres --dsn "$DATABASE_URL" \\
+        --reembed --workers 4 --checkpoint backfill.json
+
+The id space is split into --workers contiguous ranges, one process per
+range. Each process walks its range with a keyset cursor, so a checkpoint
+only needs the last id per range. Rerunning with the same --checkpoint and
+--workers resumes where the previous run stopped.
+"""
+import argparse
 import asyncio
-from app.services.embedding_service import EmbeddingService
-from app.core.database import get_db
-from app.models.models import JournalEntry
-
-async def main():
-    """
-    This script generates embeddings for new journal entries
-    and updates them in the database.
-    """
-    db = next(get_db())
-    embedding_service = EmbeddingService()
-
-    # Get all journal entries that don't have an embedding
-    entries_to_update = db.query(JournalEntry).filter(JournalEntry.embedding == None).all()
-
-    if not entries_to_update:
-        print("No new journal entries to generate embeddings for.")
+import json
+import multiprocessing
+import os
+import queue
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+IdRange = Tuple[Optional[str], Optional[str]]
+
+
+def shard_ranges(workers: int) -> List[IdRange]:
+    """Split the (hex uuid) id space into `workers` contiguous [low, high) ranges"""
+    bounds = [f"{(256 * i) // workers:02x}" for i in range(1, workers)]
+    lows: List[Optional[str]] = [None] + bounds
+    highs: List[Optional[str]] = bounds + [None]
+    return list(zip(lows, highs))
+
+
+def load_checkpoint(path: Optional[str], workers: int) -> Dict[str, Any]:
+    """Read a checkpoint, refusing one written with a different shard layout"""
+    if not path or not os.path.exists(path):
+        return {"workers": workers, "shards": {}}
+    with open(path) as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("workers") != workers:
+        raise SystemExit(
+            f"Checkpoint {path} was written with --workers {checkpoint.get('workers')}; "
+            f"rerun with the same value or delete it"
+        )
+    return checkpoint
+
+
+def save_checkpoint(path: Optional[str], checkpoint: Dict[str, Any]):
+    if not path:
         return
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def build_store(args: argparse.Namespace, id_range: IdRange):
+    """Create the entry store for one shard"""
+    from app.services.embedding_pipeline import PostgresEmbeddingStore, SupabaseEmbeddingStore
+
+    missing_only = not args.reembed
+    if args.store == "postgres":
+        dsn = args.dsn or os.environ.get("DATABASE_URL")
+        if not dsn:
+            raise SystemExit("--store postgres needs --dsn or DATABASE_URL")
+        return PostgresEmbeddingStore(dsn, user_id=args.user_id, missing_only=missing_only, id_range=id_range)
+    return SupabaseEmbeddingStore(user_id=args.user_id, missing_only=missing_only, id_range=id_range)
+
+
+def run_shard(
+    args: argparse.Namespace,
+    shard: int,
+    id_range: IdRange,
+    after_id: Optional[str],
+    progress: Any = None,
+    store_factory: Optional[Callable[[argparse.Namespace, IdRange], Any]] = None
+) -> Dict[str, Any]:
+    """Backfill one id range; progress updates are put on `progress` after every page"""
+    from app.services.embedding_pipeline import EmbeddingBackfillPipeline
+
+    store = (store_factory or build_store)(args, id_range)
+    rate = args.rate / args.workers if args.rate else None
+
+    def on_page(stats):
+        update = {"shard": shard, "done": False, **stats.as_dict()}
+        if progress is not None:
+            progress.put(update)
+
+    pipeline = EmbeddingBackfillPipeline(
+        store,
+        page_size=args.page_size,
+        batch_size=args.batch_size,
+        dry_run=args.dry_run,
+        on_page=on_page,
+        rate_limit=rate
+    )
+    stats = asyncio.run(pipeline.run(after_id=after_id, max_entries=args.limit))
+    # A shard stopped by --limit still has entries left; only an empty page means done
+    return {"shard": shard, "done": stats.exhausted, **stats.as_dict()}
+
+
+def record_progress(checkpoint: Dict[str, Any], update: Dict[str, Any], id_range: IdRange):
+    checkpoint["shards"][str(update["shard"])] = {
+        "range": list(id_range),
+        "last_id": update["last_id"],
+        "done": update["done"],
+        "scanned": update["scanned"],
+        "written": update["written"],
+    }
+
+
+class CheckpointWriter:
+    """Progress sink for in-process shards: records and saves after every page"""
+
+    def __init__(self, path: Optional[str], checkpoint: Dict[str, Any], id_range: IdRange):
+        self.path = path
+        self.checkpoint = checkpoint
+        self.id_range = id_range
+
+    def put(self, update: Dict[str, Any]):
+        record_progress(self.checkpoint, update, self.id_range)
+        save_checkpoint(self.path, self.checkpoint)
+        if not update["done"]:
+            print(f"shard {update['shard']}: {update['scanned']} scanned, {update['written']} written "
+                  f"({update['entries_per_second']} entries/s)")
+
+
+def print_report(results: List[Dict[str, Any]], elapsed: float, dry_run: bool):
+    totals = {key: sum(result[key] for result in results) for key in ("scanned", "embedded", "written", "failed")}
+    print("\nBackfill finished" + (" (dry run, nothing written)" if dry_run else ""))
+    for result in sorted(results, key=lambda r: r["shard"]):
+        print(
+            f"  shard {result['shard']}: {result['scanned']} scanned, {result['written']} written, "
+            f"{result['failed']} failed, {result['entries_per_second']} entries/s"
+        )
+    throughput = totals["embedded"] / elapsed if elapsed > 0 else 0.0
+    print(
+        f"  total: {totals['scanned']} scanned, {totals['embedded']} embedded, {totals['written']} written, "
+        f"{totals['failed']} failed in {elapsed:.1f}s ({throughput:.1f} entries/s)"
+    )
+
+
+def run_backfill(
+    args: argparse.Namespace,
+    store_factory: Optional[Callable[[argparse.Namespace, IdRange], Any]] = None
+) -> List[Dict[str, Any]]:
+    """Run every unfinished shard, checkpointing progress; returns per-shard results"""
+    ranges = shard_ranges(args.workers)
+    checkpoint = load_checkpoint(args.checkpoint, args.workers)
+    # A dry run writes nothing, so it must not advance the checkpoint either
+    checkpoint_path = None if args.dry_run else args.checkpoint
+    started = time.monotonic()
+
+    pending = []
+    results = []
+    for shard, id_range in enumerate(ranges):
+        state = checkpoint["shards"].get(str(shard), {})
+        if state.get("done"):
+            print(f"Shard {shard} already complete, skipping")
+            continue
+        pending.append((shard, id_range, state.get("last_id")))
+
+    if args.workers == 1 or len(pending) <= 1:
+        # In-process: simpler to debug and lets tests inject a store
+        for shard, id_range, after_id in pending:
+            progress = CheckpointWriter(checkpoint_path, checkpoint, id_range)
+            result = run_shard(args, shard, id_range, after_id, progress, store_factory)
+            progress.put(result)
+            results.append(result)
+    else:
+        with multiprocessing.Manager() as manager:
+            progress = manager.Queue()
+            with ProcessPoolExecutor(max_workers=len(pending)) as pool:
+                futures = {
+                    pool.submit(run_shard, args, shard, id_range, after_id, progress): (shard, id_range)
+                    for shard, id_range, after_id in pending
+                }
+                while any(not future.done() for future in futures) or not progress.empty():
+                    try:
+                        update = progress.get(timeout=0.5)
+                    except queue.Empty:
+                        continue
+                    record_progress(checkpoint, update, ranges[update["shard"]])
+                    save_checkpoint(checkpoint_path, checkpoint)
+                    print(
+                        f"shard {update['shard']}: {update['scanned']} scanned, {update['written']} written "
+                        f"({update['entries_per_second']} entries/s)"
+                    )
+                for future, (shard, id_range) in futures.items():
+                    result = future.result()
+                    record_progress(checkpoint, result, id_range)
+                    results.append(result)
+                save_checkpoint(checkpoint_path, checkpoint)
+
+    print_report(results, time.monotonic() - started, args.dry_run)
+    return results
+
 
-    print(f"Found {len(entries_to_update)} new journal entries to process.")
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Backfill or re-embed journal entry embeddings")
+    parser.add_argument("--store", choices=["supabase", "postgres"], default="supabase",
+                        help="where entries live (default: supabase)")
+    parser.add_argument("--dsn", help="Postgres connection string for --store postgres (default: $DATABASE_URL)")
+    parser.add_argument("--workers", type=int, default=1, help="processes, each owning one id range")
+    parser.add_argument("--checkpoint", help="JSON file recording progress; rerun with it to resume")
+    parser.add_argument("--dry-run", action="store_true", help="scan and count entries without encoding or writing")
+    parser.add_argument("--rate", type=float, help="cap on entries embedded per second across all workers")
+    parser.add_argument("--reembed", action="store_true", help="re-embed every entry, not only missing or outdated ones")
+    parser.add_argument("--user-id", help="only process this user's entries")
+    parser.add_argument("--page-size", type=int, default=500, help="entries fetched per round trip")
+    parser.add_argument("--batch-size", type=int, default=64, help="texts per model forward pass")
+    parser.add_argument("--limit", type=int, help="stop each worker after this many entries")
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    return args
 
-    texts = [entry.content for entry in entries_to_update]
-    embeddings = await embedding_service.generate_embeddings_batch(texts)
 
-    for entry, embedding in zip(entries_to_update, embeddings):
-        entry.embedding = embedding
+def main(argv: Optional[List[str]] = None):
+    run_backfill(parse_args(argv))
 
-    db.commit()
-    print(f"Successfully generated and saved embeddings for {len(entries_to_update)} entries.")
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    main()
@@ -0,0 +1,11 @@
+"""
+Shared pytest setup
+"""
+import os
+
+# Settings are read at import time; provide placeholders so tests that never
+# reach Supabase or Clerk can import the app without a .env file.
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_ANON_KEY", "test-anon-key")
+os.environ.setdefault("CLERK_SECRET_KEY", "test-clerk-secret")
+os.environ.setdefault("CLERK_PUBLISHABLE_KEY", "test-clerk-publishable")
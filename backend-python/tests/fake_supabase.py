@@ -0,0 +1,73 @@
+"""
+Minimal stand-in for the Supabase client used by service tests
+"""
+from types import SimpleNamespace
+
+
+class FakeQuery:
+    """Records the builder calls made on one table and returns canned rows"""
+
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+        self.calls = []
+
+    def __getattr__(self, name):
+        def record(*args, **kwargs):
+            self.calls.append((name, args))
+            return self
+        return record
+
+    @property
+    def not_(self):
+        self.calls.append(("not_", ()))
+        return self
+
+    def execute(self):
+        self.client.queries.append(self)
+        return SimpleNamespace(data=self.client.respond(self))
+
+    def selected(self):
+        return next((args[0] for name, args in self.calls if name == "select"), None)
+
+
+class AsyncFakeQuery(FakeQuery):
+    """FakeQuery whose execute() is awaited, like the async client's"""
+
+    async def execute(self):
+        return FakeQuery.execute(self)
+
+
+class FakeSupabase:
+    """
+    Client whose responses come from `handler(query)`
+
+    Every executed query is kept in `queries` so tests can assert on the
+    columns, filters and number of round trips.
+    """
+
+    def __init__(self, handler=None, rpc_handler=None):
+        self.handler = handler or (lambda query: [])
+        self.rpc_handler = rpc_handler
+        self.queries = []
+        self.rpcs = []
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    def rpc(self, name, params):
+        self.rpcs.append((name, params))
+        if self.rpc_handler is None:
+            raise RuntimeError(f"function {name} does not exist")
+        data = self.rpc_handler(name, params)
+        return SimpleNamespace(execute=lambda: SimpleNamespace(data=data))
+
+    def respond(self, query):
+        return self.handler(query)
+
+
+class AsyncFakeSupabase(FakeSupabase):
+    """FakeSupabase for services on the async client"""
+
+    def table(self, name):
+        return AsyncFakeQuery(self, name)
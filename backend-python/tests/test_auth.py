@@ -0,0 +1,161 @@
+"""
+Tests for Clerk token verification caches, against a local JWKS server
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jwt.algorithms import RSAAlgorithm
+
+from app.middleware.auth import ClerkAuth, issuer_from_publishable_key
+
+
+class JWKSServer:
+    """Serves /.well-known/jwks.json for the current set of keys"""
+
+    def __init__(self):
+        self.keys = {}
+        self.requests = 0
+        jwks_server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                jwks_server.requests += 1
+                body = json.dumps({"keys": [
+                    {**json.loads(RSAAlgorithm.to_jwk(key.public_key())), "kid": kid, "alg": "RS256", "use": "sig"}
+                    for kid, key in jwks_server.keys.items()
+                ]}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.issuer = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def rotate(self, kid):
+        self.keys[kid] = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+    def token(self, kid, sub="user_1", lifetime=60):
+        claims = {"iss": self.issuer, "sub": sub, "exp": int(time.time()) + lifetime}
+        return jwt.encode(claims, self.keys[kid], algorithm="RS256", headers={"kid": kid})
+
+
+@pytest.fixture
+def jwks():
+    server = JWKSServer()
+    server.rotate("key-1")
+    yield server
+    server.server.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_signing_keys_and_claims_are_cached(jwks, monkeypatch):
+    """One JWKS fetch serves many tokens, and a repeated token skips verification"""
+    auth = ClerkAuth(issuers=[jwks.issuer])
+
+    first = await auth.verify_claims(jwks.token("key-1", sub="user_1"))
+    second = await auth.verify_claims(jwks.token("key-1", sub="user_2"))
+    assert (first["sub"], second["sub"]) == ("user_1", "user_2")
+    assert jwks.requests == 1
+
+    token = jwks.token("key-1", sub="user_3")
+    await auth.verify_claims(token)
+
+    def no_decode(*args, **kwargs):
+        raise AssertionError("cached claims must not be re-verified")
+    monkeypatch.setattr("app.middleware.auth.jwt.decode", no_decode)
+    assert (await auth.verify_claims(token))["sub"] == "user_3"
+
+
+@pytest.mark.asyncio
+async def test_unknown_kid_refetches_after_rotation(jwks, monkeypatch):
+    """A new kid refetches the JWKS once; unknown kids are not refetched again right away"""
+    monkeypatch.setattr("app.middleware.auth.JWKS_REFETCH_INTERVAL_SECONDS", 0.0)
+    auth = ClerkAuth(issuers=[jwks.issuer])
+    await auth.verify_claims(jwks.token("key-1"))
+
+    jwks.rotate("key-2")
+    assert (await auth.verify_claims(jwks.token("key-2")))["sub"] == "user_1"
+    assert jwks.requests == 2
+
+    monkeypatch.setattr("app.middleware.auth.JWKS_REFETCH_INTERVAL_SECONDS", 60.0)
+    forged = jwt.encode(
+        {"iss": jwks.issuer, "sub": "x", "exp": int(time.time()) + 60},
+        rsa.generate_private_key(public_exponent=65537, key_size=2048),
+        algorithm="RS256",
+        headers={"kid": "key-unknown"},
+    )
+    with pytest.raises(jwt.InvalidTokenError):
+        await auth.verify_claims(forged)
+    assert jwks.requests == 2
+
+
+@pytest.mark.asyncio
+async def test_expired_token_is_rejected(jwks):
+    auth = ClerkAuth(issuers=[jwks.issuer])
+    with pytest.raises(jwt.ExpiredSignatureError):
+        await auth.verify_claims(jwks.token("key-1", lifetime=-10))
+
+
+@pytest.mark.asyncio
+async def test_untrusted_issuer_is_rejected_without_a_fetch(jwks):
+    """Keys are only fetched for configured issuers, whatever the token claims"""
+    auth = ClerkAuth(issuers=["https://trusted.clerk.accounts.dev"])
+    with pytest.raises(jwt.InvalidTokenError):
+        await auth.verify_claims(jwks.token("key-1"))
+    assert jwks.requests == 0
+
+
+def test_issuer_is_derived_from_the_publishable_key():
+    assert issuer_from_publishable_key("pk_test_Y2xlcmsuZXhhbXBsZS5kZXYk") == "https://clerk.example.dev"
+    assert issuer_from_publishable_key("not-a-key") is None
+
+
+@pytest.mark.asyncio
+async def test_profile_is_fetched_only_to_create_a_user(monkeypatch):
+    """Known users never hit the Clerk API; failed fetches are cached briefly"""
+    from app.core.ttl_cache import TTLCache
+    from app.middleware import auth
+    from app.services.supabase_service import UserService
+    from tests.fake_supabase import AsyncFakeSupabase
+
+    monkeypatch.setattr("app.services.supabase_service.user_cache", TTLCache(ttl_seconds=60, max_entries=10))
+    clerk = ClerkAuth()
+    monkeypatch.setattr(auth, "clerk_auth", clerk)
+    requested = []
+
+    async def request_profile(user_id):
+        requested.append(user_id)
+        return None
+    monkeypatch.setattr(clerk, "_request_user_profile", request_profile)
+
+    rows = {"clerk_known": {"id": "u1", "clerk_user_id": "clerk_known"}}
+
+    def respond(query):
+        clerk_id = next((args[1] for name, args in query.calls if name == "eq"), None)
+        if query.selected():
+            return [rows[clerk_id]] if clerk_id in rows else []
+        inserted = next(args[0] for name, args in query.calls if name == "insert")
+        return [inserted]
+
+    monkeypatch.setattr(UserService, "__init__", lambda self: setattr(self, "supabase", AsyncFakeSupabase(respond)))
+
+    assert (await auth.get_or_create_user_from_token({"user_id": "clerk_known"}))["id"] == "u1"
+    assert requested == []
+
+    created = await auth.get_or_create_user_from_token({"user_id": "clerk_new_user"})
+    assert created["email"].endswith("@placeholder.com")
+    assert await clerk.fetch_user_profile("clerk_new_user") == {
+        "user_id": "clerk_new_user", "email": "user_new_user@placeholder.com"
+    }
+    assert requested == ["clerk_new_user"]
@@ -0,0 +1,61 @@
+"""
+Tests for embedding request micro-batching
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from app.services.embedding_batcher import EmbeddingBatcher
+
+
+class FakeEncoder:
+    """Records the batches it was asked to encode"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        return np.array([[len(text), 1.0] for text in texts], dtype=np.float32)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_share_one_encode():
+    """Requests arriving within the wait window are encoded together"""
+    encoder = FakeEncoder()
+    batcher = EmbeddingBatcher(encoder, ThreadPoolExecutor(max_workers=1), max_batch_size=16, max_wait_ms=20)
+
+    results = await asyncio.gather(*(batcher.submit("x" * n) for n in range(1, 6)))
+
+    assert len(encoder.calls) == 1
+    assert [float(result[0]) for result in results] == [1, 2, 3, 4, 5]
+
+
+@pytest.mark.asyncio
+async def test_full_batch_flushes_without_waiting_and_dedupes():
+    """A full batch is encoded immediately and duplicate texts are encoded once"""
+    encoder = FakeEncoder()
+    batcher = EmbeddingBatcher(encoder, ThreadPoolExecutor(max_workers=1), max_batch_size=3, max_wait_ms=10_000)
+
+    results = await asyncio.wait_for(
+        asyncio.gather(batcher.submit("a"), batcher.submit("bb"), batcher.submit("a")),
+        timeout=1
+    )
+
+    assert encoder.calls == [["a", "bb"]]
+    assert float(results[2][0]) == 1
+
+
+@pytest.mark.asyncio
+async def test_encode_errors_reach_every_caller():
+    """A failing encode rejects all futures in the batch"""
+    def failing_encoder(texts):
+        raise RuntimeError("model unavailable")
+
+    batcher = EmbeddingBatcher(failing_encoder, ThreadPoolExecutor(max_workers=1), max_batch_size=8, max_wait_ms=1)
+
+    results = await asyncio.gather(batcher.submit("a"), batcher.submit("b"), return_exceptions=True)
+
+    assert all(isinstance(result, RuntimeError) for result in results)
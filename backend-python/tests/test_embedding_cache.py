@@ -0,0 +1,38 @@
+"""
+Tests for the content-hash embedding cache
+"""
+import numpy as np
+
+from app.services.embedding_cache import EmbeddingCache
+
+
+def test_memory_tier_is_lru_and_counts_hits():
+    """Whitespace variants share an entry and the oldest entry is evicted first"""
+    cache = EmbeddingCache("model", max_entries=2)
+    cache.put("hello  world", [1.0, 2.0])
+    cache.put("second", [3.0, 4.0])
+
+    assert np.array_equal(cache.get(" hello world "), [1.0, 2.0])
+    cache.put("third", [5.0, 6.0])
+
+    assert cache.get("second") is None
+    assert cache.get("third") is not None
+    stats = cache.stats()
+    assert stats["hits"] == 2 and stats["misses"] == 1
+
+
+def test_keys_depend_on_model_name():
+    """Embeddings from one model are never served for another"""
+    assert EmbeddingCache("a").key("text") != EmbeddingCache("b").key("text")
+
+
+def test_disk_tier_survives_a_new_instance(tmp_path):
+    """Embeddings written to disk are found by a fresh cache"""
+    EmbeddingCache("model", cache_dir=str(tmp_path)).put("persisted", [0.5, 0.25])
+
+    cache = EmbeddingCache("model", cache_dir=str(tmp_path))
+    embedding = cache.get("persisted")
+
+    assert embedding.dtype == np.float32
+    assert np.array_equal(embedding, [0.5, 0.25])
+    assert cache.stats()["disk_hits"] == 1
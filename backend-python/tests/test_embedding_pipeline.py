@@ -0,0 +1,101 @@
+"""
+Tests for the bulk embedding backfill pipeline
+"""
+import pytest
+
+from app.services.embedding_pipeline import EmbeddingBackfillPipeline, SupabaseEmbeddingStore
+from tests.fake_supabase import FakeSupabase
+
+
+class ListStore:
+    """Keyset-paged store over a list of entry dicts"""
+
+    def __init__(self, entries):
+        self.entries = sorted(entries, key=lambda entry: entry["id"])
+        self.writes = []
+
+    def fetch_page(self, after_id, limit):
+        rows = [entry for entry in self.entries if after_id is None or entry["id"] > after_id]
+        return rows[:limit]
+
+    def write_embeddings(self, rows, embeddings):
+        self.writes.append({row["id"]: embedding for row, embedding in zip(rows, embeddings)})
+        return len(rows)
+
+
+class CountingEmbedder:
+    def __init__(self):
+        self.batches = []
+
+    async def __call__(self, texts):
+        self.batches.append(list(texts))
+        return [[float(len(text))] for text in texts]
+
+
+def make_entries(count):
+    return [
+        {"id": f"{i:04d}", "user_id": "user", "title": "t" * (count - i), "content": "body"}
+        for i in range(count)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_each_entry_is_encoded_once_and_written_per_page():
+    """Pages are written in bulk and no text is encoded twice"""
+    store = ListStore(make_entries(7))
+    embedder = CountingEmbedder()
+    pipeline = EmbeddingBackfillPipeline(store, embed_batch=embedder, page_size=3, batch_size=2, on_page=lambda stats: None)
+
+    stats = await pipeline.run()
+
+    assert sum(len(batch) for batch in embedder.batches) == 7
+    assert len(store.writes) == 3
+    assert stats.scanned == stats.embedded == stats.written == 7
+    assert stats.pages == 3 and stats.last_id == "0006"
+
+
+@pytest.mark.asyncio
+async def test_batches_are_length_sorted():
+    """Texts within a page are batched shortest first"""
+    store = ListStore(make_entries(4))
+    embedder = CountingEmbedder()
+    pipeline = EmbeddingBackfillPipeline(store, embed_batch=embedder, page_size=4, batch_size=2, on_page=lambda stats: None)
+
+    await pipeline.run()
+
+    lengths = [len(text) for batch in embedder.batches for text in batch]
+    assert lengths == sorted(lengths)
+
+
+@pytest.mark.asyncio
+async def test_resume_and_dry_run():
+    """A cursor skips processed entries and dry runs never encode or write"""
+    store = ListStore(make_entries(5))
+    embedder = CountingEmbedder()
+    pipeline = EmbeddingBackfillPipeline(store, embed_batch=embedder, dry_run=True, on_page=lambda stats: None)
+
+    stats = await pipeline.run(after_id="0002")
+
+    assert stats.scanned == 2
+    assert embedder.batches == [] and store.writes == []
+
+
+def test_bulk_write_skips_entries_edited_since_the_page_was_read():
+    """Each row is written only if its embedding_version is still the one that was read"""
+    def respond(query):
+        # "b" was edited after the page was read, so its version no longer matches
+        return [] if ("eq", ("id", "b")) in query.calls else [{"id": "a"}]
+
+    store = SupabaseEmbeddingStore()
+    store.supabase = FakeSupabase(respond)
+    rows = [
+        {"id": "a", "user_id": "user", "embedding_version": None},
+        {"id": "b", "user_id": "user", "embedding_version": "v1"},
+    ]
+
+    assert store.write_embeddings(rows, [[1.0], [2.0]]) == 1
+    [(_, params)] = store.supabase.rpcs
+    assert [item["version"] for item in params["payload"]] == [None, "v1"]
+    first, second = store.supabase.queries
+    assert ("is_", ("embedding_version", "null")) in first.calls
+    assert ("eq", ("embedding_version", "v1")) in second.calls
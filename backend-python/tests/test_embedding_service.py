@@ -0,0 +1,82 @@
+"""
+Tests for embedding similarity helpers
+"""
+import numpy as np
+import pytest
+from app.services.embedding_service import EmbeddingService
+
+service = EmbeddingService()
+
+
+def test_compute_similarities_matches_pairwise():
+    """Batch scores agree with the single-pair cosine similarity"""
+    rng = np.random.default_rng(0)
+    query = rng.normal(size=384).astype(np.float32)
+    matrix = rng.normal(size=(50, 384)).astype(np.float32)
+
+    scores = service.compute_similarities(query, matrix)
+
+    expected = [service.compute_similarity(query.tolist(), row.tolist()) for row in matrix]
+    assert scores.dtype == np.float32
+    assert np.allclose(scores, expected, atol=1e-5)
+
+
+def test_top_k_similar_orders_and_thresholds():
+    """Top-k returns best matches first and drops scores under the threshold"""
+    matrix = np.array([
+        [1.0, 0.0],
+        [0.0, 1.0],
+        [0.6, 0.8],
+        [-1.0, 0.0],
+    ], dtype=np.float32)
+
+    matches = service.top_k_similar([1.0, 0.0], matrix, k=3, similarity_threshold=0.5)
+
+    assert [index for index, _ in matches] == [0, 2]
+    assert matches[0][1] == 1.0
+
+
+def test_top_k_similar_handles_zero_vectors_and_empty_input():
+    """Zero rows score zero and empty matrices return no matches"""
+    matrix = service.normalize_embeddings([[0.0, 0.0], [3.0, 4.0]])
+
+    matches = service.top_k_similar([3.0, 4.0], matrix, k=5, normalized=True)
+
+    assert [index for index, _ in matches] == [1, 0]
+    assert matches[1][1] == 0.0
+    assert service.top_k_similar([1.0, 0.0], np.zeros((0, 2)), k=5) == []
+
+
+@pytest.mark.asyncio
+async def test_warm_up_precomputes_fixed_texts():
+    """Warm-up encodes once up front; precomputed texts then skip the model"""
+    warm = EmbeddingService()
+    calls = []
+
+    def encode(texts):
+        calls.append(list(texts))
+        return np.ones((len(texts), 2), dtype=np.float32)
+
+    warm._encode_batch = encode
+    count = await warm.warm_up(["Find entries about work stress", "Happy", "Happy", " "])
+
+    assert count == 2
+    assert calls == [["warm up"], ["Find entries about work stress", "Happy"]]
+    assert await warm.generate_embedding("Find  entries about work stress") == [1.0, 1.0]
+    assert len(calls) == 2
+    assert warm.precomputed_stats() == {"entries": 2, "hits": 1}
+
+
+def test_check_backend_reports_missing_packages(monkeypatch):
+    """Startup fails with an install hint when the configured backend cannot be imported"""
+    backend = EmbeddingService()
+    backend.backend = "onnx"
+    monkeypatch.setattr(
+        "app.services.embedding_service.importlib.util.find_spec",
+        lambda name: None if name == "onnxruntime" else object()
+    )
+    with pytest.raises(RuntimeError, match="onnxruntime.*--extras onnx"):
+        backend.check_backend()
+
+    backend.backend = "sentence-transformers"
+    backend.check_backend()
@@ -0,0 +1,129 @@
+"""
+Tests for the background embedding worker
+"""
+import asyncio
+
+import pytest
+
+from app.services.embedding_worker import EmbeddingJob, EmbeddingWorker, embedding_version
+from tests.fake_supabase import FakeSupabase
+
+
+class RecordingWorker(EmbeddingWorker):
+    """Worker that records writes instead of talking to Supabase"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.written = []
+        self.failed_jobs = []
+
+    def _write_embedding(self, job, embedding):
+        self.written.append((job.entry_id, job.version, embedding))
+
+    def _mark_failed(self, job):
+        self.failed_jobs.append(job.entry_id)
+
+
+class FlakyEmbeddingService:
+    """Fails a set number of times before returning a vector"""
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.calls = 0
+
+    async def generate_embedding(self, text):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise RuntimeError("model busy")
+        return [float(len(text)), 1.0]
+
+
+def make_job(entry_id="entry-1"):
+    return EmbeddingJob(entry_id=entry_id, user_id="user", text="hello", version="2024-01-01T00:00:00")
+
+
+@pytest.fixture
+def flaky_service(monkeypatch):
+    def install(failures):
+        service = FlakyEmbeddingService(failures)
+        monkeypatch.setattr("app.services.embedding_service.embedding_service", service)
+        return service
+    return install
+
+
+@pytest.mark.asyncio
+async def test_jobs_are_retried_then_written(flaky_service):
+    """Transient failures are retried with backoff before the write"""
+    service = flaky_service(failures=2)
+    worker = RecordingWorker(max_retries=3, retry_base_delay=0.001)
+    await worker.start()
+
+    assert worker.enqueue(make_job())
+    await asyncio.wait_for(worker._queue.join(), timeout=1)
+    await worker.stop()
+
+    assert service.calls == 3
+    assert worker.written == [("entry-1", "2024-01-01T00:00:00", [5.0, 1.0])]
+    assert worker.stats()["retried"] == 2
+
+
+@pytest.mark.asyncio
+async def test_exhausted_retries_mark_entry_failed(flaky_service):
+    """Entries are marked failed once retries run out"""
+    flaky_service(failures=10)
+    worker = RecordingWorker(max_retries=1, retry_base_delay=0.001)
+    await worker.start()
+
+    worker.enqueue(make_job())
+    await asyncio.wait_for(worker._queue.join(), timeout=1)
+    await worker.stop()
+
+    assert worker.written == []
+    assert worker.failed_jobs == ["entry-1"]
+
+
+@pytest.mark.asyncio
+async def test_queue_is_bounded():
+    """A full queue rejects jobs instead of blocking the request"""
+    worker = RecordingWorker(max_queue_size=1, concurrency=1)
+    assert not worker.enqueue(make_job())  # not started yet
+
+    await worker.start()
+    for task in worker._tasks:
+        task.cancel()  # keep jobs in the queue
+    accepted = [worker.enqueue(make_job(f"entry-{i}")) for i in range(3)]
+    await worker.stop()
+
+    assert accepted == [True, False, False]
+    assert worker.stats()["dropped"] == 3
+
+
+@pytest.mark.asyncio
+async def test_write_is_guarded_on_the_embedded_text(flaky_service):
+    """The UPDATE is keyed on the text hash; a superseded job writes nothing"""
+    flaky_service(failures=0)
+    current = {"version": embedding_version("hello")}
+
+    def respond(query):
+        filters = dict(args for name, args in query.calls if name == "eq")
+        if filters["embedding_version"] != current["version"]:
+            return []
+        return [{"id": filters["id"], "user_id": filters["user_id"]}]
+
+    worker = EmbeddingWorker(retry_base_delay=0.001)
+    worker.supabase = FakeSupabase(respond)
+    await worker.start()
+
+    job = make_job()
+    job.version = embedding_version(job.text)
+    worker.enqueue(job)
+    await asyncio.wait_for(worker._queue.join(), timeout=1)
+
+    # The title or content changed after this job was queued
+    current["version"] = embedding_version("hello again")
+    worker.enqueue(EmbeddingJob(entry_id="entry-1", user_id="user", text="hello", version=job.version))
+    await asyncio.wait_for(worker._queue.join(), timeout=1)
+    await worker.stop()
+
+    assert worker.stats()["processed"] == 2
+    assert worker.stats()["superseded"] == 1
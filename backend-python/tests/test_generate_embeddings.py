@@ -0,0 +1,121 @@
+"""
+Tests for the offline embedding backfill CLI
+"""
+import json
+import uuid
+
+import pytest
+
+from app.services.embedding_pipeline import InMemoryEmbeddingStore
+from scripts.generate_embeddings import parse_args, run_backfill, shard_ranges
+
+
+@pytest.fixture
+def fake_embeddings(monkeypatch):
+    calls = []
+
+    async def generate_embeddings_batch(texts):
+        calls.append(list(texts))
+        return [[float(len(text)), 1.0] for text in texts]
+
+    monkeypatch.setattr(
+        "app.services.embedding_service.embedding_service.generate_embeddings_batch",
+        generate_embeddings_batch
+    )
+    return calls
+
+
+def make_entries(count):
+    return [
+        {"id": str(uuid.UUID(int=i * 7919 * 2 ** 100 % 2 ** 128)), "user_id": "user",
+         "title": f"entry {i}", "content": "x" * i, "content_embedding": None}
+        for i in range(count)
+    ]
+
+
+def test_shard_ranges_cover_the_id_space_without_overlap():
+    """Every id falls in exactly one shard"""
+    ranges = shard_ranges(3)
+    ids = [entry["id"] for entry in make_entries(200)]
+
+    for entry_id in ids:
+        owners = [
+            (low, high) for low, high in ranges
+            if (low is None or entry_id >= low) and (high is None or entry_id < high)
+        ]
+        assert len(owners) == 1
+
+
+def test_backfill_embeds_every_shard_and_writes_a_checkpoint(tmp_path, fake_embeddings):
+    """All entries are embedded once and every shard is checkpointed as done"""
+    store = InMemoryEmbeddingStore(make_entries(50))
+    checkpoint = tmp_path / "checkpoint.json"
+    args = parse_args(["--workers", "1", "--checkpoint", str(checkpoint), "--page-size", "7"])
+
+    results = run_backfill(args, store_factory=lambda args, id_range: store)
+
+    assert sum(result["written"] for result in results) == 50
+    assert all(entry["content_embedding"] for entry in store.entries.values())
+    assert json.loads(checkpoint.read_text())["shards"]["0"]["done"] is True
+
+
+def test_backfill_resumes_from_checkpoint(tmp_path, fake_embeddings):
+    """A rerun skips finished shards and continues after the recorded id"""
+    entries = make_entries(20)
+    last_id = sorted(entry["id"] for entry in entries)[9]
+    checkpoint = tmp_path / "checkpoint.json"
+    checkpoint.write_text(json.dumps({
+        "workers": 1,
+        "shards": {"0": {"range": [None, None], "last_id": last_id, "done": False}},
+    }))
+    store = InMemoryEmbeddingStore(entries, missing_only=False)
+    args = parse_args(["--checkpoint", str(checkpoint)])
+
+    results = run_backfill(args, store_factory=lambda args, id_range: store)
+
+    assert results[0]["scanned"] == 10
+    assert run_backfill(args, store_factory=lambda args, id_range: store) == []
+
+
+def test_dry_run_counts_without_encoding(fake_embeddings):
+    """--dry-run scans entries but never calls the model or writes"""
+    store = InMemoryEmbeddingStore(make_entries(12))
+    args = parse_args(["--dry-run"])
+
+    results = run_backfill(args, store_factory=lambda args, id_range: store)
+
+    assert results[0]["scanned"] == 12
+    assert fake_embeddings == []
+    assert not any(entry["content_embedding"] for entry in store.entries.values())
+
+
+def test_limit_and_dry_run_do_not_complete_a_shard(tmp_path, fake_embeddings):
+    """A shard stopped by --limit resumes on the next run; --dry-run leaves the checkpoint alone"""
+    store = InMemoryEmbeddingStore(make_entries(50))
+    checkpoint = tmp_path / "checkpoint.json"
+
+    run_backfill(parse_args(["--checkpoint", str(checkpoint), "--dry-run"]), lambda args, id_range: store)
+    assert not checkpoint.exists()
+
+    limited = parse_args(["--checkpoint", str(checkpoint), "--limit", "10"])
+    run_backfill(limited, store_factory=lambda args, id_range: store)
+    assert json.loads(checkpoint.read_text())["shards"]["0"]["done"] is False
+
+    results = run_backfill(parse_args(["--checkpoint", str(checkpoint)]), lambda args, id_range: store)
+    assert results[0]["written"] == 40
+    assert all(entry["content_embedding"] for entry in store.entries.values())
+
+
+def test_backfill_picks_up_outdated_and_failed_embeddings(fake_embeddings):
+    """Entries whose text changed or whose job failed are re-embedded, even with an old vector"""
+    entries = make_entries(3)
+    entries[0].update(content_embedding=[9.0, 9.0], embedding_status="done")
+    entries[1].update(content_embedding=[9.0, 9.0], embedding_status="pending")
+    entries[2].update(embedding_status="failed")
+    store = InMemoryEmbeddingStore(entries)
+
+    results = run_backfill(parse_args([]), store_factory=lambda args, id_range: store)
+
+    assert sum(result["written"] for result in results) == 2
+    assert store.entries[entries[0]["id"]]["content_embedding"] == [9.0, 9.0]
+    assert store.entries[entries[1]["id"]]["content_embedding"] != [9.0, 9.0]
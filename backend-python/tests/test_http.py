@@ -0,0 +1,55 @@
+"""
+Tests for the shared outbound HTTP client registry
+"""
+import httpx
+import pytest
+
+from app.core.http import HTTPClientRegistry, http_clients
+from app.services.external_api_service import ExternalAPIService
+
+
+@pytest.mark.asyncio
+async def test_clients_are_pooled_per_origin():
+    registry = HTTPClientRegistry()
+    await registry.reset(transport=httpx.MockTransport(lambda request: httpx.Response(200, json={})))
+
+    clerk = registry.get("https://api.clerk.com/v1/users/1")
+    assert registry.get("https://api.clerk.com/v1/jwks") is clerk
+    assert registry.get("https://api.adviceslip.com/advice") is not clerk
+
+    await clerk.get("https://api.clerk.com/v1/jwks")
+    await clerk.get("https://api.clerk.com/v1/jwks")
+    assert registry.stats()["hosts"]["https://api.clerk.com"]["requests"] == 2
+
+    await registry.aclose()
+    assert clerk.is_closed
+    assert registry.stats()["open_clients"] == 0
+
+
+@pytest.mark.asyncio
+async def test_new_hosts_are_refused_once_the_registry_is_full():
+    registry = HTTPClientRegistry(max_hosts=1)
+    clerk = registry.get("https://api.clerk.com/v1/jwks")
+
+    with pytest.raises(ValueError):
+        registry.get("https://attacker.example/.well-known/jwks.json")
+    assert registry.get("https://api.clerk.com/v1/users/1") is clerk
+    assert list(registry.stats()["hosts"]) == ["https://api.clerk.com"]
+    await registry.aclose()
+
+
+@pytest.mark.asyncio
+async def test_services_use_the_shared_clients():
+    """A MockTransport injected into the global registry reaches the services"""
+    seen = []
+
+    def handler(request):
+        seen.append(str(request.url))
+        return httpx.Response(200, json={"slip": {"advice": "Drink water."}})
+
+    await http_clients.reset(transport=httpx.MockTransport(handler))
+    try:
+        assert await ExternalAPIService.get_daily_prompt() == "Drink water."
+        assert seen == ["https://api.adviceslip.com/advice"]
+    finally:
+        await http_clients.reset()
@@ -0,0 +1,61 @@
+"""
+Cold-start import benchmarks for the API
+"""
+import os
+import subprocess
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Cumulative import time budget for the app package; override on slow runners
+IMPORT_TIME_BUDGET_MS = float(os.environ.get("IMPORT_TIME_BUDGET_MS", "3000"))
+HEAVY_MODULES = ["torch", "sentence_transformers", "onnxruntime", "transformers"]
+
+
+def run_python(*args):
+    return subprocess.run(
+        [sys.executable, *args],
+        cwd=BACKEND_DIR,
+        env=os.environ.copy(),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def parse_importtime(stderr):
+    """Map module name -> cumulative microseconds from `python -X importtime` output"""
+    timings = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        timings[name.strip()] = int(cumulative)
+    return timings
+
+
+def test_app_import_defers_model_libraries():
+    """Importing the app must not pull in torch or other inference runtimes"""
+    result = run_python(
+        "-c",
+        "import sys, app.main; "
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))",
+    )
+
+    assert result.stdout.strip() == ""
+
+
+def test_app_import_time_within_budget():
+    """Cold import of the app stays under IMPORT_TIME_BUDGET_MS"""
+    # Best of three to smooth out filesystem cache noise
+    samples = []
+    for _ in range(3):
+        timings = parse_importtime(run_python("-X", "importtime", "-c", "import app.main").stderr)
+        if "app" not in timings:
+            pytest.fail("importtime output did not include the app package")
+        samples.append(timings["app"] / 1000)
+
+    assert min(samples) < IMPORT_TIME_BUDGET_MS, (
+        f"importing app took {min(samples):.0f} ms (budget {IMPORT_TIME_BUDGET_MS:.0f} ms)"
+    )
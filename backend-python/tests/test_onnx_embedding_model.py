@@ -0,0 +1,57 @@
+"""
+Parity tests for the ONNX Runtime embedding backend
+"""
+import numpy as np
+import pytest
+
+pytest.importorskip("onnxruntime")
+pytest.importorskip("tokenizers")
+sentence_transformers = pytest.importorskip("sentence_transformers")
+
+from app.services.onnx_embedding_model import OnnxEmbeddingModel
+
+SENTENCES = [
+    "Today I finally finished the project I have been working on for months.",
+    "I felt anxious before the meeting but it went well.",
+    "Quiet evening, tea and a book.",
+    "Work stress is getting to me and I can't sleep.",
+]
+
+
+@pytest.fixture(scope="module")
+def torch_embeddings():
+    try:
+        model = sentence_transformers.SentenceTransformer("all-MiniLM-L6-v2", device="cpu")
+    except Exception as e:
+        pytest.skip(f"model weights unavailable: {e}")
+    return model.encode(SENTENCES, normalize_embeddings=True)
+
+
+def load_onnx_model(quantize):
+    try:
+        return OnnxEmbeddingModel(quantize=quantize)
+    except Exception as e:
+        pytest.skip(f"ONNX export unavailable: {e}")
+
+
+def cosine_agreement(left, right):
+    left = left / np.linalg.norm(left, axis=1, keepdims=True)
+    right = right / np.linalg.norm(right, axis=1, keepdims=True)
+    return (left * right).sum(axis=1)
+
+
+def test_fp32_matches_torch(torch_embeddings):
+    """The fp32 ONNX export reproduces the PyTorch vectors"""
+    embeddings = load_onnx_model(quantize=False).encode(SENTENCES)
+
+    assert embeddings.shape == (len(SENTENCES), 384)
+    assert cosine_agreement(embeddings, torch_embeddings).min() > 0.999
+
+
+def test_int8_stays_close_to_torch(torch_embeddings):
+    """Dynamic int8 quantization keeps vectors close to the PyTorch output"""
+    model = load_onnx_model(quantize=True)
+    embeddings = model.encode(SENTENCES)
+
+    assert cosine_agreement(embeddings, torch_embeddings).min() > 0.97
+    assert model.encode(SENTENCES[0]).shape == (384,)
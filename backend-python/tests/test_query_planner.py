@@ -0,0 +1,47 @@
+"""
+Tests for natural-language query planning
+"""
+from datetime import datetime
+
+import pytest
+
+from app.services.query_planner import QueryPlanner
+
+NOW = datetime(2025, 3, 12, 15, 30)
+planner = QueryPlanner()
+
+
+@pytest.mark.parametrize("query, start, end", [
+    ("what happened on 2024-11-05", datetime(2024, 11, 5), datetime(2024, 11, 6)),
+    ("dinner on March 3rd", datetime(2025, 3, 3), datetime(2025, 3, 4)),
+    ("the 20th of march", datetime(2024, 3, 20), datetime(2024, 3, 21)),
+    ("sep 14, 2023 trip", datetime(2023, 9, 14), datetime(2023, 9, 15)),
+    ("entries from the last 10 days", datetime(2025, 3, 2), datetime(2025, 3, 13)),
+    ("past two weeks", datetime(2025, 2, 26), datetime(2025, 3, 13)),
+    ("work stress in September", datetime(2024, 9, 1), datetime(2024, 10, 1)),
+    ("july 2023 holiday", datetime(2023, 7, 1), datetime(2023, 8, 1)),
+    ("last month", datetime(2025, 2, 1), datetime(2025, 3, 1)),
+    ("yesterday", datetime(2025, 3, 11), datetime(2025, 3, 12)),
+    ("everything in 2022", datetime(2022, 1, 1), datetime(2023, 1, 1)),
+])
+def test_date_references(query, start, end):
+    """Explicit dates, last-N spans, months (most recent unless a year is given) and years"""
+    assert planner.plan(query, now=NOW).date_range == (start, end)
+
+
+def test_may_is_only_a_month_in_context():
+    """The modal verb 'may' is not read as a month"""
+    assert planner.plan("I may have been wrong", now=NOW).date_range is None
+    assert planner.plan("trips in may", now=NOW).date_range == (datetime(2024, 5, 1), datetime(2024, 6, 1))
+
+
+def test_moods_and_collections():
+    """Mood words (and noun forms) map to mood ids; negated or ambiguous words do not"""
+    collections = [{"id": "1", "name": "Work"}, {"id": "2", "name": "Work Trips"}]
+
+    plan = planner.plan("Show me entries when I felt lonely on work trips", collections=collections, now=NOW)
+    assert (plan.mood, plan.collection_id) == ("lonely", "2")
+    assert planner.plan("work stress", now=NOW).mood == "stressed"
+    assert planner.plan("days I was not sad", now=NOW).mood is None
+    assert planner.plan("entries with content about dogs", now=NOW).mood is None
+    assert planner.plan("homework", collections=collections, now=NOW).collection_id is None
@@ -0,0 +1,29 @@
+"""
+Tests for the per-user search result cache
+"""
+import time
+
+from app.services.search_cache import SearchResultCache
+
+
+def test_entries_expire_after_ttl():
+    """Results are not served past their TTL"""
+    cache = SearchResultCache(ttl_seconds=0.01)
+    key = cache.key("user", "semantic", "beach", limit=10)
+    cache.put(key, [{"id": "a"}])
+
+    assert cache.get(key) == [{"id": "a"}]
+    time.sleep(0.02)
+    assert cache.get(key) is None
+
+
+def test_results_of_a_search_overtaken_by_a_write_are_dropped():
+    """A search that started before a write cannot store its stale results"""
+    cache = SearchResultCache()
+    key = cache.key("user", "semantic", "beach", limit=10)
+    cache.bump("user")
+    cache.put(key, [{"id": "a"}])
+
+    assert cache.get(key) is None
+    assert cache.get(cache.key("user", "semantic", "beach", limit=10)) is None
+    assert cache.stats()["invalidations"] == 1
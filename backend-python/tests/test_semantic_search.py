@@ -0,0 +1,236 @@
+"""
+Tests for the semantic search service query paths
+"""
+import pytest
+
+from app.services.search_cache import RankedResultStore, SearchResultCache
+from app.services.semantic_search_service import SemanticSearchService
+from app.services.vector_index import VectorIndexCache
+from tests.fake_supabase import FakeSupabase
+
+ENTRIES = {
+    "a": {"id": "a", "title": "Beach", "content": "x" * 5000, "content_embedding": "[1,0,0]"},
+    "b": {"id": "b", "title": "Work", "content": "y" * 5000, "content_embedding": "[0.6,0.8,0]"},
+    "c": {"id": "c", "title": "Rain", "content": "z" * 5000, "content_embedding": "[0,0,1]"},
+}
+
+
+class FixedEmbeddingService:
+    """Returns the same query vector and scores with the real helpers"""
+
+    def __init__(self, real):
+        self.real = real
+        self.batches = []
+
+    async def generate_embedding(self, text):
+        return [1.0, 0.0, 0.0]
+
+    async def generate_embeddings_batch(self, texts):
+        self.batches.append(texts)
+        return [[0.0, 0.0, 1.0] if "rain" in text else [1.0, 0.0, 0.0] for text in texts]
+
+    def __getattr__(self, name):
+        return getattr(self.real, name)
+
+
+def respond(query):
+    if query.table == "collections":
+        return [{"id": "col-1", "name": "Work"}]
+    selected = query.selected()
+    ids = next((args[1] for name, args in query.calls if name == "in_"), None)
+    ids = next(([args[1]] for name, args in query.calls if name == "eq" and args[0] == "id"), ids)
+    rows = [entry for entry_id, entry in ENTRIES.items() if ids is None or entry_id in ids]
+    columns = [column.strip() for column in selected.split(",")]
+    return [{column: row.get(column) for column in columns} for row in rows]
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setattr("app.core.config.settings.embedding_dimensions", 3)
+    search = SemanticSearchService()
+    search.supabase = FakeSupabase(respond)
+    search.embedding_service = FixedEmbeddingService(search.embedding_service)
+    search.vector_index_cache = VectorIndexCache(max_bytes=0)
+    search.result_cache = SearchResultCache()
+    search.ranked_results = RankedResultStore()
+    return search
+
+
+def entry_queries(service):
+    return [query for query in service.supabase.queries if query.table == "entries"]
+
+
+@pytest.mark.asyncio
+async def test_scan_scores_on_vectors_and_hydrates_only_winners(service):
+    """Without the RPC, candidates are scored from id+vector and only the top-k rows are loaded in full"""
+    results = await service.search_entries("user", "the beach", limit=2, similarity_threshold=0.1)
+
+    assert [entry["id"] for entry in results] == ["a", "b"]
+    assert results[0]["similarity_score"] == pytest.approx(1.0)
+    assert results[0]["content"] == "x" * 5000
+
+    scoring, hydration = entry_queries(service)
+    assert scoring.selected() == "id, content_embedding"
+    assert "content" in hydration.selected()
+    assert ("in_", ("id", ["a", "b"])) in hydration.calls
+
+
+@pytest.mark.asyncio
+async def test_keyword_search_uses_database_rank(service):
+    """Keyword search ranks with the full-text RPC and hydrates rows in rank order"""
+    service.supabase.rpc_handler = lambda name, params: [{"id": "c", "rank": 0.5}, {"id": "a", "rank": 0.2}]
+
+    results = await service._keyword_search_entries("user", "rainy beach day", limit=5)
+
+    assert service.supabase.rpcs[0][0] == "keyword_search_entries"
+    assert service.supabase.rpcs[0][1]["query_text"] == "rainy beach day"
+    assert [(entry["id"], entry["keyword_score"]) for entry in results] == [("c", 0.5), ("a", 0.2)]
+
+
+@pytest.mark.asyncio
+async def test_keyword_search_fallback_filters_on_search_vector(service):
+    """Without the RPC, matching goes through the search_vector index instead of ilike"""
+    await service._keyword_search_entries("user", "rainy beach", limit=5)
+
+    query = entry_queries(service)[0]
+    assert ("filter", ("search_vector", "wfts(english)", "rainy beach")) in query.calls
+    assert all(name != "or_" for name, _ in query.calls)
+
+
+@pytest.mark.asyncio
+async def test_hybrid_search_scores_one_shared_candidate_set(service):
+    """Both signals are scored over the union of candidates, hydrated in a single fetch"""
+    service.supabase.rpc_handler = lambda name, params: (
+        [{"id": "a", "distance": 0.0}] if name == "match_entries" else [{"id": "b", "rank": 0.9}]
+    )
+
+    results = await service.hybrid_search_entries("user", "beach", limit=5)
+
+    assert [entry["id"] for entry in results] == ["a", "b"]
+    assert results[0]["combined_score"] == pytest.approx(0.7)
+    # "b" only matched keywords; its semantic score comes from its stored vector
+    assert results[1]["semantic_score"] == pytest.approx(0.6)
+    assert results[1]["keyword_score"] == pytest.approx(0.9)
+    assert sorted(name for name, _ in service.supabase.rpcs) == ["keyword_search_entries", "match_entries"]
+    (hydration,) = entry_queries(service)
+    assert "content_embedding" in hydration.selected()
+
+
+@pytest.mark.asyncio
+async def test_short_rpc_result_is_final(service):
+    """Fewer than match_count rows from match_entries is the answer; no exact scan follows"""
+    service.supabase.rpc_handler = lambda name, params: [{"id": "a", "distance": 0.0}]
+
+    results = await service.search_entries("user", "the beach", limit=5, mood_filter="happy")
+
+    assert [entry["id"] for entry in results] == ["a"]
+    assert [name for name, _ in service.supabase.rpcs] == ["match_entries"]
+    (hydration,) = entry_queries(service)
+    assert hydration.selected() != "id, content_embedding"
+
+
+@pytest.mark.asyncio
+async def test_repeated_search_is_served_from_cache_until_a_write(service):
+    """Identical searches hit the result cache; bumping the user's generation forces a fresh search"""
+    first = await service.search_entries("user", "The  beach", limit=2)
+    again = await service.search_entries("user", "the beach", limit=2)
+
+    assert again == first
+    assert len(entry_queries(service)) == 2
+    assert service.result_cache.stats()["hits"] == 1
+
+    service.result_cache.bump("user")
+    await service.search_entries("user", "the beach", limit=2)
+
+    assert len(entry_queries(service)) == 4
+
+
+@pytest.mark.asyncio
+async def test_query_hints_become_filters(service):
+    """Mood words and collection names in the query are pushed into the ranking call"""
+    service.supabase.rpc_handler = lambda name, params: []
+
+    plan = await service.plan_query("user", "sad days at work")
+    await service.search_entries("user", "sad days at work", plan=plan)
+
+    assert (plan.mood, plan.collection_id) == ("sad", "col-1")
+    _, params = service.supabase.rpcs[0]
+    assert params["p_mood"] == "sad"
+    assert params["p_collection_id"] == "col-1"
+
+
+@pytest.mark.asyncio
+async def test_cursor_pages_reuse_the_ranking(service):
+    """Later pages slice the stored ranking and only hydrate their own rows"""
+    first, cursor = await service.search_page("user", "beach", limit=1, similarity_threshold=-1)
+    second, cursor = await service.search_page("user", "ignored", limit=1, cursor=cursor)
+    third, last_cursor = await service.search_page("user", "ignored", limit=1, cursor=cursor)
+
+    assert [entry["id"] for entry in first + second + third] == ["a", "b", "c"]
+    assert last_cursor is None
+    scans = [query for query in entry_queries(service) if query.selected() == "id, content_embedding"]
+    assert len(scans) == 1
+
+    with pytest.raises(ValueError):
+        await service.search_page("someone-else", "beach", cursor=cursor)
+
+
+@pytest.mark.asyncio
+async def test_stream_emits_meta_results_and_end(service):
+    """Streaming yields ranking metadata first, then results, then a continuation cursor"""
+    events = [event async for event in service.stream_search("user", "beach", limit=2, similarity_threshold=-1)]
+
+    assert [event["type"] for event in events] == ["meta", "result", "result", "end"]
+    assert events[0]["total_ranked"] == 3
+    assert [event["entry"]["id"] for event in events[1:3]] == ["a", "b"]
+    assert events[-1]["next_cursor"]
+
+
+@pytest.mark.asyncio
+async def test_similar_entries_reuse_the_stored_vector(service):
+    """Neighbors are ranked from the entry's own embedding, without encoding any text"""
+    async def no_model(text):
+        raise AssertionError("similar entries must not call the model")
+    service.embedding_service.generate_embedding = no_model
+
+    results = await service.similar_entries("user", "b", limit=5, similarity_threshold=0.1)
+
+    assert [entry["id"] for entry in results] == ["a"]
+    assert results[0]["similarity_score"] == pytest.approx(0.6)
+    assert await service.similar_entries("user", "missing") is None
+
+
+@pytest.mark.asyncio
+async def test_batch_search_encodes_loads_and_hydrates_once(service):
+    """All queries share one encode call, one vector load and one hydration query"""
+    service.vector_index_cache = VectorIndexCache(max_bytes=10 * 1024 * 1024)
+    results = await service.batch_search_entries("user", ["the beach", "rainy days"], limit=2)
+
+    assert [[entry["id"] for entry in result] for result in results] == [["a", "b"], ["c"]]
+    assert results[1][0]["similarity_score"] == pytest.approx(1.0)
+    assert service.embedding_service.batches == [["the beach", "rainy days"]]
+    loads, hydration = entry_queries(service)
+    assert loads.selected().startswith("id, content_embedding")
+    assert ("in_", ("id", ["a", "b", "c"])) in hydration.calls
+
+
+@pytest.mark.asyncio
+async def test_batch_search_ranks_an_oversize_user_in_the_database(service):
+    """A user too large for the index cache is ranked by match_entries, not by a throwaway index"""
+    service.vector_index_cache = VectorIndexCache(max_bytes=1)
+    service.supabase.rpc_handler = lambda name, params: (
+        [{"id": "c", "distance": 0.0}, {"id": "b", "distance": 1.0}] if params["query_embedding"][2]
+        else [{"id": "a", "distance": 0.0}, {"id": "b", "distance": 0.4}]
+    )
+
+    # The first search finds out the index does not fit the budget
+    results = await service.batch_search_entries("user", ["the beach", "rainy days"], limit=2)
+    assert [[entry["id"] for entry in result] for result in results] == [["a", "b"], ["c", "b"]]
+    assert service.vector_index_cache.is_oversize("user")
+
+    service.supabase.queries.clear()
+    service.result_cache = SearchResultCache()
+    await service.batch_search_entries("user", ["the beach", "rainy days"], limit=2)
+    (hydration,) = entry_queries(service)
+    assert "content_embedding" not in hydration.selected()
+    assert [name for name, _ in service.supabase.rpcs] == ["match_entries"] * 4
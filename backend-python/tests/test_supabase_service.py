@@ -0,0 +1,62 @@
+"""
+Tests for the request-path Supabase services
+"""
+import pytest
+
+from app.core.ttl_cache import TTLCache
+from app.services.supabase_service import EntryService, UserService
+from tests.fake_supabase import AsyncFakeSupabase
+
+
+@pytest.fixture(autouse=True)
+def fresh_user_cache(monkeypatch):
+    monkeypatch.setattr("app.services.supabase_service.user_cache", TTLCache(ttl_seconds=60, max_entries=10))
+
+
+@pytest.mark.asyncio
+async def test_get_or_create_user_awaits_lookup_then_insert():
+    """A missing user is looked up and then inserted through the async client"""
+    service = UserService()
+    service.supabase = AsyncFakeSupabase(
+        lambda query: [] if query.selected() else [{"id": "new", "clerk_user_id": "clerk-1"}]
+    )
+
+    user = await service.get_or_create_user("clerk-1", {"email": "a@example.com"})
+
+    assert user == {"id": "new", "clerk_user_id": "clerk-1"}
+    lookup, insert = service.supabase.queries
+    assert ("eq", ("clerk_user_id", "clerk-1")) in lookup.calls
+    assert insert.calls[0][0] == "insert"
+
+
+@pytest.mark.asyncio
+async def test_user_lookups_are_cached_until_the_user_is_updated():
+    """Repeat lookups skip the users table; update_user drops the cached row"""
+    row = {"id": "u1", "clerk_user_id": "clerk-1", "name": "Old"}
+    service = UserService()
+    service.supabase = AsyncFakeSupabase(lambda query: [dict(row)])
+
+    assert (await service.get_user_by_clerk_id("clerk-1"))["name"] == "Old"
+    assert (await service.get_user_by_clerk_id("clerk-1"))["name"] == "Old"
+    assert len(service.supabase.queries) == 1
+
+    row["name"] = "New"
+    await service.update_user("u1", {"name": "New"})
+    assert (await service.get_user_by_clerk_id("clerk-1"))["name"] == "New"
+    assert len(service.supabase.queries) == 3
+
+
+@pytest.mark.asyncio
+async def test_update_entry_with_same_text_keeps_embedding(monkeypatch):
+    """Unchanged text is detected from the awaited current row and not re-embedded"""
+    current = {"id": "e1", "user_id": "u1", "title": "T", "content": "C", "content_embedding": "[1,0]"}
+    service = EntryService()
+    service.supabase = AsyncFakeSupabase(lambda query: [dict(current)])
+    queued = []
+    monkeypatch.setattr(service, "_enqueue_embedding", queued.append)
+
+    entry = await service.update_entry("e1", "u1", {"title": "T", "content": "C"})
+
+    assert entry["id"] == "e1"
+    assert len(service.supabase.queries) == 2
+    assert queued == []
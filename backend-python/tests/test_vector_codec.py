@@ -0,0 +1,47 @@
+"""
+Tests for pgvector payload decoding
+"""
+import struct
+
+import numpy as np
+
+from app.services.vector_codec import decode_vector, decode_vectors, encode_vector
+
+
+def test_decode_vector_accepts_text_binary_and_lists():
+    """Text, binary send format and lists all decode to the same float32 vector"""
+    expected = np.array([0.5, -1.25, 3.0], dtype=np.float32)
+    binary = struct.pack(">hh3f", 3, 0, 0.5, -1.25, 3.0)
+
+    for value in ("[0.5,-1.25,3]", binary, [0.5, -1.25, 3.0], expected):
+        vector = decode_vector(value, dimensions=3)
+        assert vector.dtype == np.float32
+        np.testing.assert_array_equal(vector, expected)
+
+    assert decode_vector("[0.5,-1.25]", dimensions=3) is None
+    assert decode_vector("[0.5,oops,3]") is None
+    assert decode_vector("") is None
+    assert decode_vector(None) is None
+
+
+def test_decode_vectors_drops_bad_rows_and_keeps_order():
+    """Bulk decoding matches row-by-row decoding and reports which rows were usable"""
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((4, 8)).astype(np.float32)
+    values = [encode_vector(vector) for vector in vectors]
+    values.insert(1, None)
+    values.insert(3, "[1,2,3]")
+    values.append(vectors[0].tolist())
+
+    matrix, valid = decode_vectors(values, dimensions=8)
+
+    assert valid.tolist() == [True, False, True, False, True, True, True]
+    np.testing.assert_array_equal(matrix, np.vstack([vectors, vectors[:1]]))
+
+
+def test_decode_vectors_rejects_rows_that_only_add_up():
+    """A short and a long vector are not accepted just because the total length fits"""
+    matrix, valid = decode_vectors(["[1,2,3]", "[4]"], dimensions=2)
+
+    assert valid.tolist() == [False, False]
+    assert matrix.shape == (0, 2)
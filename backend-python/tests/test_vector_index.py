@@ -0,0 +1,133 @@
+"""
+Tests for the in-memory per-user vector index
+"""
+import time
+from datetime import datetime
+
+import numpy as np
+
+from app.services.vector_index import UserVectorIndex, VectorIndexCache
+
+
+def make_rows():
+    return [
+        {"id": "a", "content_embedding": [1.0, 0.0], "mood": "happy", "collection_id": None,
+         "created_at": "2024-09-01T10:00:00+00:00"},
+        {"id": "b", "content_embedding": [0.8, 0.6], "mood": "sad", "collection_id": "work",
+         "created_at": "2024-09-15T10:00:00+00:00"},
+        {"id": "c", "content_embedding": [0.0, 1.0], "mood": "sad", "collection_id": "work",
+         "created_at": "2024-10-01T10:00:00+00:00"},
+    ]
+
+
+def test_search_ranks_and_filters():
+    """Search ranks by cosine similarity and honours mood, collection and date filters"""
+    index = UserVectorIndex.from_rows("user", make_rows(), dimensions=2)
+
+    assert [entry_id for entry_id, _ in index.search([1.0, 0.0], limit=3)] == ["a", "b", "c"]
+    assert [entry_id for entry_id, _ in index.search([1.0, 0.0], limit=3, mood_filter="sad")] == ["b", "c"]
+
+    september = (datetime(2024, 9, 1), datetime(2024, 9, 30))
+    matches = index.search([1.0, 0.0], limit=3, date_range=september, collection_id="work")
+    assert [entry_id for entry_id, _ in matches] == ["b"]
+
+
+def test_upsert_and_remove_keep_rows_consistent():
+    """Incremental writes update vectors and filter columns in place"""
+    index = UserVectorIndex.from_rows("user", make_rows(), dimensions=2)
+
+    index.remove("a")
+    index.upsert({"id": "c", "mood": "happy"})
+    index.upsert({"id": "d", "mood": "happy", "created_at": "2024-10-02T00:00:00"}, [1.0, 0.0])
+
+    assert len(index) == 3
+    assert "a" not in index
+    matches = index.search([1.0, 0.0], limit=3, mood_filter="happy")
+    assert [entry_id for entry_id, _ in matches] == ["d", "c"]
+
+
+def test_snapshot_is_unaffected_by_concurrent_writes():
+    """A search's snapshot keeps its ids aligned with its vectors across removes and upserts"""
+    index = UserVectorIndex.from_rows("user", make_rows(), dimensions=2)
+    rows = index._rows()
+
+    index.remove("a")  # swaps "c" into the first slot
+    index.upsert({"id": "b", "mood": "happy"}, [0.0, 1.0])
+    index.upsert({"id": "d"}, [1.0, 0.0])
+
+    assert rows.ids == ["a", "b", "c"]
+    assert np.allclose(rows.vectors, [[1.0, 0.0], [0.8, 0.6], [0.0, 1.0]])
+    assert list(rows.moods) == ["happy", "sad", "sad"]
+    assert index.search([1.0, 0.0], limit=1) == [("d", 1.0)]
+    assert index.similarities([1.0, 0.0], ["a", "b", "c"]) == {"b": 0.0, "c": 0.0}
+
+
+def test_cache_evicts_least_recently_used_within_budget():
+    """Indexes are evicted LRU once the memory budget is exceeded"""
+    first = UserVectorIndex.from_rows("first", make_rows(), dimensions=2)
+    second = UserVectorIndex.from_rows("second", make_rows(), dimensions=2)
+    cache = VectorIndexCache(max_bytes=first.memory_bytes + second.memory_bytes // 2)
+
+    assert cache.put(first)
+    assert cache.put(second)
+
+    assert cache.get("first") is None
+    assert cache.get("second") is second
+    assert cache.stats()["evictions"] == 1
+
+
+def test_cache_write_through_only_touches_loaded_users():
+    """Entry writes update loaded indexes and are ignored for unloaded users"""
+    cache = VectorIndexCache(max_bytes=10 * 1024 * 1024)
+    cache.put(UserVectorIndex.from_rows("user", make_rows(), dimensions=2))
+
+    cache.upsert_entry("user", {"id": "e", "mood": "calm"}, [0.6, 0.8])
+    cache.upsert_entry("other", {"id": "x"}, [1.0, 0.0])
+    cache.remove_entry("user", "b")
+
+    index = cache.get("user")
+    assert "e" in index and "b" not in index
+    assert cache.get("other") is None
+
+
+def test_cache_refuses_stale_loads_and_expires_indexes(monkeypatch):
+    """An index read before a write is not cached, and cached indexes expire"""
+    cache = VectorIndexCache(max_bytes=10 * 1024 * 1024, ttl_seconds=60)
+
+    generation = cache.generation("user")
+    stale = UserVectorIndex.from_rows("user", make_rows(), dimensions=2)
+    cache.upsert_entry("user", {"id": "e"}, [0.6, 0.8])  # nothing loaded to write through
+    assert not cache.put(stale, generation)
+    assert cache.get("user") is None
+
+    assert cache.put(UserVectorIndex.from_rows("user", make_rows(), dimensions=2), cache.generation("user"))
+    assert cache.get("user") is not None
+
+    now = time.monotonic()
+    monkeypatch.setattr("app.services.vector_index.time.monotonic", lambda: now + 61)
+    assert cache.get("user") is None
+    assert cache.stats()["stale_loads"] == 1
+    assert cache.stats()["expirations"] == 1
+
+
+def test_cache_remembers_oversize_users():
+    """A user whose index exceeds the budget is recorded so searches skip the load"""
+    index = UserVectorIndex.from_rows("big", make_rows(), dimensions=2)
+    cache = VectorIndexCache(max_bytes=index.memory_bytes - 1)
+
+    assert not cache.is_oversize("big")
+    assert not cache.put(index)
+    assert cache.is_oversize("big")
+    assert cache.stats()["oversize_users"] == 1
+
+
+def test_from_rows_decodes_pgvector_text():
+    """Embeddings returned as pgvector text are indexed; malformed ones are skipped"""
+    rows = make_rows()
+    rows[0]["content_embedding"] = "[1,0]"
+    rows[1]["content_embedding"] = "[0.8,0.6,0.1]"
+
+    index = UserVectorIndex.from_rows("user", rows, dimensions=2)
+
+    assert len(index) == 2
+    assert [entry_id for entry_id, _ in index.search([1.0, 0.0], limit=3)] == ["a", "c"]